@@ -0,0 +1,262 @@
+"""
+benchmark.py
+Offline, repeatable performance numbers for the pipeline.
+
+Each scale runs in a fresh temporary workspace against a local Census
+stub (src/census_stub.py) and synthetic ZCTA polygons / station points
+at 1x, 10x or 100x the size of LA County. Every pipeline function is
+timed in order and the results are written to JSON:
+
+    python benchmark.py --scales 1 10 100 --repeat 2
+    python benchmark.py --compare data/benchmarks/<earlier run>.json
+
+Run 1 of each scale starts with cold caches; later runs reuse the
+HTTP, crosswalk and ZCTA caches left by the first.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import src.acs_client as acs_client
+import src.acs_variables as acs_variables
+import src.crosswalk as crosswalk
+import src.datastore as datastore
+from src import instrument
+from src.artifacts import write_artifact
+from src.census_stub import (
+    LA_STATIONS,
+    grid_side,
+    grid_zips,
+    make_synthetic_stations_shp,
+    make_synthetic_zcta_shp,
+    start_stub_census_process,
+    stub_stats,
+)
+from src.final_analysis import load_and_clean_final_data, run_regression
+from src.final_data_prep import build_final_dataset
+
+from config import (
+    BENCHMARK_DIR,
+    ACS_FEATURES_PARQUET,
+    FINAL_DATA_PARQUET,
+    FINAL_DATA_CLEAN_PARQUET,
+)
+
+
+def _rows(result):
+    if isinstance(result, (pd.DataFrame, list)):
+        return len(result)
+    return None
+
+
+def measure(step, func, stub_url, quiet=True):
+    """
+    Run func() once under instrument.measure() and return (result,
+    record): wall and CPU seconds, peak RSS during the step, the
+    tracemalloc peak (only with --trace-memory, it slows the run down
+    ~3x), requests/bytes the stub served, client-side HTTP counters and
+    result rows.
+    """
+    before = stub_stats(stub_url)
+    out = io.StringIO() if quiet else None
+    with contextlib.redirect_stdout(out) if quiet else contextlib.nullcontext():
+        with instrument.measure(step) as metrics:
+            result = func()
+    after = stub_stats(stub_url)
+
+    m = metrics.to_dict()
+    record = {
+        "step": step,
+        "wall_seconds": m["seconds"],
+        "cpu_seconds": m["cpu_seconds"],
+        "peak_rss_mb": m["peak_rss_mb"],
+        "peak_traced_mb": m.get("traced_peak_mb"),
+        "requests": after["requests"] - before["requests"],
+        "bytes": after["bytes"] - before["bytes"],
+        "rows": _rows(result),
+        "counters": m["counters"],
+    }
+    return result, record
+
+
+def pipeline_steps(stations_shp, zcta_shp):
+    """
+    The timed pipeline functions, in order, as (name, callable) pairs.
+    Each step's output is kept in `state` for the following steps.
+    """
+    state = {}
+
+    def zips():
+        state["zips"] = crosswalk.get_la_county_zips()
+        return state["zips"]
+
+    def acs():
+        df = acs_variables.fetch_acs_variables(state["zips"])
+        write_artifact(df, "acs_features", ACS_FEATURES_PARQUET)
+        return df
+
+    def final():
+        df = build_final_dataset(
+            features_path=ACS_FEATURES_PARQUET,
+            stations_shp=stations_shp,
+            zcta_shp=zcta_shp,
+        )
+        write_artifact(df, "final", FINAL_DATA_PARQUET)
+        return df
+
+    def clean():
+        return load_and_clean_final_data(FINAL_DATA_PARQUET, FINAL_DATA_CLEAN_PARQUET)
+
+    def regression():
+        return run_regression(zips=state["zips"])
+
+    return [
+        ("get_la_county_zips", zips),
+        ("fetch_acs_variables", acs),
+        ("build_final_dataset", final),
+        ("load_and_clean_final_data", clean),
+        ("run_regression", regression),
+    ]
+
+
+def run_scale(scale, repeat=1, latency=0.05, throttle=0, quiet=True):
+    """
+    Benchmark one data scale in a throwaway workspace; returns records.
+    """
+    n = grid_side(scale)
+    first_zip = 90000 if n * n < 10000 else 10000
+    zctas = grid_zips(n, first_zip)
+
+    stub, url = start_stub_census_process(
+        zctas=zctas, latency=latency, throttle_first=throttle
+    )
+    saved = (crosswalk.ZCTA_CROSSWALK_URL, dict(acs_variables.DATASET_URLS))
+    cwd = os.getcwd()
+    records = []
+
+    with tempfile.TemporaryDirectory() as workspace:
+        os.chdir(workspace)
+        try:
+            os.makedirs("data")
+            zcta_shp = make_synthetic_zcta_shp("data", n, first_zip)
+            stations_shp = make_synthetic_stations_shp(
+                "data", LA_STATIONS * scale, n
+            )
+
+            crosswalk.ZCTA_CROSSWALK_URL = f"{url}/crosswalk.txt"
+            acs_variables.DATASET_URLS.update(subject=f"{url}/subject", detailed=url)
+
+            for run in range(1, repeat + 1):
+                # new process-level state each run; only disk caches persist
+                acs_client._default_client = None
+                datastore._default_store = None
+                crosswalk.clear_index_cache()
+
+                for step, func in pipeline_steps(stations_shp, zcta_shp):
+                    _, record = measure(step, func, url, quiet)
+                    record = {"scale": scale, "zctas": len(zctas), "run": run, **record}
+                    records.append(record)
+                    print(
+                        f"{scale:>4}x run {run}  {step:<26} "
+                        f"{record['wall_seconds']:8.3f}s "
+                        f"{record['peak_rss_mb']:8.1f} MB "
+                        f"{record['requests']:5d} req"
+                    )
+        finally:
+            os.chdir(cwd)
+            crosswalk.ZCTA_CROSSWALK_URL, urls = saved
+            acs_variables.DATASET_URLS.update(urls)
+            acs_client._default_client = None
+            datastore._default_store = None
+            crosswalk.clear_index_cache()
+            stub.terminate()
+
+    return records
+
+
+def compare(records, baseline_path, tolerance=0.2):
+    """
+    Print the wall-time ratio of each step against an earlier report,
+    flagging steps more than `tolerance` slower.
+    """
+    with open(baseline_path) as f:
+        before = {
+            (r["scale"], r["run"], r["step"]): r for r in json.load(f)["results"]
+        }
+
+    print(f"\n===== COMPARED TO {baseline_path} =====")
+    for r in records:
+        old = before.get((r["scale"], r["run"], r["step"]))
+        if not old or not old["wall_seconds"]:
+            continue
+        ratio = r["wall_seconds"] / old["wall_seconds"]
+        flag = "  SLOWER" if ratio > 1 + tolerance else ""
+        print(
+            f"{r['scale']:>4}x run {r['run']}  {r['step']:<26} "
+            f"{old['wall_seconds']:8.3f}s -> {r['wall_seconds']:8.3f}s "
+            f"({ratio:5.2f}x){flag}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scale")
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="stub seconds per request"
+    )
+    parser.add_argument(
+        "--throttle", type=int, default=0, help="stub 429s before serving"
+    )
+    parser.add_argument("--output", help="JSON report path")
+    parser.add_argument("--compare", metavar="JSON", help="earlier report")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="also record tracemalloc peaks (much slower)",
+    )
+    parser.add_argument("--verbose", action="store_true", help="show step output")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(
+        args.output
+        or os.path.join(BENCHMARK_DIR, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    )
+
+    if args.trace_memory:
+        tracemalloc.start()
+    records = []
+    for scale in args.scales:
+        records += run_scale(
+            scale, args.repeat, args.latency, args.throttle, not args.verbose
+        )
+    if args.trace_memory:
+        tracemalloc.stop()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": vars(args),
+        "results": records,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved benchmark report to {output}")
+
+    if args.compare:
+        compare(records, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,96 @@ No API keys should ever be placed here.
  
 # File paths
 
+# Project data directory
+DATA_DIR = "data"
+
+# Typed pipeline artifacts (Parquet, see src/artifacts.py)
+ZIP_LIST_PARQUET = "data/la_county_zips.parquet"
+STATION_COUNTS_PARQUET = "data/la_county_station_counts.parquet"
+FINAL_DATA_PARQUET = "data/final_data.parquet"
+FINAL_DATA_CLEAN_PARQUET = "data/final_data_cleaned.parquet"
+ACCESSIBILITY_PARQUET = "data/la_county_accessibility.parquet"
+
+# Wide table of every ACS variable in src/acs_variables.py
+ACS_FEATURES_PARQUET = "data/la_county_acs_features.parquet"
+
+# SQLite store of every fetched / derived value by (vintage, level, geo id, variable)
+DATASTORE_PATH = "data/store.sqlite"
+
+# ZCTA x year ACS panel (long format) and its per-year files
+ACS_PANEL_PARQUET = "data/acs_panel.parquet"
+ACS_PANEL_DIR = "data/acs_panel"
+
+# Also write a CSV copy of every pipeline artifact (main.py --csv)
+EXPORT_CSV = False
+
+# LA County ZIP list and Metro stations per ZIP (CSV copies)
+ZIP_LIST_CSV = "data/la_county_zips.csv"
+STATION_COUNTS_CSV = "data/la_county_station_counts.csv"
+
 # Raw ACS output CSVs
 COMMUTE_CSV = "data/la_county_commute_zips.csv"
 INCOME_CSV = "data/la_county_income_zips.csv"
+ACS_FEATURES_CSV = "data/la_county_acs_features.csv"
+
+# Compact ZCTA-to-county crosswalk index (built from ZCTA_CROSSWALK_URL)
+CROSSWALK_INDEX_PATH = "data/cache/zcta_county_rel.parquet"
 
 # Final merged dataset
 FINAL_DATA_CSV = "data/final_data.csv"
 FINAL_DATA_CLEAN_CSV = "data/final_data_cleaned.csv"
 
+# Coefficient table from the regression sweep (src/regression_engine.py)
+REGRESSION_SWEEP_CSV = "data/regression_sweep.csv"
+
+# Moran's I and spatial lag / error model tables (src/spatial.py)
+SPATIAL_MORAN_CSV = "data/spatial_moran.csv"
+SPATIAL_MODELS_CSV = "data/spatial_models.csv"
+
+# Figures written by the analysis (src/plots.py): formats and worker processes
+PLOTS_DIR = "data/plots"
+PLOT_FORMATS = ("png", "svg")
+PLOT_WORKERS = 4
+
+# Run reports (JSON) and cProfile dumps written by main.py
+RUN_REPORT_DIR = "data/reports"
+
+# JSON reports written by benchmark.py
+BENCHMARK_DIR = "data/benchmarks"
+
+# Per-stage fingerprints and timings written by the pipeline runner
+PIPELINE_STATE_PATH = "data/cache/pipeline_state.json"
+
 # Metro shapefile
 METRO_STATIONS_SHP = "data/230711_All_MetroRail_Stations.shp"
 
 # ZCTA shapefile
 ZCTA_SHP = "data/tl_2020_us_zcta520.shp"
 
+# Unit of analysis: "zcta" (ZIP codes), "tract" or "block_group"
+# (main.py --geo-level). Sub-county levels use the TIGER/Line layers
+# for the study state and keep their GEOID in the zip_code column.
+GEO_LEVEL = "zcta"
+TRACT_SHP = "data/tl_2022_06_tract.shp"
+BLOCK_GROUP_SHP = "data/tl_2022_06_bg.shp"
+
+# Cached county subsets of TRACT_SHP / BLOCK_GROUP_SHP (Feather geometry stores)
+TIGER_CACHE_DIR = "data/cache/tiger"
+
+# Cached subsets of ZCTA_SHP, one memory-mapped Feather geometry store per ZIP list
+ZCTA_CACHE_DIR = "data/cache/zcta"
+
+# Station accessibility per ZCTA: counts of stations within these radii (miles)
+ACCESS_RADII_MILES = (0.5, 1, 2)
+
+# Study area (FIPS codes): Los Angeles County, California
+LA_STATE_FIPS = "06"
+LA_COUNTY_FIPS = "037"
+
+# Multi-county runs (src/regional.py): one Parquet partition per county
+REGIONAL_DATASET_DIR = "data/zcta_dataset"
+REGIONAL_WORKERS = 4
+
 # API URLs
 
 # Census crosswalk file (ZCTA → County)
@@ -28,8 +104,54 @@ ZCTA_CROSSWALK_URL = (
 )
 
 # ACS API URLs
-ACS_COMMUTE_URL = "https://api.census.gov/data/2022/acs/acs5/subject"
-ACS_INCOME_URL = "https://api.census.gov/data/2022/acs/acs5"
+ACS_VINTAGE = 2022
+ACS_SUBJECT_URL = f"https://api.census.gov/data/{ACS_VINTAGE}/acs/acs5/subject"
+ACS_DETAILED_URL = f"https://api.census.gov/data/{ACS_VINTAGE}/acs/acs5"
+
+# Multi-year ACS panel (src/acs_panel.py): <base>/<year>/acs/acs5[/subject]
+ACS_BASE_URL = "https://api.census.gov/data"
+ACS_PANEL_YEARS = tuple(range(2012, 2023))
 
 # Settings
-API_SLEEP_SECONDS = 0.2
+
+# ACS client: max requests in flight, retries on 429/5xx, backoff bounds (seconds)
+ACS_MAX_CONCURRENCY = 8
+ACS_MAX_RETRIES = 5
+ACS_BACKOFF_SECONDS = 0.5
+ACS_BACKOFF_MAX_SECONDS = 30
+ACS_TIMEOUT_SECONDS = 30
+
+# On-disk HTTP cache for crosswalk and ACS responses
+HTTP_CACHE_DIR = "data/cache/http"
+HTTP_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# Memoized analysis results (src/memo.py), least recently used evicted first
+RESULT_CACHE_DIR = "data/cache/results"
+RESULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Cache lifetimes in seconds (None = never expires, e.g. published ACS vintages)
+CROSSWALK_CACHE_TTL_SECONDS = 30 * 24 * 3600
+ACS_CACHE_TTL_SECONDS = None
+
+# Number of ZCTAs requested per ACS call (None = one "*" request for all ZCTAs)
+ACS_ZCTA_BATCH_SIZE = 100
+
+# Most fields (NAME included) the ACS API returns per request
+ACS_MAX_VARIABLES = 50
+
+# Resumable ACS fetches (src/fetch_journal.py): one JSONL journal per fetch,
+# fsync'ed every ACS_JOURNAL_FSYNC_EVERY completed requests
+ACS_JOURNAL_DIR = "data/journal"
+ACS_JOURNAL_FSYNC_EVERY = 16
+
+# Regression sweep: bootstrap/permutation resamples, worker processes, RNG seed
+REGRESSION_BOOTSTRAP_DRAWS = 2000
+REGRESSION_PERMUTATIONS = 2000
+REGRESSION_WORKERS = 4
+REGRESSION_SEED = 510
+
+# Spatial analysis: weights ("queen", "rook" or "knn"), neighbours for knn,
+# Moran's I permutations
+SPATIAL_WEIGHTS = "queen"
+SPATIAL_KNN = 6
+SPATIAL_PERMUTATIONS = 999
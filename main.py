@@ -1,73 +1,509 @@
 """
 main.py
-Run the full project from start to finish.
+Run the full project from start to finish, or one part of it:
+
+    python main.py [all]    every stage
+    python main.py fetch    ZIP list + one wide pull of every ACS variable
+    python main.py build    station counts + final merged dataset
+    python main.py analyze  cleaning, descriptive stats, regressions, spatial models
+    python main.py plot     figures from the cleaned dataset
+
+Heavy libraries (pandas, geopandas, statsmodels, matplotlib) are only
+imported inside the stages that use them, so e.g. `fetch` never loads
+the geo or plotting stack. `--timings` prints import and run times.
+
+Each step is a pipeline stage that is skipped when its outputs are newer
+than its inputs and its code/config have not changed. Use
+`python main.py --force acs` (repeatable, or `--force all`) to rerun
+stages on demand, and `--concurrent` to run the ACS pulls in threads and
+the shapefile work in a separate process at the same time.
+
+Stages hand data to each other as typed Parquet files (src/artifacts.py);
+`--csv` also writes the CSV copies.
+
+`--geo-level tract` (or block_group) runs the same pipeline on census
+tracts / block groups instead of ZIP codes; rows keep the ZIP schema
+with the GEOID in zip_code.
+
+Every run writes a JSON report (time, CPU, memory, HTTP and row counts
+per stage) to data/reports/. `--profile geo_merge` also saves a cProfile
+dump of that stage and `--trace-memory` adds tracemalloc figures.
 """
 
+import time
+
+_start = time.perf_counter()
+
 import os
+import argparse
+import dataclasses
+import importlib
+import tracemalloc
 
-from src.commute_times import get_la_county_zips, get_la_commute_zips
-from src.median_hhincome import get_la_income_zips
-from src.final_data_prep import build_final_dataset
-from src.final_analysis import run_all_analysis
+from src.pipeline import Stage, run_pipeline
 
 from config import (
-    DATA_DIR,
-    COMMUTE_CSV,
-    INCOME_CSV,
+    EXPORT_CSV,
+    GEO_LEVEL,
+    TRACT_SHP,
+    BLOCK_GROUP_SHP,
+    ZIP_LIST_PARQUET,
+    ACS_FEATURES_PARQUET,
+    STATION_COUNTS_PARQUET,
+    ACCESSIBILITY_PARQUET,
+    FINAL_DATA_PARQUET,
+    FINAL_DATA_CLEAN_PARQUET,
+    ZIP_LIST_CSV,
+    ACS_FEATURES_CSV,
+    ACS_JOURNAL_DIR,
+    DATASTORE_PATH,
+    STATION_COUNTS_CSV,
     FINAL_DATA_CSV,
+    RUN_REPORT_DIR,
+    REGRESSION_SWEEP_CSV,
+    SPATIAL_MORAN_CSV,
+    SPATIAL_MODELS_CSV,
+    PLOTS_DIR,
     METRO_STATIONS_SHP,
     ZCTA_SHP,
 )
 
-def main():
-
-    print("\n=== START ===\n")
-
-    # --------------------------
-    # ONE: Load LA ZIP codes
-    # --------------------------
-    print("\nLoading LA County ZIP codes")
-    la_zips = get_la_county_zips()
-    print(f"Loaded {len(la_zips)} ZIP codes.")
-
-    # ------------------------------------------------
-    # TWO: Retrieve commute time data from the ACS
-    # ------------------------------------------------
-    print("\nPull commute time data from ACS")
-    commute_df = get_la_commute_zips(la_zips)
-    os.makedirs(DATA_DIR, exist_ok=True)
-    commute_df.to_csv(COMMUTE_CSV, index=False)
-    print(f"Saved commute data → {COMMUTE_CSV}")
-
-    # ----------------------------------------------------
-    # THREE: Retrieve median household income from ACS
-    # ----------------------------------------------------
-    print("\nPull median household income from ACS")
-    income_df = get_la_income_zips(la_zips)
-    income_df.to_csv(INCOME_CSV, index=False)
-    print(f"Saved income data → {INCOME_CSV}")
-
-    # ---------------------------------------------------------
-    # FOUR: Build final merged ZIP-level dataset
-    # ---------------------------------------------------------
-    print("\nBuild final merged dataset")
+# Time spent importing main.py itself (stdlib + config + pipeline runner)
+STARTUP_SECONDS = time.perf_counter() - _start
+
+def csv_copy(csv_path, export_csv):
+    return csv_path if export_csv else None
+
+
+def read_zip_list():
+    from src.artifacts import read_artifact
+
+    return read_artifact("zip_list", ZIP_LIST_PARQUET)["zip_code"].tolist()
+
+
+# --------------------------
+# ONE: Load LA ZIP codes
+# --------------------------
+def stage_zips(geo_level=GEO_LEVEL, export_csv=EXPORT_CSV):
+    import pandas as pd
+    from src.artifacts import write_artifact
+
+    if geo_level == "zcta":
+        from src.crosswalk import get_la_county_zips
+
+        print("Loading LA County ZIP codes")
+        la_zips = get_la_county_zips()
+    else:
+        from src.tiger_geo import county_unit_ids
+
+        print(f"Loading LA County {geo_level} GEOIDs")
+        la_zips = county_unit_ids(geo_level)
+    write_artifact(
+        pd.DataFrame({"zip_code": la_zips}),
+        "zip_list",
+        ZIP_LIST_PARQUET,
+        csv_copy(ZIP_LIST_CSV, export_csv),
+    )
+    print(f"Loaded {len(la_zips)} ZIP codes → {ZIP_LIST_PARQUET}")
+
+
+# ------------------------------------------------------------
+# TWO: Retrieve commute, income and the other ACS variables
+# ------------------------------------------------------------
+def stage_acs(geo_level=GEO_LEVEL, export_csv=EXPORT_CSV):
+    from src.artifacts import write_artifact
+    from src.acs_variables import fetch_acs_variables
+
+    print("Pull ACS variables (commute, income, covariates)")
+    journal = os.path.join(ACS_JOURNAL_DIR, f"acs_{geo_level}.jsonl")
+    features = fetch_acs_variables(
+        read_zip_list(), geo_level=geo_level, journal=journal
+    )
+    write_artifact(
+        features,
+        "acs_features",
+        ACS_FEATURES_PARQUET,
+        csv_copy(ACS_FEATURES_CSV, export_csv),
+    )
+    print(f"Saved {features.shape[1] - 2} ACS variables → {ACS_FEATURES_PARQUET}")
+
+
+# ---------------------------------------------------------
+# THREE: Assign Metro stations to ZIPs (shapefile work)
+# ---------------------------------------------------------
+def stage_stations(geo_level=GEO_LEVEL, export_csv=EXPORT_CSV):
+    from src.artifacts import write_artifact
+    from src.final_data_prep import count_stations_by_zip
+
+    print("Count Metro stations per ZIP")
+    counts = count_stations_by_zip(
+        METRO_STATIONS_SHP, ZCTA_SHP, read_zip_list(), geo_level
+    )
+    write_artifact(
+        counts,
+        "station_counts",
+        STATION_COUNTS_PARQUET,
+        csv_copy(STATION_COUNTS_CSV, export_csv),
+    )
+    print(f"Saved station counts → {STATION_COUNTS_PARQUET}")
+
+
+# ---------------------------------------------------------
+# THREE (b): Nearest-station distance / stations within radii
+# ---------------------------------------------------------
+def stage_accessibility(geo_level=GEO_LEVEL):
+    from src.artifacts import write_artifact
+    from src.accessibility import accessibility_by_zip
+
+    print("Measure station accessibility per ZIP")
+    access = accessibility_by_zip(
+        METRO_STATIONS_SHP, ZCTA_SHP, read_zip_list(), geo_level
+    )
+    write_artifact(access, "accessibility", ACCESSIBILITY_PARQUET)
+    print(f"Saved accessibility → {ACCESSIBILITY_PARQUET}")
+
+
+# ---------------------------------------------------------
+# FOUR: Build final merged ZIP-level dataset
+# ---------------------------------------------------------
+def stage_geo_merge(geo_level=GEO_LEVEL, export_csv=EXPORT_CSV):
+    from src.artifacts import write_artifact
+    from src.final_data_prep import build_final_dataset, store_final_dataset
+
+    print("Build final merged dataset")
     final_df = build_final_dataset(
-        commute_csv=COMMUTE_CSV,
-        income_csv=INCOME_CSV,
+        features_path=ACS_FEATURES_PARQUET,
         stations_shp=METRO_STATIONS_SHP,
         zcta_shp=ZCTA_SHP,
+        station_counts_path=STATION_COUNTS_PARQUET,
+        accessibility_path=ACCESSIBILITY_PARQUET,
+        geo_level=geo_level,
+    )
+    write_artifact(
+        final_df, "final", FINAL_DATA_PARQUET, csv_copy(FINAL_DATA_CSV, export_csv)
     )
-    final_df.to_csv(FINAL_DATA_CSV, index=False)
-    print(f"Saved final merged dataset → {FINAL_DATA_CSV}")
+    print(f"Saved final merged dataset → {FINAL_DATA_PARQUET}")
+    changed = store_final_dataset(final_df, geo_level=geo_level)
+    print(f"Upserted final dataset into {DATASTORE_PATH} ({changed} rows changed)")
 
-    # -----------------------------------------------
-    # FIVE: Run descriptive + regression analysis
-    # -----------------------------------------------
-    print("\nRun analysis")
-    run_all_analysis(FINAL_DATA_CSV)
 
+# -----------------------------------------------
+# FIVE: Run descriptive + regression analysis
+# -----------------------------------------------
+def stage_analysis(geo_level=GEO_LEVEL):
+    from src.final_analysis import (
+        load_and_clean_final_data,
+        descriptive_analysis,
+        run_regression,
+        run_robustness_sweep,
+    )
+
+    print("Run analysis")
+    final_data = load_and_clean_final_data(
+        FINAL_DATA_PARQUET, FINAL_DATA_CLEAN_PARQUET, geo_level
+    )
+    descriptive_analysis(final_data)
+    run_regression(zips=final_data["zip_code"].tolist(), geo_level=geo_level)
+    run_robustness_sweep(FINAL_DATA_CLEAN_PARQUET, REGRESSION_SWEEP_CSV)
+
+
+# -----------------------------------------------
+# FIVE (b): Moran's I + spatial lag / error models
+# -----------------------------------------------
+def stage_spatial(geo_level=GEO_LEVEL):
+    from src.final_analysis import run_spatial_analysis
+
+    print("Run spatial analysis")
+    run_spatial_analysis(
+        read_zip_list(),
+        ZCTA_SHP,
+        geo_level,
+        moran_path=SPATIAL_MORAN_CSV,
+        models_path=SPATIAL_MODELS_CSV,
+    )
+
+
+# -----------------------------------------------
+# SIX: Render figures (headless, PNG/SVG)
+# -----------------------------------------------
+def stage_plots():
+    from src.artifacts import read_artifact
+    from src.final_analysis import make_plots
+
+    print("Render figures")
+    make_plots(read_artifact("final_clean", FINAL_DATA_CLEAN_PARQUET), PLOTS_DIR)
+
+
+ACS_CODE = [
+    "src/acs_client.py",
+    "src/acs_registry.py",
+    "src/http_cache.py",
+    "src/artifacts.py",
+]
+ACS_CONFIG = ["ACS_ZCTA_BATCH_SIZE"]
+
+# Run options passed to the stages that take them; select_stages()
+# replaces the defaults with --geo-level / --csv
+GEO_PARAMS = {"geo_level": GEO_LEVEL}
+CSV_PARAMS = {**GEO_PARAMS, "export_csv": EXPORT_CSV}
+
+# Polygon layers for every geography level (missing ones are ignored)
+GEO_LAYERS = [ZCTA_SHP, TRACT_SHP, BLOCK_GROUP_SHP]
+GEO_CODE = ["src/zcta_geo.py", "src/zcta_lookup.py", "src/tiger_geo.py"]
+
+STAGES = [
+    Stage(
+        name="zips",
+        func=stage_zips,
+        inputs=[TRACT_SHP, BLOCK_GROUP_SHP],
+        outputs=[ZIP_LIST_PARQUET],
+        code=["src/crosswalk.py", "src/tiger_geo.py", "src/artifacts.py"],
+        config_keys=[
+            "ZCTA_CROSSWALK_URL",
+            "LA_STATE_FIPS",
+            "LA_COUNTY_FIPS",
+        ],
+        params=CSV_PARAMS,
+    ),
+    Stage(
+        name="acs",
+        func=stage_acs,
+        inputs=[ZIP_LIST_PARQUET],
+        outputs=[ACS_FEATURES_PARQUET],
+        code=["src/acs_variables.py", "src/fetch_journal.py"] + ACS_CODE,
+        config_keys=["ACS_SUBJECT_URL", "ACS_DETAILED_URL", "ACS_MAX_VARIABLES"]
+        + ACS_CONFIG,
+        deps=["zips"],
+        params=CSV_PARAMS,
+    ),
+    Stage(
+        name="stations",
+        func=stage_stations,
+        inputs=[ZIP_LIST_PARQUET, METRO_STATIONS_SHP] + GEO_LAYERS,
+        outputs=[STATION_COUNTS_PARQUET],
+        code=["src/final_data_prep.py", "src/metro_station.py", "src/artifacts.py"]
+        + GEO_CODE,
+        deps=["zips"],
+        executor="process",
+        params=CSV_PARAMS,
+    ),
+    Stage(
+        name="accessibility",
+        func=stage_accessibility,
+        inputs=[ZIP_LIST_PARQUET, METRO_STATIONS_SHP] + GEO_LAYERS,
+        outputs=[ACCESSIBILITY_PARQUET],
+        code=["src/accessibility.py", "src/metro_station.py", "src/artifacts.py"]
+        + GEO_CODE,
+        config_keys=["ACCESS_RADII_MILES"],
+        deps=["zips"],
+        executor="process",
+        params=GEO_PARAMS,
+    ),
+    Stage(
+        name="geo_merge",
+        func=stage_geo_merge,
+        inputs=[
+            ZIP_LIST_PARQUET,
+            ACS_FEATURES_PARQUET,
+            STATION_COUNTS_PARQUET,
+            ACCESSIBILITY_PARQUET,
+        ],
+        outputs=[FINAL_DATA_PARQUET],
+        code=[
+            "src/final_data_prep.py",
+            "src/acs_variables.py",
+            "src/acs_registry.py",
+            "src/datastore.py",
+            "src/artifacts.py",
+        ],
+        deps=["zips", "acs", "stations", "accessibility"],
+        params=CSV_PARAMS,
+    ),
+    Stage(
+        name="analysis",
+        func=stage_analysis,
+        inputs=[FINAL_DATA_PARQUET],
+        outputs=[FINAL_DATA_CLEAN_PARQUET, REGRESSION_SWEEP_CSV],
+        code=[
+            "src/final_analysis.py",
+            "src/regression_engine.py",
+            "src/datastore.py",
+            "src/reporting.py",
+            "src/memo.py",
+            "src/artifacts.py",
+        ],
+        config_keys=[
+            "REGRESSION_BOOTSTRAP_DRAWS",
+            "REGRESSION_PERMUTATIONS",
+            "REGRESSION_SEED",
+        ],
+        deps=["geo_merge"],
+        params=GEO_PARAMS,
+    ),
+    Stage(
+        name="spatial",
+        func=stage_spatial,
+        inputs=[ZIP_LIST_PARQUET, FINAL_DATA_CLEAN_PARQUET] + GEO_LAYERS,
+        outputs=[SPATIAL_MORAN_CSV, SPATIAL_MODELS_CSV],
+        code=[
+            "src/final_analysis.py",
+            "src/spatial.py",
+            "src/datastore.py",
+            "src/artifacts.py",
+        ]
+        + GEO_CODE,
+        config_keys=[
+            "SPATIAL_WEIGHTS",
+            "SPATIAL_KNN",
+            "SPATIAL_PERMUTATIONS",
+            "REGRESSION_SEED",
+        ],
+        deps=["analysis"],
+        params=GEO_PARAMS,
+    ),
+    Stage(
+        name="plots",
+        func=stage_plots,
+        inputs=[FINAL_DATA_CLEAN_PARQUET],
+        outputs=[f"{PLOTS_DIR}/plots_manifest.json"],
+        code=["src/final_analysis.py", "src/plots.py", "src/artifacts.py"],
+        config_keys=["PLOT_FORMATS"],
+        deps=["analysis"],
+    ),
+]
+
+# Subcommand -> stages it runs
+COMMANDS = {
+    "fetch": ["zips", "acs"],
+    "build": ["stations", "accessibility", "geo_merge"],
+    "analyze": ["analysis", "spatial"],
+    "plot": ["plots"],
+    "all": [s.name for s in STAGES],
+}
+
+# Modules each stage imports; --timings imports them up front to time them
+STAGE_MODULES = {
+    "zips": ["pandas", "src.artifacts", "src.crosswalk"],
+    "acs": ["src.artifacts", "src.acs_variables"],
+    "stations": ["src.artifacts", "src.final_data_prep"],
+    "accessibility": ["src.artifacts", "src.accessibility"],
+    "geo_merge": ["src.artifacts", "src.final_data_prep"],
+    "analysis": ["src.final_analysis", "statsmodels.api"],
+    "spatial": ["src.final_analysis", "src.spatial"],
+    "plots": ["src.artifacts", "src.final_analysis", "matplotlib.figure", "seaborn"],
+}
+
+
+def select_stages(command, geo_level=GEO_LEVEL, export_csv=EXPORT_CSV):
+    """
+    The stages of one subcommand, with geo_level and export_csv passed
+    to (and part of the fingerprint of) every stage that takes them.
+    Dependencies on stages outside the command are dropped: their
+    outputs are taken as they are on disk.
+    """
+    names = COMMANDS[command]
+    options = {"geo_level": geo_level, "export_csv": export_csv}
+    return [
+        dataclasses.replace(
+            s,
+            deps=[d for d in s.deps if d in names],
+            params={k: options.get(k, v) for k, v in s.params.items()},
+        )
+        for s in STAGES
+        if s.name in names
+    ]
+
+
+def import_timings(stages) -> dict:
+    """
+    Import every module the stages need, timing each one.
+    """
+    timings = {}
+    for stage in stages:
+        for module in STAGE_MODULES.get(stage.name, []):
+            if module in timings:
+                continue
+            start = time.perf_counter()
+            importlib.import_module(module)
+            timings[module] = time.perf_counter() - start
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the project pipeline.")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="all",
+        choices=list(COMMANDS),
+        help="part of the pipeline to run (default: all)",
+    )
+    parser.add_argument(
+        "--force",
+        action="append",
+        default=[],
+        metavar="STAGE",
+        help="rerun a stage even if it is up to date "
+        f"({', '.join(s.name for s in STAGES)}, or all)",
+    )
+    parser.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="run independent stages at the same time",
+    )
+    parser.add_argument(
+        "--csv",
+        action="store_true",
+        help="also write CSV copies of every pipeline artifact",
+    )
+    parser.add_argument(
+        "--geo-level",
+        choices=["zcta", "tract", "block_group"],
+        default=GEO_LEVEL,
+        help=f"unit of analysis (default: {GEO_LEVEL})",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="STAGE",
+        help=f"save a cProfile dump of one stage in {RUN_REPORT_DIR}",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="record tracemalloc deltas per stage (slower)",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="print import and run time",
+    )
+    args = parser.parse_args(argv)
+    stages = select_stages(args.command, args.geo_level, EXPORT_CSV or args.csv)
+
+    if args.trace_memory:
+        tracemalloc.start()
+
+    imports = import_timings(stages) if args.timings else {}
+
+    print(f"\n=== START ({args.command}) ===\n")
+    run_start = time.perf_counter()
+    run_pipeline(
+        stages,
+        force=args.force,
+        concurrent=args.concurrent,
+        report_dir=RUN_REPORT_DIR,
+        profile=args.profile,
+    )
+    run_seconds = time.perf_counter() - run_start
     print("\n=== DONE ===\n")
 
+    if args.timings:
+        print("===== IMPORT / RUN TIMINGS =====")
+        print(f"{'main.py startup':<28} {STARTUP_SECONDS:8.2f}s")
+        for module, seconds in imports.items():
+            print(f"{'import ' + module:<28} {seconds:8.2f}s")
+        print(f"{'run (' + args.command + ')':<28} {run_seconds:8.2f}s")
+
 
 if __name__ == "__main__":
     main()
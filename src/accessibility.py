@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from config import METRO_STATIONS_SHP, ZCTA_SHP, ACCESS_RADII_MILES
+from src.artifacts import coerce_schema, radius_column
+from src.metro_station import load_metro_stations
+from src.zcta_geo import ZCTA_ID_COLUMN, load_zcta_store
+from src.tiger_geo import load_unit_points
+
+EARTH_RADIUS_MILES = 3958.8
+
+
+def to_xyz(lon, lat) -> np.ndarray:
+    """
+    Lon/lat in degrees -> (n, 3) points on a sphere of Earth's radius
+    (miles). Straight-line (chord) distance between these points is a
+    monotone function of great-circle distance, so one KD-tree works
+    anywhere in the country without picking a projection.
+    """
+    lon = np.radians(np.asarray(lon, dtype="float64"))
+    lat = np.radians(np.asarray(lat, dtype="float64"))
+    cos_lat = np.cos(lat)
+    return EARTH_RADIUS_MILES * np.column_stack(
+        [cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)]
+    )
+
+
+def _chord(miles):
+    return 2 * EARTH_RADIUS_MILES * np.sin(np.asarray(miles) / (2 * EARTH_RADIUS_MILES))
+
+
+def _arc(chord):
+    chord = np.minimum(chord, 2 * EARTH_RADIUS_MILES)
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(chord / (2 * EARTH_RADIUS_MILES))
+
+
+class StationIndex:
+    """
+    KD-tree over station locations. Every query takes whole arrays of
+    points and runs in C (workers=-1 uses all cores), so national stop
+    sets and all ~33k ZCTAs are answered in one call each.
+    """
+
+    def __init__(self, lon, lat):
+        self.size = len(lon)
+        self.tree = cKDTree(to_xyz(lon, lat))
+
+    def nearest_miles(self, lon, lat) -> np.ndarray:
+        """
+        Great-circle distance (miles) from each point to its nearest station.
+        """
+        if self.size == 0:
+            return np.full(len(lon), np.nan)
+        chord, _ = self.tree.query(to_xyz(lon, lat), k=1, workers=-1)
+        return _arc(chord)
+
+    def count_within(self, lon, lat, miles) -> np.ndarray:
+        """
+        Number of stations within `miles` of each point.
+        """
+        if self.size == 0:
+            return np.zeros(len(lon), dtype="int64")
+        return self.tree.query_ball_point(
+            to_xyz(lon, lat), _chord(miles), return_length=True, workers=-1
+        )
+
+
+def station_lon_lat(stations):
+    """
+    Station lon/lat in WGS84, whatever CRS the shapefile uses.
+    """
+    if stations.crs is not None and not stations.crs.is_geographic:
+        stations = stations.to_crs("EPSG:4326")
+    return stations.geometry.x.to_numpy(), stations.geometry.y.to_numpy()
+
+
+def zcta_points(zcta) -> pd.DataFrame:
+    """
+    One point per ZCTA: the Census internal point (INTPTLON20 / INTPTLAT20),
+    which always falls inside the polygon.
+    """
+    return pd.DataFrame(
+        {
+            "zip_code": zcta[ZCTA_ID_COLUMN].astype(str).to_numpy(),
+            "lon": pd.to_numeric(zcta["INTPTLON20"]).to_numpy(),
+            "lat": pd.to_numeric(zcta["INTPTLAT20"]).to_numpy(),
+        }
+    )
+
+
+def station_accessibility(
+    points: pd.DataFrame, index: StationIndex, radii=ACCESS_RADII_MILES
+) -> pd.DataFrame:
+    """
+    For points (zip_code, lon, lat): distance to the nearest station and
+    station counts within each radius. Returns the "accessibility" schema.
+    """
+    lon, lat = points["lon"].to_numpy(), points["lat"].to_numpy()
+    out = pd.DataFrame(
+        {
+            "zip_code": points["zip_code"].to_numpy(),
+            "nearest_station_miles": index.nearest_miles(lon, lat),
+        }
+    )
+    for miles in radii:
+        out[radius_column(miles)] = index.count_within(lon, lat, miles)
+    return coerce_schema(out, "accessibility")
+
+
+def accessibility_by_zip(
+    stations_shp: str = METRO_STATIONS_SHP,
+    zcta_shp: str = ZCTA_SHP,
+    zips=None,
+    geo_level: str = "zcta",
+) -> pd.DataFrame:
+    """
+    Accessibility measures for every ZCTA in a ZIP list (see
+    station_accessibility), using the attribute columns of the cached
+    ZCTA geometry store (no polygon is parsed). With geo_level
+    "tract" or "block_group", zips are GEOIDs of that TIGER/Line layer.
+    """
+    stations = load_metro_stations(stations_shp)
+    index = StationIndex(*station_lon_lat(stations))
+    if geo_level == "zcta":
+        points = zcta_points(load_zcta_store(zcta_shp, zips).attributes())
+    else:
+        points = load_unit_points(geo_level, zips)
+    return station_accessibility(points, index)
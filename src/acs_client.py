@@ -0,0 +1,272 @@
+import os
+import time
+import random
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from config import (
+    ACS_ZCTA_BATCH_SIZE,
+    ACS_MAX_CONCURRENCY,
+    ACS_MAX_RETRIES,
+    ACS_BACKOFF_SECONDS,
+    ACS_BACKOFF_MAX_SECONDS,
+    ACS_TIMEOUT_SECONDS,
+    ACS_CACHE_TTL_SECONDS,
+)
+from src.http_cache import HTTPCache, cache_key
+from src import instrument
+
+# Load API key from .env file
+load_dotenv()
+API_KEY = os.getenv("CENSUS_API_KEY")
+
+ZCTA_GEO = "zip code tabulation area"
+
+# Sub-county levels: ACS "for" geography, the "in" clause for one county,
+# and the response columns that concatenate (in order) to the GEOID
+ACS_GEO_LEVELS = {
+    "tract": ("tract", "state:{state} county:{county}", ["state", "county", "tract"]),
+    "block_group": (
+        "block group",
+        "state:{state} county:{county} tract:*",
+        ["state", "county", "tract", "block group"],
+    ),
+}
+
+# Status codes that mean "the server is pushing back, try again later"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    """
+    Convert a Retry-After header (seconds or HTTP date) to seconds.
+    Returns None if the header is missing or unreadable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveThrottle:
+    """
+    Shared pacing for all worker threads of one client.
+
+    Starts with no delay between requests. Every 429/5xx doubles the
+    spacing between request starts (and pauses everyone until any
+    Retry-After has passed); every success halves it again.
+    """
+
+    def __init__(self, base=ACS_BACKOFF_SECONDS, maximum=ACS_BACKOFF_MAX_SECONDS):
+        self.base = base
+        self.maximum = maximum
+        self.delay = 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+    def push_back(self, pause):
+        with self._lock:
+            self.delay = min(max(self.delay * 2, self.base), self.maximum)
+            self._next_start = max(self._next_start, time.monotonic() + pause)
+
+    def success(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > 0.01 else 0.0
+
+
+class ACSClient:
+    """
+    Connection-pooled HTTP client for the Census APIs.
+
+    Keeps TLS connections alive in one requests.Session, runs up to
+    max_concurrency requests at once and retries 429/5xx responses with
+    exponential backoff (or the server's Retry-After) instead of
+    sleeping a fixed time after every call.
+
+    Successful responses go through an on-disk HTTPCache (pass
+    cache=False to turn it off), so repeated runs skip the network.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=ACS_MAX_CONCURRENCY,
+        max_retries=ACS_MAX_RETRIES,
+        backoff=ACS_BACKOFF_SECONDS,
+        backoff_max=ACS_BACKOFF_MAX_SECONDS,
+        timeout=ACS_TIMEOUT_SECONDS,
+        cache=None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.throttle = AdaptiveThrottle(backoff, backoff_max)
+        self.cache = HTTPCache() if cache is None else cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_concurrency, pool_maxsize=max_concurrency
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff_delay(self, attempt):
+        delay = min(self.backoff * (2 ** attempt), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _send(self, url, params=None, headers=None):
+        """
+        GET with retries. Returns the final requests.Response; raises
+        requests.RequestException if the connection keeps failing.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.throttle.wait()
+            last_try = attempt == self.max_retries
+            if attempt:
+                instrument.count("http_retries")
+
+            try:
+                instrument.count("http_requests")
+                r = self.session.get(
+                    url, params=params, headers=headers, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                instrument.count("http_errors")
+                if last_try:
+                    raise
+                self.throttle.push_back(self._backoff_delay(attempt))
+                continue
+
+            instrument.count("http_bytes", len(r.content))
+            if r.status_code in RETRY_STATUSES:
+                # still pushing back: slow everyone down, even when this
+                # request has run out of retries and is returned as is
+                pause = parse_retry_after(r.headers.get("Retry-After"))
+                if pause is None:
+                    pause = self._backoff_delay(attempt)
+                self.throttle.push_back(pause)
+                if last_try:
+                    return r
+                continue
+
+            self.throttle.success()
+            return r
+
+    def get(self, url, params=None, ttl=ACS_CACHE_TTL_SECONDS):
+        """
+        Cached GET. A cached entry younger than ttl seconds (ttl=None:
+        any age) is returned without touching the network; an older one
+        is revalidated with If-None-Match / If-Modified-Since.
+        """
+        if not self.cache:
+            return self._send(url, params)
+
+        key = cache_key(url, params)
+        hit = self.cache.lookup(key)
+        headers = None
+
+        if hit:
+            meta, content = hit
+            if self.cache.is_fresh(meta, ttl):
+                instrument.count("http_cache_hits")
+                return self.cache.response(meta, content)
+            headers = self.cache.conditional_headers(meta)
+
+        r = self._send(url, params, headers)
+
+        if r.status_code == 304 and hit:
+            instrument.count("http_not_modified")
+            self.cache.mark_validated(key, meta)
+            return self.cache.response(meta, content)
+        if r.status_code == 200:
+            self.cache.store(key, url, r.status_code, r.content, r.headers)
+        return r
+
+    def get_many(self, url, params_list, ttl=ACS_CACHE_TTL_SECONDS, on_result=None):
+        """
+        Run get() for every params dict, at most max_concurrency at a time.
+        url is one URL for all requests or a list with one per params dict.
+        Results come back in the same order as params_list; a request that
+        failed outright is returned as the exception it raised.
+        on_result(index, result), when given, is called from the worker
+        thread as soon as each request finishes (e.g. to checkpoint it).
+        """
+        urls = [url] * len(params_list) if isinstance(url, str) else list(url)
+
+        def _one(i, url, params):
+            try:
+                result = self.get(url, params, ttl)
+            except requests.RequestException as e:
+                result = e
+            if on_result is not None:
+                on_result(i, result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(
+                pool.map(instrument.bind(_one), range(len(urls)), urls, params_list)
+            )
+
+
+_default_client = None
+
+
+def get_client():
+    """
+    Return the shared module-level ACSClient (created on first use).
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = ACSClient()
+    return _default_client
+
+
+def chunk_zips(zips, batch_size=ACS_ZCTA_BATCH_SIZE):
+    """
+    Split a list of ZIP codes into comma-joined "for" clauses.
+    batch_size=None returns a single wildcard clause ("*").
+    """
+    if batch_size is None:
+        return ["*"]
+
+    zips = list(zips)
+    return [
+        ",".join(zips[i:i + batch_size]) for i in range(0, len(zips), batch_size)
+    ]
+
+
+def parse_acs_rows(data, variables, geo_columns=(ZCTA_GEO,)):
+    """
+    Turn an ACS JSON payload (header row + data rows) into a dict
+    keyed by ZCTA (or the GEOID built from geo_columns) with
+    [NAME, var1, var2, ...] values.
+    """
+    header = data[0]
+    name_idx = header.index("NAME")
+    var_idx = [header.index(v) for v in variables]
+    geo_idx = [header.index(c) for c in geo_columns]
+
+    rows = {}
+    for row in data[1:]:
+        geoid = "".join(row[i] for i in geo_idx)
+        rows[geoid] = [row[name_idx]] + [row[i] for i in var_idx]
+    return rows
@@ -0,0 +1,154 @@
+import os
+import argparse
+import pandas as pd
+
+from config import (
+    ACS_BASE_URL,
+    ACS_PANEL_YEARS,
+    ACS_PANEL_DIR,
+    ACS_PANEL_PARQUET,
+    ACS_ZCTA_BATCH_SIZE,
+)
+from src.acs_variables import (
+    DATASET_URLS,
+    IncompleteFetchError,
+    fetch_acs_variables,
+)
+from src.artifacts import read_artifact, write_artifact
+from src.crosswalk import get_la_county_zips
+
+# Registered ACS variables (src/acs_variables.py) tracked across years
+PANEL_MEASURES = ("mean_commute_minutes", "median_household_income")
+
+
+def acs_url(year, dataset, base=ACS_BASE_URL) -> str:
+    """
+    ACS 5-year endpoint for one release: <base>/2019/acs/acs5[/subject].
+    """
+    url = f"{base}/{year}/acs/acs5"
+    return f"{url}/subject" if dataset == "subject" else url
+
+
+def year_path(year, out_dir=ACS_PANEL_DIR) -> str:
+    return os.path.join(out_dir, f"acs_{year}.parquet")
+
+
+def journal_path(year, out_dir=ACS_PANEL_DIR) -> str:
+    return os.path.join(out_dir, f"acs_{year}.jsonl")
+
+
+def _long(wide, year, measures) -> pd.DataFrame:
+    long = wide.melt(
+        id_vars="zip_code", value_vars=list(measures), var_name="measure"
+    )
+    long.insert(1, "year", year)
+    return long.sort_values(["zip_code", "measure"], ignore_index=True)
+
+
+def fetch_panel_year(
+    year,
+    zips,
+    measures=PANEL_MEASURES,
+    batch_size=ACS_ZCTA_BATCH_SIZE,
+    client=None,
+    base_url=ACS_BASE_URL,
+    journal=None,
+) -> pd.DataFrame:
+    """
+    Fetch every measure for one ACS release through fetch_acs_variables
+    (same batching, suppression codes and scaling as the main pull), with
+    the dataset endpoints pointed at that year.
+
+    Returns the long panel slice: zip_code, year, measure, value, with
+    ZIPs missing from the release as NaN. With journal, failed requests
+    raise IncompleteFetchError whose table is the (wide) partial result.
+    """
+    urls = {dataset: acs_url(year, dataset, base_url) for dataset in DATASET_URLS}
+    wide = fetch_acs_variables(
+        zips,
+        list(measures),
+        batch_size,
+        client,
+        journal=journal,
+        dataset_urls=urls,
+    )
+    return _long(wide, year, measures)
+
+
+def build_panel(
+    years=ACS_PANEL_YEARS,
+    zips=None,
+    out_dir=ACS_PANEL_DIR,
+    output=ACS_PANEL_PARQUET,
+    force=False,
+    measures=PANEL_MEASURES,
+    **fetch_kwargs,
+) -> pd.DataFrame:
+    """
+    Build the ZCTA x year panel incrementally. Each year is stored in
+    its own file (out_dir/acs_<year>.parquet); a year is fetched only
+    if that file is missing, lacks some of the ZIPs, or force is set,
+    so adding a new ACS release costs just that year's requests.
+
+    Each year's fetch is journaled next to its file. A year with failed
+    requests (or no data at all) is used for this run but not cached,
+    and the next run fetches only its missing batches.
+    The assembled long panel is written to output and returned.
+    """
+    zips = [str(z) for z in (get_la_county_zips() if zips is None else zips)]
+    wanted = set(zips)
+
+    frames, todo = {}, []
+    for year in years:
+        path = year_path(year, out_dir)
+        if not force and os.path.exists(path):
+            df = read_artifact("acs_panel", path)
+            if wanted <= set(df["zip_code"]):
+                frames[year] = df[df["zip_code"].isin(wanted)]
+                continue
+        todo.append(year)
+
+    if todo:
+        print(f"Fetching ACS years {todo} ({len(years) - len(todo)} cached)")
+        os.makedirs(out_dir, exist_ok=True)
+    for year in todo:
+        try:
+            df = fetch_panel_year(
+                year, zips, measures, journal=journal_path(year, out_dir), **fetch_kwargs
+            )
+        except IncompleteFetchError as e:
+            print(f"ACS {year}: {e}; not cached")
+            frames[year] = _long(e.table, year, measures)
+            continue
+        if df["value"].isna().all():
+            # release not published for these ZIPs: retry next run
+            print(f"No ACS data for {year}; not cached")
+            frames[year] = df
+        else:
+            frames[year] = write_artifact(df, "acs_panel", year_path(year, out_dir))
+
+    panel = pd.concat([frames[y] for y in years], ignore_index=True)
+    return write_artifact(panel, "acs_panel", output)
+
+
+def panel_wide(panel: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per (zip_code, year), one column per measure.
+    """
+    wide = panel.pivot(index=["zip_code", "year"], columns="measure", values="value")
+    wide.columns.name = None
+    return wide.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fetch a ZCTA x year ACS panel for LA County."
+    )
+    parser.add_argument(
+        "--years", type=int, nargs="+", default=list(ACS_PANEL_YEARS)
+    )
+    parser.add_argument("--force", action="store_true", help="refetch every year")
+    args = parser.parse_args()
+
+    panel = build_panel(args.years, force=args.force)
+    print(f"Saved {len(panel)} panel rows to {ACS_PANEL_PARQUET}")
@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+
+# Annotation values the ACS returns instead of an estimate
+# (no sample, too few observations, median in an open-ended interval, ...)
+ANNOTATION_CODES = (
+    -999999999,
+    -888888888,
+    -666666666,
+    -555555555,
+    -333333333,
+    -222222222,
+)
+
+ALL_LEVELS = ("zcta", "tract", "block_group")
+
+
+@dataclass(frozen=True)
+class ACSVariable:
+    """
+    One ACS estimate as a column of the feature table: the API code,
+    the dataset it lives in, the column dtype, the factor applied to
+    the raw value and the codes that mean "no estimate".
+    """
+
+    name: str
+    code: str
+    dataset: str = "detailed"
+    dtype: str = "float32"
+    scale: float = 1.0
+    suppression: tuple = ANNOTATION_CODES
+    geo_levels: tuple = ALL_LEVELS
+
+
+ACS_VARIABLES = {
+    v.name: v
+    for v in [
+        # S0801 reports minutes x 1000; not published for block groups
+        ACSVariable(
+            "mean_commute_minutes",
+            "S0801_C02_001E",
+            "subject",
+            scale=1 / 1000,
+            geo_levels=("zcta",),
+        ),
+        ACSVariable("median_household_income", "B19013_001E"),
+        ACSVariable("aggregate_commute_minutes", "B08013_001E"),
+        ACSVariable("commuters", "B08303_001E", dtype="Int32"),
+        ACSVariable("population", "B01003_001E", dtype="Int32"),
+        ACSVariable("workers", "B08301_001E", dtype="Int32"),
+        ACSVariable("transit_commuters", "B08301_010E", dtype="Int32"),
+        ACSVariable("households", "B08201_001E", dtype="Int32"),
+        ACSVariable("households_no_vehicle", "B08201_002E", dtype="Int32"),
+    ]
+}
+
+
+def feature_schema(names=None, registry=ACS_VARIABLES) -> dict:
+    """
+    Artifact schema of a feature table: NAME, one column per variable,
+    zip_code. For the full registry this is SCHEMAS["acs_features"]
+    in src/artifacts.py.
+    """
+    names = list(registry) if names is None else names
+    return {
+        "NAME": "string",
+        **{name: registry[name].dtype for name in names},
+        "zip_code": "zip",
+    }
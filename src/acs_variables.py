@@ -0,0 +1,274 @@
+import pandas as pd
+
+from config import (
+    ACS_SUBJECT_URL,
+    ACS_DETAILED_URL,
+    ACS_MAX_VARIABLES,
+    ACS_ZCTA_BATCH_SIZE,
+    LA_STATE_FIPS,
+    LA_COUNTY_FIPS,
+)
+from src.acs_client import (
+    ACS_GEO_LEVELS,
+    API_KEY,
+    ZCTA_GEO,
+    chunk_zips,
+    get_client,
+    parse_acs_rows,
+)
+# the registry itself lives in src/acs_registry.py, which src/artifacts.py
+# imports without pulling in the HTTP client
+from src.acs_registry import ACS_VARIABLES, ACSVariable, feature_schema  # noqa: F401
+from src.fetch_journal import FetchJournal
+
+# ACS dataset -> endpoint; every variable of one dataset can share a request
+DATASET_URLS = {
+    "subject": ACS_SUBJECT_URL,
+    "detailed": ACS_DETAILED_URL,
+}
+
+
+class IncompleteFetchError(RuntimeError):
+    """
+    Some journaled requests failed. The journal keeps every finished
+    one, so a rerun fetches only the rest; table holds what came back
+    (failed ZIPs are missing).
+    """
+
+    def __init__(self, message, table):
+        super().__init__(message)
+        self.table = table
+
+
+def _commute_from_aggregate(df):
+    return df["aggregate_commute_minutes"] / df["commuters"].where(df["commuters"] > 0)
+
+
+# Variables that a geography level does not publish, rebuilt from others:
+# name -> (variables needed, function of the scaled float frame)
+DERIVED = {
+    "mean_commute_minutes": (
+        ["aggregate_commute_minutes", "commuters"],
+        _commute_from_aggregate,
+    ),
+}
+
+
+def request_plan(
+    names,
+    registry=ACS_VARIABLES,
+    max_variables=ACS_MAX_VARIABLES,
+    dataset_urls=DATASET_URLS,
+):
+    """
+    Group variables by dataset endpoint and split each group into
+    requests of at most max_variables "get" fields (NAME included).
+    dataset_urls maps each dataset to its endpoint (e.g. another
+    release year). Returns [(url, [variable, ...]), ...].
+    """
+    groups = {}
+    for name in names:
+        groups.setdefault(registry[name].dataset, []).append(registry[name])
+
+    per_call = max_variables - 1
+    return [
+        (dataset_urls[dataset], group[i:i + per_call])
+        for dataset, group in groups.items()
+        for i in range(0, len(group), per_call)
+    ]
+
+
+def _resolve(names, geo_level, registry):
+    """
+    (variables to request, variables rebuilt from them) at one level.
+    """
+    fetch, derived = [], []
+    for name in names:
+        if geo_level in registry[name].geo_levels:
+            fetch.append(name)
+        elif name in DERIVED:
+            derived.append(name)
+            fetch.extend(DERIVED[name][0])
+        else:
+            raise ValueError(f"{name} is not published at the {geo_level} level")
+    return list(dict.fromkeys(fetch)), derived
+
+
+def _unit_key(url, codes, within=None):
+    # one journal "unit" = one endpoint + variable group (+ county clause);
+    # the API key is never part of it
+    return "|".join([url, ",".join(codes), within or ""])
+
+
+def _completed(records) -> dict:
+    """
+    unit -> set of ZIPs (or "*") whose request already succeeded.
+    """
+    done = {}
+    for record in records:
+        if record.get("status") == "ok":
+            done.setdefault(record["unit"], set()).update(record["zips"])
+    return done
+
+
+def _response_record(unit, group, clause, r, geo_columns) -> dict:
+    """
+    Journal record for one finished request: the ZIPs it covered, its
+    status and, when it succeeded, the raw rows keyed by GEOID.
+    """
+    record = {
+        "unit": unit,
+        "variables": [v.name for v in group],
+        "zips": clause.split(":", 1)[1].split(","),
+        "status": "failed",
+        "rows": {},
+    }
+    if isinstance(r, Exception):
+        print(f"Error for {clause[:40]}...: {r}")
+    elif r.status_code == 200:
+        try:
+            record["rows"] = parse_acs_rows(r.json(), [v.code for v in group], geo_columns)
+            record["status"] = "ok"
+        except Exception as e:
+            print(f"JSON decode error for {clause[:40]}...: {e}")
+    elif r.status_code == 204:
+        # none of the ZIPs in this batch exist in the table
+        record["status"] = "ok"
+    else:
+        print(f"Error for {clause[:40]}...: {r.status_code}")
+    return record
+
+
+def fetch_acs_variables(
+    zips,
+    names=None,
+    batch_size=ACS_ZCTA_BATCH_SIZE,
+    client=None,
+    geo_level="zcta",
+    state=LA_STATE_FIPS,
+    county=LA_COUNTY_FIPS,
+    registry=ACS_VARIABLES,
+    max_variables=ACS_MAX_VARIABLES,
+    journal=None,
+    dataset_urls=DATASET_URLS,
+) -> pd.DataFrame:
+    """
+    Pull registered ACS variables (every one by default) into one wide
+    table.
+
+    Variables are grouped by endpoint, up to max_variables per request,
+    so more variables only add requests once a group passes the API
+    limit. At ZCTA level each group is requested batch_size ZIPs at a
+    time; tracts and block groups take one request per group for the
+    whole county (zips are GEOIDs). All requests go out concurrently
+    through the shared ACSClient. dataset_urls overrides the endpoints
+    (e.g. to fetch another ACS release).
+
+    Raw values are scaled, annotation codes become missing and each
+    column gets its registered dtype. Returns NAME, <names...>,
+    zip_code with one row per requested ZIP in input order.
+
+    With journal (a path or FetchJournal), every finished request is
+    checkpointed to that JSONL file as it completes. A rerun after a
+    crash or interrupt skips the ZIPs already fetched, requests only
+    the missing and failed ones, and builds the table from the
+    journal. The journal is deleted once nothing failed; otherwise it
+    is kept and IncompleteFetchError is raised, so callers (e.g. a
+    pipeline stage) do not record the partial table as done.
+    """
+    client = client or get_client()
+    names = list(registry) if names is None else list(names)
+    fetch, derived = _resolve(names, geo_level, registry)
+    zips = [str(z) for z in zips]
+    wanted = set(zips)
+
+    if geo_level == "zcta":
+        geo_columns, placeholder, within = (ZCTA_GEO,), "ZCTA5", None
+    else:
+        geography, within, geo_columns = ACS_GEO_LEVELS[geo_level]
+        placeholder = geography
+        within = within.format(state=state, county=county)
+
+    if isinstance(journal, str):
+        journal = FetchJournal(journal)
+    history = journal.records() if journal else []
+    done = _completed(history)
+
+    units, plan, urls, params_list = set(), [], [], []
+    for url, group in request_plan(fetch, registry, max_variables, dataset_urls):
+        codes = [v.code for v in group]
+        unit = _unit_key(url, codes, within)
+        units.add(unit)
+        finished = done.get(unit, set())
+        if "*" in finished:
+            continue
+        if geo_level == "zcta":
+            pending = [z for z in zips if z not in finished]
+            geo_params = [
+                {"for": f"{ZCTA_GEO}:{c}"} for c in chunk_zips(pending, batch_size)
+            ]
+        else:
+            geo_params = [{"for": f"{geography}:*", "in": within}]
+        for geo in geo_params:
+            plan.append((unit, group, geo["for"]))
+            urls.append(url)
+            params_list.append(
+                {"get": ",".join(["NAME"] + codes), **geo, "key": API_KEY}
+            )
+
+    if history:
+        print(f"Resuming from {journal.path}: {len(plan)} requests left")
+
+    records = [None] * len(plan)
+
+    def checkpoint(i, r):
+        records[i] = _response_record(*plan[i], r, geo_columns)
+        if journal:
+            journal.append(records[i])
+
+    try:
+        client.get_many(urls, params_list, on_result=checkpoint)
+    finally:
+        if journal:
+            journal.close()
+
+    failed = sum(r["status"] != "ok" for r in records)
+    if journal and not failed:
+        journal.discard()
+
+    found = {}
+    for record in history + records:
+        if record["status"] != "ok" or record["unit"] not in units:
+            continue
+        for geoid, values in record["rows"].items():
+            if geoid in wanted:
+                row = found.setdefault(geoid, {"NAME": values[0]})
+                row.update(zip(record["variables"], values[1:]))
+
+    raw = pd.DataFrame.from_dict(found, orient="index", columns=["NAME"] + fetch)
+    raw = raw.reindex(zips)
+
+    values = {}
+    for name in fetch:
+        var = registry[name]
+        column = pd.to_numeric(raw[name], errors="coerce").astype("float64")
+        column = column.where(~column.isin(var.suppression))
+        values[name] = column * var.scale if var.scale != 1 else column
+    for name in derived:
+        values[name] = DERIVED[name][1](values)
+
+    df = pd.DataFrame(
+        {
+            "NAME": raw["NAME"].fillna(
+                pd.Series([f"{placeholder} {z}" for z in zips], index=raw.index)
+            ),
+            **{name: values[name].astype(registry[name].dtype) for name in names},
+            "zip_code": zips,
+        }
+    ).reset_index(drop=True)
+
+    if journal and failed:
+        raise IncompleteFetchError(
+            f"{failed} requests failed; rerun to retry them ({journal.path})", df
+        )
+    return df
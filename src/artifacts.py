@@ -0,0 +1,155 @@
+import os
+import pandas as pd
+
+from config import ACCESS_RADII_MILES
+from src import instrument
+from src.acs_registry import feature_schema
+
+# "zip" = 5-character, zero-padded string ZIP code (or, at tract /
+# block-group level, the 11- / 12-digit GEOID); the rest are pandas dtypes
+SCHEMAS = {
+    "zip_list": {
+        "zip_code": "zip",
+    },
+    # wide ACS table; one column per variable of src/acs_registry.py
+    "acs_features": feature_schema(),
+    "station_counts": {
+        "zip_code": "zip",
+        "station_count": "Int32",
+    },
+    "final": {
+        "zip_code": "zip",
+        "station_count": "Int32",
+        "mean_commute_time": "float32",
+        "median_income": "float32",
+    },
+    "acs_panel": {
+        "zip_code": "zip",
+        "year": "Int32",
+        "measure": "string",
+        "value": "float32",
+    },
+}
+SCHEMAS["final_clean"] = SCHEMAS["final"]
+
+
+def radius_column(miles) -> str:
+    """
+    Column name for "stations within `miles`": 0.5 -> stations_0_5mi.
+    """
+    return "stations_" + f"{miles:g}".replace(".", "_") + "mi"
+
+
+SCHEMAS["accessibility"] = {
+    "zip_code": "zip",
+    "nearest_station_miles": "float32",
+    **{radius_column(miles): "Int32" for miles in ACCESS_RADII_MILES},
+}
+
+
+class ArtifactSchemaError(ValueError):
+    """
+    Raised when a dataset does not match its declared schema.
+    """
+
+
+def _pandas_dtype(kind):
+    return pd.StringDtype() if kind == "zip" else pd.api.types.pandas_dtype(kind)
+
+
+def _coerce_zip(values: pd.Series, name: str) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(values):
+        values = values.astype("Int64")
+    zips = values.astype("string").str.strip().str.zfill(5)
+
+    bad = zips.isna() | ~zips.str.fullmatch(r"\d{5}|\d{11,12}").fillna(False)
+    if bad.any():
+        raise ArtifactSchemaError(
+            f"{name}: invalid zip_code values {zips[bad].head().tolist()}"
+        )
+    return zips
+
+
+def coerce_schema(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """
+    Cast df to the schema registered under name. Schema columns come
+    first, in schema order; extra columns are kept after them. Missing
+    columns or values that cannot be cast raise ArtifactSchemaError.
+    """
+    schema = SCHEMAS[name]
+    missing = [c for c in schema if c not in df.columns]
+    if missing:
+        raise ArtifactSchemaError(f"{name}: missing columns {missing}")
+
+    out = df.copy()
+    for col, kind in schema.items():
+        if kind == "zip":
+            out[col] = _coerce_zip(out[col], name)
+            continue
+        try:
+            if kind in ("float32", "Int32"):
+                out[col] = pd.to_numeric(out[col], errors="raise").astype(kind)
+            else:
+                out[col] = out[col].astype(kind)
+        except (TypeError, ValueError) as e:
+            raise ArtifactSchemaError(f"{name}.{col}: cannot cast to {kind}: {e}")
+
+    extra = [c for c in out.columns if c not in schema]
+    return out[list(schema) + extra]
+
+
+def check_schema(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """
+    Verify that df already has exactly the registered dtypes.
+    """
+    for col, kind in SCHEMAS[name].items():
+        if col not in df.columns:
+            raise ArtifactSchemaError(f"{name}: missing column {col}")
+        if df[col].dtype != _pandas_dtype(kind):
+            raise ArtifactSchemaError(
+                f"{name}.{col}: expected {kind}, found {df[col].dtype}"
+            )
+    return df
+
+
+def write_artifact(
+    df: pd.DataFrame, name: str, path: str, csv_path: str = None
+) -> pd.DataFrame:
+    """
+    Coerce df to its schema and write it as Parquet (or Feather/CSV,
+    by file extension). csv_path additionally exports a CSV copy.
+    Returns the typed frame.
+    """
+    typed = coerce_schema(df, name)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".parquet"):
+        typed.to_parquet(path, index=False)
+    elif path.endswith(".feather"):
+        typed.reset_index(drop=True).to_feather(path)
+    else:
+        typed.to_csv(path, index=False)
+
+    if csv_path:
+        os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+        typed.to_csv(csv_path, index=False)
+
+    instrument.record_rows(f"write:{name}", len(typed))
+    return typed
+
+
+def read_artifact(name: str, path: str) -> pd.DataFrame:
+    """
+    Load a dataset written by write_artifact.
+    Parquet/Feather files must already match the schema exactly;
+    CSV files are parsed and coerced.
+    """
+    if path.endswith(".parquet"):
+        df = check_schema(pd.read_parquet(path), name)
+    elif path.endswith(".feather"):
+        df = check_schema(pd.read_feather(path), name)
+    else:
+        df = coerce_schema(pd.read_csv(path, dtype={"zip_code": str}), name)
+
+    instrument.record_rows(f"read:{name}", len(df))
+    return df
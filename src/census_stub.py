@@ -0,0 +1,267 @@
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from urllib.request import urlopen
+
+import numpy as np
+
+# Roughly the size of the real study area: ZCTAs and Metro rail stations
+# in LA County. Synthetic data is generated at multiples of this.
+LA_ZCTAS = 280
+LA_STATIONS = 100
+
+# Lower-left corner and cell size (degrees) of the synthetic ZCTA grid
+GRID_ORIGIN = (-118.5, 33.5)
+GRID_CELL = 0.1
+
+
+def grid_side(scale=1):
+    """
+    Side length of a square grid with about scale x LA_ZCTAS cells.
+    """
+    return math.ceil(math.sqrt(LA_ZCTAS * scale))
+
+
+def grid_zips(n=10, first_zip=90000):
+    """
+    ZCTA ids of an n x n grid, row by row from GRID_ORIGIN.
+    """
+    return [f"{first_zip + i:05d}" for i in range(n * n)]
+
+
+def make_synthetic_zcta_shp(folder, n=10, first_zip=90000):
+    """
+    Write an n x n grid of 0.1-degree square "ZCTAs" to a shapefile.
+    ZCTA ids are first_zip, first_zip + 1, ... row by row from
+    (-118.5, 33.5). Returns the .shp path.
+    """
+    import geopandas as gpd
+    import shapely
+
+    i = np.arange(n * n)
+    x0 = GRID_ORIGIN[0] + (i % n) * GRID_CELL
+    y0 = GRID_ORIGIN[1] + (i // n) * GRID_CELL
+    gdf = gpd.GeoDataFrame(
+        {
+            "ZCTA5CE20": grid_zips(n, first_zip),
+            "ALAND20": 1000,
+            "AWATER20": 0,
+            "INTPTLAT20": [f"{y + GRID_CELL / 2:+.7f}" for y in y0],
+            "INTPTLON20": [f"{x + GRID_CELL / 2:+.7f}" for x in x0],
+        },
+        geometry=shapely.box(x0, y0, x0 + GRID_CELL, y0 + GRID_CELL),
+        crs="EPSG:4269",
+    )
+    path = os.path.join(folder, "tl_test_zcta.shp")
+    gdf.to_file(path)
+    return path
+
+
+def grid_geoids(n=10, geo_level="tract", state="06", county="037"):
+    """
+    GEOIDs of an n x n grid of tracts (or block groups, one per tract).
+    """
+    suffix = "1" if geo_level == "block_group" else ""
+    return [f"{state}{county}{100 * (i + 1):06d}{suffix}" for i in range(n * n)]
+
+
+def make_synthetic_tract_shp(folder, n=10, geo_level="tract", state="06", county="037"):
+    """
+    Write an n x n grid of 0.1-degree square tracts (or block groups)
+    with TIGER/Line columns, over the same area as the ZCTA grid.
+    Returns the .shp path.
+    """
+    import geopandas as gpd
+    import shapely
+
+    i = np.arange(n * n)
+    x0 = GRID_ORIGIN[0] + (i % n) * GRID_CELL
+    y0 = GRID_ORIGIN[1] + (i // n) * GRID_CELL
+    gdf = gpd.GeoDataFrame(
+        {
+            "GEOID": grid_geoids(n, geo_level, state, county),
+            "STATEFP": state,
+            "COUNTYFP": county,
+            "INTPTLAT": [f"{y + GRID_CELL / 2:+.7f}" for y in y0],
+            "INTPTLON": [f"{x + GRID_CELL / 2:+.7f}" for x in x0],
+        },
+        geometry=shapely.box(x0, y0, x0 + GRID_CELL, y0 + GRID_CELL),
+        crs="EPSG:4269",
+    )
+    path = os.path.join(folder, f"tl_test_{geo_level}.shp")
+    gdf.to_file(path)
+    return path
+
+
+def make_synthetic_stations_shp(folder, count, n=10, seed=0):
+    """
+    Write `count` random station points inside the n x n grid,
+    with a STOP_ID column like the Metro file. Returns the .shp path.
+    """
+    import geopandas as gpd
+
+    rng = np.random.default_rng(seed)
+    lon = GRID_ORIGIN[0] + rng.random(count) * n * GRID_CELL
+    lat = GRID_ORIGIN[1] + rng.random(count) * n * GRID_CELL
+    gdf = gpd.GeoDataFrame(
+        {"STOP_ID": np.arange(1, count + 1)},
+        geometry=gpd.points_from_xy(lon, lat),
+        crs="EPSG:4326",
+    )
+    path = os.path.join(folder, "test_stations.shp")
+    gdf.to_file(path)
+    return path
+
+
+def start_stub_census_server(
+    zctas=None,
+    latency=0.05,
+    throttle_first=2,
+    state="06",
+    county="037",
+    geoids=None,
+):
+    """
+    Start a local Census look-alike on a free port.
+
+    <url>/crosswalk.txt serves a ZCTA-to-county file placing every ZCTA
+    in (state, county); any other path answers ACS queries. Each
+    request sleeps `latency` seconds and the first `throttle_first`
+    requests get 429 + Retry-After. Every 200 carries an ETag, and a
+    matching If-None-Match gets 304 Not Modified. A "*" query answers
+    for all zctas (default: the 10 x 10 grid, 90000-90099); tract and
+    block-group queries (for=tract:* ...) answer for the GEOIDs in
+    geoids (default: grid_geoids() of that level). <url>/_stats returns
+    the stats dict as JSON.
+
+    Returns (server, url, stats dict).
+    """
+    zctas = grid_zips() if zctas is None else list(zctas)
+    crosswalk = "ZCTA5,STATE,COUNTY,GEOID,POPPT,HUPT,AREAPT\n" + "".join(
+        f"{z},{state},{county},{state}{county},1000,400,1000\n" for z in zctas
+    )
+
+    stats = {
+        "requests": 0,
+        "bytes": 0,
+        "throttled": 0,
+        "not_modified": 0,
+        "in_flight": 0,
+        "max_in_flight": 0,
+    }
+    lock = threading.Lock()
+
+    def value(geoid):
+        return str(20000 + 997 * (int(geoid) % 97))
+
+    def acs_body(query):
+        variables = query["get"][0].split(",")
+        geography, clause = query["for"][0].split(":")
+        if geography in ("tract", "block group"):
+            level = "tract" if geography == "tract" else "block_group"
+            ids = grid_geoids(geo_level=level) if geoids is None else geoids
+            parts = [(0, 2), (2, 5), (5, 11), (11, 12)][: 3 + (level != "tract")]
+            header = ["state", "county", "tract", "block group"][: len(parts)]
+            rows = [variables + header] + [
+                [f"{geography} {g}"]
+                + [value(g)] * (len(variables) - 1)
+                + [g[a:b] for a, b in parts]
+                for g in ids
+            ]
+            return json.dumps(rows).encode(), "application/json"
+
+        zips = clause.split(",")
+        if zips == ["*"]:
+            zips = zctas
+        rows = [variables + ["zip code tabulation area"]] + [
+            [f"ZCTA5 {z}"] + [value(z)] * (len(variables) - 1) + [z] for z in zips
+        ]
+        return json.dumps(rows).encode(), "application/json"
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.endswith("/_stats"):
+                # counters for a stub running in another process; not counted
+                with lock:
+                    body = json.dumps(stats).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            with lock:
+                stats["requests"] += 1
+                stats["in_flight"] += 1
+                stats["max_in_flight"] = max(
+                    stats["max_in_flight"], stats["in_flight"]
+                )
+                throttle = stats["throttled"] < throttle_first
+                if throttle:
+                    stats["throttled"] += 1
+            time.sleep(latency)
+
+            parsed = urlparse(self.path)
+            if parsed.path.endswith("/crosswalk.txt"):
+                body, content_type = crosswalk.encode(), "text/plain"
+            else:
+                body, content_type = acs_body(parse_qs(parsed.query))
+
+            if throttle:
+                self.send_response(429)
+                self.send_header("Retry-After", "0.1")
+                self.end_headers()
+            elif self.headers.get("If-None-Match") == '"v1"':
+                with lock:
+                    stats["not_modified"] += 1
+                self.send_response(304)
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("ETag", '"v1"')
+                self.end_headers()
+                self.wfile.write(body)
+                with lock:
+                    stats["bytes"] += len(body)
+
+            with lock:
+                stats["in_flight"] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/data", stats
+
+
+def _serve_forever(ready, kwargs):
+    _, url, _ = start_stub_census_server(**kwargs)
+    ready.put(url)
+    threading.Event().wait()
+
+
+def start_stub_census_process(**kwargs):
+    """
+    Run start_stub_census_server(**kwargs) in a child process, so the
+    stub's own CPU time and allocations stay out of measurements taken
+    in this one. Returns (process, url); read counters with
+    stub_stats(url) and stop it with process.terminate().
+    """
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve_forever, args=(ready, kwargs), daemon=True
+    )
+    process.start()
+    return process, ready.get(timeout=30)
+
+
+def stub_stats(url) -> dict:
+    with urlopen(f"{url}/_stats") as r:
+        return json.load(r)
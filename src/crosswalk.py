@@ -0,0 +1,213 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from io import BytesIO
+
+from config import (
+    ZCTA_CROSSWALK_URL,
+    CROSSWALK_CACHE_TTL_SECONDS,
+    CROSSWALK_INDEX_PATH,
+    LA_STATE_FIPS,
+    LA_COUNTY_FIPS,
+)
+from src.acs_client import get_client
+from src.http_cache import cache_key
+
+# Only these crosswalk columns are ever used
+CROSSWALK_COLUMNS = ["ZCTA5", "STATE", "COUNTY", "POPPT", "AREAPT"]
+
+# HTTP cache fields identifying the crosswalk version an index was built from
+SOURCE_FIELDS = ("url", "etag", "last_modified")
+SOURCE_METADATA_KEY = b"crosswalk_source"
+
+
+def _share(part, zcta):
+    """
+    Fraction of each ZCTA's total that falls in each county row.
+    """
+    total = part.groupby(zcta).transform("sum")
+    return (part / total.where(total > 0)).fillna(0).astype("float32")
+
+
+def parse_crosswalk(content: bytes) -> pd.DataFrame:
+    """
+    Parse the raw crosswalk text into a compact frame:
+    zcta, state, county, pop_share, area_share (sorted by zcta).
+    """
+    raw = pd.read_csv(
+        BytesIO(content),
+        usecols=CROSSWALK_COLUMNS,
+        dtype={"ZCTA5": str, "STATE": str, "COUNTY": str},
+    )
+
+    frame = pd.DataFrame(
+        {
+            "zcta": raw["ZCTA5"],
+            "state": raw["STATE"],
+            "county": raw["COUNTY"],
+            "pop_share": _share(raw["POPPT"], raw["ZCTA5"]),
+            "area_share": _share(raw["AREAPT"], raw["ZCTA5"]),
+        }
+    )
+    return frame.sort_values(["zcta", "state", "county"], ignore_index=True)
+
+
+def download_crosswalk() -> pd.DataFrame:
+    """
+    Download (or read from the HTTP cache) and parse the crosswalk.
+    """
+    response = get_client().get(
+        ZCTA_CROSSWALK_URL, ttl=CROSSWALK_CACHE_TTL_SECONDS
+    )
+
+    if response.status_code != 200:
+        raise RuntimeError(
+            f"Failed to download crosswalk file: {response.status_code}"
+        )
+
+    return parse_crosswalk(response.content)
+
+
+class CrosswalkIndex:
+    """
+    In-memory index over the compact crosswalk frame.
+
+    - (state, county) -> array of ZCTAs in that county
+    - (state, county) -> ZCTAs whose largest population share (then
+      area share) is in that county, so each ZCTA has exactly one
+    - zcta -> the counties it overlaps, with population/area shares
+    All lookups are a single dict access.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        zcta = frame["zcta"].to_numpy()
+
+        self._county_zctas = {
+            key: zcta[rows]
+            for key, rows in frame.groupby(["state", "county"]).indices.items()
+        }
+
+        primary = frame.sort_values(
+            ["zcta", "pop_share", "area_share"],
+            ascending=[True, False, False],
+            kind="stable",
+        ).drop_duplicates("zcta")
+        self._primary_zctas = {
+            key: group["zcta"].to_numpy()
+            for key, group in primary.groupby(["state", "county"])
+        }
+
+        # frame is sorted by zcta, so each ZCTA owns one contiguous slice
+        starts = np.flatnonzero(np.r_[True, zcta[1:] != zcta[:-1]])
+        ends = np.r_[starts[1:], len(zcta)]
+        self._zcta_rows = dict(zip(zcta[starts], zip(starts, ends)))
+
+    def zips_for_county(self, state, county) -> list:
+        return self._county_zctas.get((state, county), np.array([])).tolist()
+
+    def primary_zips_for_county(self, state, county) -> list:
+        """
+        ZCTAs assigned to this county only (max pop_share, then area_share).
+        """
+        return self._primary_zctas.get((state, county), np.array([])).tolist()
+
+    def counties_for_zip(self, zcta) -> pd.DataFrame:
+        start, end = self._zcta_rows.get(str(zcta), (0, 0))
+        return self.frame.iloc[start:end][
+            ["state", "county", "pop_share", "area_share"]
+        ]
+
+    def counties_in_state(self, state) -> list:
+        return sorted(c for s, c in self._county_zctas if s == state)
+
+
+def crosswalk_source():
+    """
+    Make sure the HTTP cache holds a current copy of the crosswalk
+    (downloading or revalidating it once it is older than its TTL,
+    without parsing it) and return that entry's URL, ETag and
+    Last-Modified. A 304 leaves them unchanged, so the index built from
+    the entry stays valid. Returns None when the shared client has no
+    HTTP cache.
+    """
+    client = get_client()
+    if not client.cache:
+        return None
+
+    key = cache_key(ZCTA_CROSSWALK_URL)
+    meta = client.cache.read_meta(key)
+    if meta is None or not client.cache.is_fresh(meta, CROSSWALK_CACHE_TTL_SECONDS):
+        response = client.get(ZCTA_CROSSWALK_URL, ttl=CROSSWALK_CACHE_TTL_SECONDS)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Failed to download crosswalk file: {response.status_code}"
+            )
+        meta = client.cache.read_meta(key)
+    return {field: (meta or {}).get(field) for field in SOURCE_FIELDS}
+
+
+def _read_index(path, source):
+    # the Parquet index is only valid for the cache entry it was built from
+    if source is None or not os.path.exists(path):
+        return None
+    metadata = pq.read_schema(path).metadata or {}
+    if json.loads(metadata.get(SOURCE_METADATA_KEY, b"null")) != source:
+        return None
+    return pd.read_parquet(path)
+
+
+def _write_index(frame, path, source):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SOURCE_METADATA_KEY] = json.dumps(source).encode()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table.replace_schema_metadata(metadata), tmp)
+    os.replace(tmp, path)
+
+
+# path -> (crosswalk source, CrosswalkIndex) built in this process
+_loaded_indexes = {}
+
+
+def clear_index_cache():
+    """
+    Forget the indexes held in memory (the Parquet files stay).
+    """
+    _loaded_indexes.clear()
+
+
+def load_crosswalk_index(path: str = CROSSWALK_INDEX_PATH) -> CrosswalkIndex:
+    """
+    Return the crosswalk index.
+
+    The compact frame is kept on disk as Parquet, tagged with the HTTP
+    cache entry (URL, ETag, Last-Modified) it was built from, so later
+    runs skip the CSV parse. Each call checks that entry (honouring
+    the crosswalk TTL and ETag revalidation) and rebuilds the index,
+    in memory and on disk, only once the entry has been replaced.
+    """
+    source = crosswalk_source()
+    loaded = _loaded_indexes.get(path)
+    if loaded and loaded[0] == source:
+        return loaded[1]
+
+    frame = _read_index(path, source)
+    if frame is None:
+        frame = download_crosswalk()
+        _write_index(frame, path, source)
+
+    index = CrosswalkIndex(frame)
+    _loaded_indexes[path] = (source, index)
+    return index
+
+
+def get_la_county_zips(state=LA_STATE_FIPS, county=LA_COUNTY_FIPS):
+    """
+    Return a list of ZIP codes (ZCTAs) in a county, LA County by default.
+    """
+    return load_crosswalk_index().zips_for_county(state, county)
@@ -0,0 +1,221 @@
+import os
+import time
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+
+from config import DATASTORE_PATH, ACS_VINTAGE
+from src.artifacts import SCHEMAS
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS observations (
+    vintage    INTEGER NOT NULL,
+    geo_level  TEXT    NOT NULL,
+    geo_id     TEXT    NOT NULL,
+    variable   TEXT    NOT NULL,
+    value      REAL,
+    updated_at REAL    NOT NULL,
+    PRIMARY KEY (vintage, geo_level, geo_id, variable)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_by_variable
+    ON observations (vintage, geo_level, variable, geo_id);
+"""
+
+# Upsert that leaves a row (and its updated_at) alone when the value is unchanged
+UPSERT_SQL = """
+INSERT INTO observations (vintage, geo_level, geo_id, variable, value, updated_at)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (vintage, geo_level, geo_id, variable) DO UPDATE
+SET value = excluded.value, updated_at = excluded.updated_at
+WHERE observations.value IS NOT excluded.value
+"""
+
+# ZIP lists longer than this are joined through a temp table instead of IN (...)
+MAX_SQL_PARAMS = 500
+
+
+def column_dtypes() -> dict:
+    """
+    Registered dtype of every column of the ZIP-level artifacts, used
+    to type query results ("zip" columns are left out).
+    """
+    dtypes = {}
+    for name in ("final", "accessibility", "acs_features", "station_counts"):
+        for column, kind in SCHEMAS.get(name, {}).items():
+            if kind in ("float32", "Int32"):
+                dtypes.setdefault(column, kind)
+    return dtypes
+
+
+class DataStore:
+    """
+    Embedded SQLite store of every fetched and derived value, one row
+    per (vintage, geography level, geo id, variable).
+
+    Both lookup paths are indexed: the primary key serves ZIP subsets
+    and observations_by_variable serves variable sets. Upserts only
+    touch rows whose value changed, so refreshing unchanged data
+    writes nothing, and older vintages stay side by side.
+    """
+
+    def __init__(self, path=DATASTORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as con:
+            con.executescript(SCHEMA_SQL)
+
+    def _connect(self) -> sqlite3.Connection:
+        # one connection per thread (and per forked process); WAL lets
+        # readers run during a write
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    def close(self):
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
+
+    def __reduce__(self):
+        return (DataStore, (self.path,))
+
+    def upsert_long(self, df: pd.DataFrame, geo_level="zcta") -> int:
+        """
+        Upsert long rows (vintage, geo_id, variable, value); missing
+        values are stored as NULL. Returns the number of rows inserted
+        or changed.
+        """
+        values = df["value"].astype("float64").to_numpy()
+        rows = zip(
+            df["vintage"].astype(int).tolist(),
+            [geo_level] * len(df),
+            df["geo_id"].astype(str).tolist(),
+            df["variable"].astype(str).tolist(),
+            [None if np.isnan(v) else float(v) for v in values],
+            [time.time()] * len(df),
+        )
+        con = self._connect()
+        before = con.total_changes
+        with con:
+            con.executemany(UPSERT_SQL, rows)
+        return con.total_changes - before
+
+    def upsert_frame(
+        self,
+        df: pd.DataFrame,
+        vintage=ACS_VINTAGE,
+        geo_level="zcta",
+        variables=None,
+        id_column="zip_code",
+    ) -> int:
+        """
+        Upsert a wide table (one row per ZIP, one column per variable;
+        by default every numeric column). Returns the rows changed.
+        """
+        if variables is None:
+            variables = [
+                c
+                for c in df.columns
+                if c != id_column and pd.api.types.is_numeric_dtype(df[c])
+            ]
+        long = df[[id_column] + list(variables)].melt(
+            id_vars=id_column, var_name="variable", value_name="value"
+        )
+        long = long.rename(columns={id_column: "geo_id"})
+        long["value"] = pd.to_numeric(long["value"], errors="coerce")
+        long["vintage"] = vintage
+        return self.upsert_long(long, geo_level)
+
+    def query_long(
+        self, variables=None, zips=None, vintage=ACS_VINTAGE, geo_level="zcta"
+    ) -> pd.DataFrame:
+        """
+        Long rows (geo_id, variable, value, updated_at) for a variable
+        set and / or ZIP subset (None = all) of one vintage and level.
+        """
+        sql = (
+            "SELECT geo_id, variable, value, updated_at FROM observations "
+            "WHERE vintage = ? AND geo_level = ?"
+        )
+        params = [int(vintage), geo_level]
+        if variables is not None:
+            variables = list(variables)
+            sql += f" AND variable IN ({','.join('?' * len(variables))})"
+            params += variables
+
+        con = self._connect()
+        if zips is None:
+            return pd.read_sql_query(sql, con, params=params)
+
+        zips = [str(z) for z in zips]
+        if len(zips) <= MAX_SQL_PARAMS:
+            sql += f" AND geo_id IN ({','.join('?' * len(zips))})"
+            return pd.read_sql_query(sql, con, params=params + zips)
+
+        with con:
+            con.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (geo_id TEXT PRIMARY KEY)")
+            con.execute("DELETE FROM wanted")
+            con.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", [(z,) for z in zips])
+        sql += " AND geo_id IN (SELECT geo_id FROM wanted)"
+        return pd.read_sql_query(sql, con, params=params)
+
+    def query(
+        self, variables=None, zips=None, vintage=ACS_VINTAGE, geo_level="zcta"
+    ) -> pd.DataFrame:
+        """
+        Wide table: zip_code plus one column per variable, typed like
+        the pipeline artifacts (float64 for unregistered variables).
+        Rows follow zips when given (missing ZIPs get empty values),
+        otherwise ZIP order.
+        """
+        long = self.query_long(variables, zips, vintage, geo_level)
+        wide = long.pivot(index="geo_id", columns="variable", values="value")
+        if variables is not None:
+            wide = wide.reindex(columns=list(variables))
+        if zips is not None:
+            wide = wide.reindex([str(z) for z in zips])
+        else:
+            wide = wide.sort_index()
+
+        wide.columns.name = None
+        wide = wide.rename_axis("zip_code").reset_index()
+        wide["zip_code"] = wide["zip_code"].astype("string")
+        dtypes = column_dtypes()
+        for column in wide.columns[1:]:
+            wide[column] = wide[column].astype(dtypes.get(column, "float64"))
+        return wide
+
+    def variables(self, vintage=ACS_VINTAGE, geo_level="zcta") -> list:
+        rows = self._connect().execute(
+            "SELECT DISTINCT variable FROM observations "
+            "WHERE vintage = ? AND geo_level = ? ORDER BY variable",
+            (int(vintage), geo_level),
+        )
+        return [r[0] for r in rows]
+
+    def vintages(self, geo_level="zcta") -> list:
+        rows = self._connect().execute(
+            "SELECT DISTINCT vintage FROM observations WHERE geo_level = ? ORDER BY vintage",
+            (geo_level,),
+        )
+        return [r[0] for r in rows]
+
+
+_default_store = None
+
+
+def get_store():
+    """
+    Return the shared module-level DataStore (created on first use).
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = DataStore()
+    return _default_store
@@ -0,0 +1,102 @@
+import os
+import json
+import threading
+
+from config import ACS_JOURNAL_FSYNC_EVERY
+
+
+class FetchJournal:
+    """
+    Append-only JSON Lines log of completed fetch requests.
+
+    Every record is written and flushed as soon as its response is
+    handled; the file is fsync'ed every fsync_every records and on
+    close(), so a crash loses at most the last unsynced batch. A torn
+    last line (crash mid-write) is ignored when the journal is read
+    back and cut off before the next append, and a later record for
+    the same request wins.
+    """
+
+    def __init__(self, path, fsync_every=ACS_JOURNAL_FSYNC_EVERY):
+        self.path = path
+        self.fsync_every = fsync_every
+        self._file = None
+        self._unsynced = 0
+        self._lock = threading.Lock()
+
+    def records(self) -> list:
+        """
+        Every complete record in the journal, oldest first.
+        """
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return records
+
+    def append(self, record: dict):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._truncate_torn_tail()
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def _truncate_torn_tail(self):
+        # drop a partial last line so the next record starts on its own line
+        try:
+            f = open(self.path, "rb+")
+        except FileNotFoundError:
+            return
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                step = min(end, 1 << 16)
+                f.seek(end - step)
+                block = f.read(step)
+                newline = block.rfind(b"\n")
+                if newline != -1:
+                    end = end - step + newline + 1
+                    break
+                end -= step
+            if end != size:
+                f.truncate(end)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+                self._unsynced = 0
+
+    def discard(self):
+        """
+        Close and delete the journal (the fetch it tracked is complete).
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,24 +1,77 @@
 import os
-import numpy as np
 import pandas as pd
-import seaborn as sns
-import statsmodels.api as sm
-import matplotlib.pyplot as plt
 
-from config import FINAL_DATA_CSV, FINAL_DATA_CLEAN_CSV
+from config import (
+    ACS_VINTAGE,
+    FINAL_DATA_CSV,
+    FINAL_DATA_CLEAN_CSV,
+    REGRESSION_SWEEP_CSV,
+    SPATIAL_MORAN_CSV,
+    SPATIAL_MODELS_CSV,
+    SPATIAL_WEIGHTS,
+    PLOTS_DIR,
+    ZCTA_SHP,
+)
+from src.artifacts import read_artifact, write_artifact
+from src.datastore import get_store
+from src.memo import memoize
+from src.plots import render_figures
+from src.reporting import QuantileReport
 
 
 def load_and_clean_final_data(
     input_path: str = FINAL_DATA_CSV,
     output_path: str = FINAL_DATA_CLEAN_CSV,
+    geo_level: str = "zcta",
+    vintage: int = ACS_VINTAGE,
+    store=None,
 ) -> pd.DataFrame:
     """
     Load the merged ZIP-level dataset, clean variables, and save a cleaned version.
-    Returns the cleaned DataFrame.
+    Paths may be .csv or .parquet. The cleaned values also replace the
+    raw ones in the SQLite store, where run_regression and
+    run_spatial_analysis read them. Returns the cleaned DataFrame.
     """
 
-    # Load final_data.csv
-    final_data = pd.read_csv(input_path)
+    # Load final_data (typed loader, see src/artifacts.py)
+    final_data = read_artifact("final", input_path)
+    final_data = clean_final_data(final_data)
+
+    # Save cleaned dataset
+    final_data = write_artifact(final_data, "final_clean", output_path)
+    print(f"\nSaved cleaned dataset to {output_path}")
+
+    store = store or get_store()
+    changed = store.upsert_frame(final_data, vintage, geo_level)
+    print(f"Upserted cleaned values into {store.path} ({changed} rows changed)")
+
+    return final_data
+
+
+def load_final_slice(
+    variables=("mean_commute_time", "median_income", "station_count"),
+    zips=None,
+    geo_level: str = "zcta",
+    vintage: int = ACS_VINTAGE,
+    store=None,
+) -> pd.DataFrame:
+    """
+    Read only the given variables for only the given ZIPs (None = all)
+    from the SQLite store filled by the pipeline, instead of loading
+    the whole final dataset. Returns zip_code plus one typed column
+    per variable, e.g. load_final_slice(["median_income"], ["90001"]).
+    """
+    store = store or get_store()
+    return store.query(variables, zips, vintage, geo_level)
+
+
+@memoize()
+def clean_final_data(final_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clean the merged dataset (name column, numeric commute / income,
+    suppressed incomes to missing). Memoized on the frame's content.
+    """
+    final_data = final_data.copy()
 
     # ONE: Clean up NAME cols: keep one readable name column
     if "NAME_x" in final_data.columns and "NAME_y" in final_data.columns:
@@ -29,22 +82,13 @@ def load_and_clean_final_data(
     elif "NAME_y" in final_data.columns:
         final_data = final_data.rename(columns={"NAME_y": "zcta_name"})
 
-    # TWO: Ensure commute column is numeric
+    # TWO: Ensure commute column is numeric (already in minutes: the
+    # ACS scaling is applied once, in src/acs_variables.py)
     final_data["mean_commute_time"] = pd.to_numeric(
         final_data.get("mean_commute_time"), errors="coerce"
     )
 
-    # THREE: Detect whether values are still scaled (raw ACS) and divide by 1000 if needed.
-    commute_median = final_data["mean_commute_time"].median(skipna=True)
-    print("median before possible scaling:", commute_median)
-
-    if pd.notna(commute_median) and commute_median > 100:
-        print("Dividing mean_commute_time by 1000 to convert to minutes...")
-        final_data["mean_commute_time"] = final_data["mean_commute_time"] / 1000.0
-    else:
-        print("Values look already in minutes (no division applied).")
-
-    # FOUR: Convert income to numeric and clean impossible values
+    # THREE: Convert income to numeric and clean impossible values
     final_data["median_income"] = pd.to_numeric(
         final_data.get("median_income"), errors="coerce"
     )
@@ -52,7 +96,7 @@ def load_and_clean_final_data(
     # replace non-positive incomes with "NaN" (because these are likely codes/suppressions)
     final_data.loc[final_data["median_income"] <= 0, "median_income"] = pd.NA
 
-    # FIVE: quick check
+    # FOUR: quick check
     print("\nAfter cleaning:")
     print(
         final_data[["zip_code", "mean_commute_time", "median_income"]]
@@ -69,128 +113,79 @@ def load_and_clean_final_data(
     print("\nMissing values:")
     print(final_data[["mean_commute_time", "median_income"]].isna().sum())
 
-    # SIX: Save cleaned dataset
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    final_data.to_csv(output_path, index=False)
-    print(f"\nSaved cleaned dataset to {output_path}")
-
     return final_data
 
 
-def descriptive_analysis(final_data: pd.DataFrame) -> None:
+@memoize(modules=("src.reporting",))
+def descriptive_analysis(final_data: pd.DataFrame) -> dict:
     """
-    Run descriptive stats and basic rankings.
-    Prints summaries and returns nothing.
+    Run descriptive stats and basic rankings (src/reporting.py: one
+    sort of the numeric columns serves every quantile below).
+    Prints summaries and returns them as a dict of DataFrames;
+    memoized on the frame's content and src/reporting.py.
     """
+    columns = ["mean_commute_time", "median_income", "station_count"]
+    shown = ["zip_code", "mean_commute_time", "median_income"]
+    report = QuantileReport(final_data, columns)
+
+    tables = {
+        "summary": report.summary(),
+        "quantiles": report.quantiles(),
+        "top_commute": report.top_k("mean_commute_time", 10, columns=shown),
+        "top_income": report.top_k("median_income", 10, columns=shown),
+        # High commute, high income vs high commute, low income
+        "high_commute_high_income": report.segment(
+            {"mean_commute_time": (0.75, 1), "median_income": (0.75, 1)}
+        ),
+        "high_commute_low_income": report.segment(
+            {"mean_commute_time": (0.75, 1), "median_income": (0, 0.25)}
+        ),
+        "commute_by_income_quartile": report.crosstab(
+            "median_income", "mean_commute_time"
+        ),
+    }
 
     print("\n===== SUMMARY STATISTICS =====")
-    print(
-        final_data[["mean_commute_time", "median_income", "station_count"]]
-        .describe()
-        .to_string()
-    )
+    print(tables["summary"].to_string())
 
-    # Sort ZIP codes by highest mean commute time
-    print("\n===== TOP 10 ZIPS BY MEAN COMMUTE TIME (raw) =====")
-    print(
-        final_data.sort_values(by="mean_commute_time", ascending=False)[
-            ["zip_code", "mean_commute_time", "median_income"]
-        ]
-        .head(10)
-        .to_string(index=False)
-    )
-
-    # ZIP-level average values
-    zip_means = (
-        final_data.groupby("zip_code")[["mean_commute_time", "median_income"]]
-        .mean()
-        .reset_index()
-    )
-
-    longest_commutes = zip_means.sort_values(
-        by="mean_commute_time", ascending=False
-    )
-
-    print("\n===== TOP 10 ZIPS BY MEAN COMMUTE TIME (grouped) =====")
-    print(
-        longest_commutes[["zip_code", "mean_commute_time", "median_income"]]
-        .head(10)
-        .to_string(index=False)
-    )
+    print("\n===== QUANTILES =====")
+    print(tables["quantiles"].to_string())
 
-    highest_income = zip_means.sort_values(by="median_income", ascending=False)
+    # Rows are already one per ZIP, so no grouping is needed
+    print("\n===== TOP 10 ZIPS BY MEAN COMMUTE TIME =====")
+    print(tables["top_commute"].to_string(index=False))
 
     print("\n===== TOP 10 ZIPS BY MEDIAN INCOME =====")
-    print(
-        highest_income[["zip_code", "mean_commute_time", "median_income"]]
-        .head(10)
-        .to_string(index=False)
-    )
-
-    # High commute, high income vs high commute, low income
-    top_commute = np.percentile(
-        final_data["mean_commute_time"].dropna(), 75
-    )
-    top_income = np.percentile(
-        final_data["median_income"].dropna(), 75
-    )
-    bottom_income = np.percentile(
-        final_data["median_income"].dropna(), 25
-    )
-
-    high_commute_high_income = final_data[
-        (final_data["mean_commute_time"] >= top_commute)
-        & (final_data["median_income"] >= top_income)
-    ]
-
-    high_commute_low_income = final_data[
-        (final_data["mean_commute_time"] >= top_commute)
-        & (final_data["median_income"] <= bottom_income)
-    ]
+    print(tables["top_income"].to_string(index=False))
 
     print(
         "\n===== HIGH COMMUTE & HIGH INCOME (75th percentile both) ====="
     )
-    print(
-        high_commute_high_income[
-            ["zip_code", "mean_commute_time", "median_income"]
-        ]
-        .to_string(index=False)
-    )
+    print(tables["high_commute_high_income"].to_string(index=False))
 
     print(
         "\n===== HIGH COMMUTE & LOW INCOME (top commute, bottom income) ====="
     )
-    print(
-        high_commute_low_income[
-            ["zip_code", "mean_commute_time", "median_income"]
-        ]
-        .to_string(index=False)
-    )
+    print(tables["high_commute_low_income"].to_string(index=False))
 
+    print("\n===== ZIPS BY INCOME QUARTILE (rows) x COMMUTE QUARTILE =====")
+    print(tables["commute_by_income_quartile"].to_string())
 
-def make_plots(final_data: pd.DataFrame) -> None:
+    return tables
+
+
+def make_plots(
+    final_data: pd.DataFrame,
+    out_dir: str = PLOTS_DIR,
+    show: bool = False,
+) -> dict:
     """
-    Produce histograms, scatterplots, and correlation heatmaps.
-    Shows plots but does not save them to disk.
+    Print the correlation tables and write the histograms, scatterplots
+    and correlation heatmaps to out_dir (PNG/SVG, see src/plots.py).
+    Figures whose data did not change are not redrawn. show=True also
+    displays the PNGs inline (Jupyter). Returns the render status.
     """
 
-    # Histogram of commute times
-    plt.figure()
-    final_data["mean_commute_time"].hist()
-    plt.xlabel("Mean Commute Time (minutes)")
-    plt.ylabel("Number of ZIP Codes")
-    plt.title("Distribution of Commute Times")
-    plt.show()
-
-    # Scatterplot: income vs commute
-    plt.figure()
-    plt.scatter(final_data["median_income"], final_data["mean_commute_time"])
-    plt.xlabel("Median Household Income")
-    plt.ylabel("Mean Commute Time (minutes)")
-    plt.title("Commute Time vs Income")
-    plt.show()
-
     # Correlations
     print("\n===== CORRELATIONS: COMMUTE TIME VS MEDIAN INCOME =====")
     print(
@@ -211,56 +206,176 @@ def make_plots(final_data: pd.DataFrame) -> None:
     print("\n===== CORRELATION MATRIX (commute, income, stations) =====")
     print(corr_matrix.to_string())
 
-    # Heatmap of correlation matrix
-    plt.figure(figsize=(6, 5))
-    sns.heatmap(corr_matrix, annot=True, cmap="Reds", square=True)
-    plt.title("Correlation Matrix: Commute, Income, Station Count")
-    plt.show()
-
     # Commute time in ZIPs with vs. without a station
     zip_stats["has_station"] = zip_stats["station_count"] > 0
     group_means = zip_stats.groupby("has_station")["mean_commute_time"].mean()
     print("\n===== MEAN COMMUTE TIME BY HAS_STATION =====")
     print(group_means.to_string())
 
-    # Binary correlation heatmap
-    binary_corr = zip_stats[["mean_commute_time", "has_station"]].corr()
-    plt.figure(figsize=(4, 4))
-    sns.heatmap(binary_corr, annot=True, cmap="Reds", square=True)
-    plt.title("Correlation: Commute Time vs Has Station")
-    plt.show()
+    # Figures: rendered headless, in parallel, only when their data changed
+    status = render_figures(final_data, out_dir)
+    rendered = [name for name, s in status.items() if s == "rendered"]
+    print(
+        f"\nFigures in {out_dir}: {len(rendered)} rendered, "
+        f"{len(status) - len(rendered)} unchanged"
+    )
+
+    if show:
+        from IPython.display import Image, display
+
+        for name in status:
+            display(Image(os.path.join(out_dir, f"{name}.png")))
 
-    # Scatter: station count vs commute
-    plt.figure(figsize=(8, 6))
-    plt.scatter(zip_stats["station_count"], zip_stats["mean_commute_time"])
-    plt.xlabel("Number of Metro Stations in ZIP")
-    plt.ylabel("Mean Commute Time (minutes)")
-    plt.title("Commute Time vs Station Density")
-    plt.show()
+    return status
 
 
-def run_regression(clean_data_path: str = FINAL_DATA_CLEAN_CSV) -> None:
+def run_regression(
+    covariates=("median_income", "station_count"),
+    zips=None,
+    geo_level: str = "zcta",
+    vintage: int = ACS_VINTAGE,
+    store=None,
+) -> pd.DataFrame:
     """
     Run OLS regression:
         mean_commute_time ~ median_income + station_count
-    using the cleaned dataset.
+    (or other covariates) on the cleaned values in the SQLite store,
+    reading only those columns for the given ZIPs (None = all).
+    Prints the statsmodels summary and returns the coefficient table.
     """
+    df = load_final_slice(
+        ["mean_commute_time", *covariates], zips, geo_level, vintage, store
+    )
+    return fit_ols(df, tuple(covariates))
+
 
-    df = pd.read_csv(clean_data_path)
+@memoize()
+def fit_ols(
+    df: pd.DataFrame, covariates=("median_income", "station_count")
+) -> pd.DataFrame:
+    """
+    OLS of mean_commute_time on the covariates over the complete rows
+    of df; memoized on the frame's content and the covariates.
+    """
+    # statsmodels is slow to import; only load it when a regression runs
+    import statsmodels.api as sm
 
     # Drop rows with missing values in key variables
-    zip_clean = df.dropna(
-        subset=["mean_commute_time", "median_income", "station_count"]
-    )
+    zip_clean = df.dropna(subset=["mean_commute_time"] + list(covariates))
 
-    X = zip_clean[["median_income", "station_count"]]
+    X = zip_clean[list(covariates)].astype("float64")
     X = sm.add_constant(X)
-    y = zip_clean["mean_commute_time"]
+    y = zip_clean["mean_commute_time"].astype("float64")
 
     model = sm.OLS(y, X).fit()
     print("\n===== OLS REGRESSION RESULTS =====")
     print(model.summary())
 
+    ci = model.conf_int()
+    return pd.DataFrame(
+        {
+            "term": model.params.index,
+            "estimate": model.params.to_numpy(),
+            "std_error": model.bse.to_numpy(),
+            "t_value": model.tvalues.to_numpy(),
+            "p_value": model.pvalues.to_numpy(),
+            "ci_low": ci[0].to_numpy(),
+            "ci_high": ci[1].to_numpy(),
+            "n_obs": int(model.nobs),
+            "r_squared": model.rsquared,
+        }
+    )
+
+
+def run_robustness_sweep(
+    clean_data_path: str = FINAL_DATA_CLEAN_CSV,
+    output_path: str = REGRESSION_SWEEP_CSV,
+) -> pd.DataFrame:
+    """
+    Fit the alternative specifications (log income, has_station,
+    regional subsets) with bootstrap CIs and permutation p-values for
+    the station effect, save the coefficient table and return it.
+    """
+    from src.regression_engine import run_regression_sweep
+
+    df = read_artifact("final_clean", clean_data_path)
+    # the worker count does not change the (seeded) results
+    table = memoize(ignore=("workers",))(run_regression_sweep)(df)
+
+    print("\n===== REGRESSION SWEEP: STATION EFFECT =====")
+    station_rows = table[table["term"].isin(["station_count", "has_station"])]
+    print(
+        station_rows[
+            ["spec", "term", "estimate", "boot_ci_low", "boot_ci_high", "perm_p_value", "n_obs"]
+        ].to_string(index=False)
+    )
+
+    table.to_csv(output_path, index=False)
+    print(f"\nSaved coefficient table to {output_path}")
+    return table
+
+
+def run_spatial_analysis(
+    zips=None,
+    zcta_shp: str = ZCTA_SHP,
+    geo_level: str = "zcta",
+    kind: str = SPATIAL_WEIGHTS,
+    moran_path: str = SPATIAL_MORAN_CSV,
+    models_path: str = SPATIAL_MODELS_CSV,
+    covariates=("median_income", "station_count"),
+    vintage: int = ACS_VINTAGE,
+    store=None,
+) -> dict:
+    """
+    Test the commute outcome and the OLS residuals for spatial
+    autocorrelation (Moran's I) and fit spatial lag / error models
+    on sparse weights from the same ZCTA (or tract / block-group)
+    polygons as the dataset. The outcome and covariates of the given
+    ZIPs (None = all) are read from the SQLite store. Saves and
+    returns both tables.
+    """
+    from src.spatial import load_weights, run_spatial_models
+
+    df = load_final_slice(
+        ["mean_commute_time", *covariates], zips, geo_level, vintage, store
+    )
+    zips = df["zip_code"].tolist()
+    weights = load_weights(zips, kind, zcta_shp=zcta_shp, geo_level=geo_level)
+    tables = run_spatial_models(df, weights, covariates)
+
+    print(f"\n===== MORAN'S I ({kind} weights) =====")
+    print(tables["moran"].to_string(index=False))
+    print("\n===== SPATIAL LAG / ERROR MODELS =====")
+    shown = ["model", "term", "estimate", "std_error", "p_value"]
+    print(tables["models"][shown].to_string(index=False))
+
+    tables["moran"].to_csv(moran_path, index=False)
+    tables["models"].to_csv(models_path, index=False)
+    print(f"\nSaved spatial tables to {moran_path}, {models_path}")
+    return tables
+
+
+def run_all_analysis(
+    input_path: str = FINAL_DATA_CSV,
+    clean_path: str = FINAL_DATA_CLEAN_CSV,
+    sweep_path: str = REGRESSION_SWEEP_CSV,
+) -> None:
+    """
+    Clean the merged dataset, then run descriptive stats, plots, the
+    regression, the robustness sweep and the spatial models on the
+    cleaned data.
+    """
+    final_data = load_and_clean_final_data(
+        input_path=input_path,
+        output_path=clean_path,
+    )
+    descriptive_analysis(final_data)
+    make_plots(final_data)
+    zips = final_data["zip_code"].tolist()
+    run_regression(zips=zips)
+    run_robustness_sweep(clean_path, sweep_path)
+    run_spatial_analysis(zips)
+
 
 if __name__ == "__main__":
     print("Running final_analysis.py...")
@@ -277,5 +392,12 @@ if __name__ == "__main__":
     # 3. Plots
     make_plots(final_data)
 
-    # 4. Regression on cleaned file
-    run_regression(FINAL_DATA_CLEAN_CSV)
+    # 4. Regression on the cleaned values in the store
+    zips = final_data["zip_code"].tolist()
+    run_regression(zips=zips)
+
+    # 5. Robustness sweep with bootstrap / permutation inference
+    run_robustness_sweep(FINAL_DATA_CLEAN_CSV)
+
+    # 6. Moran's I and spatial lag / error models
+    run_spatial_analysis(zips)
@@ -1,124 +1,182 @@
 import os
-import requests
 import pandas as pd
-import geopandas as gpd
-from io import BytesIO
 
 from config import (
-    ZCTA_CROSSWALK_URL,
-    COMMUTE_CSV,
-    INCOME_CSV,
+    ACS_FEATURES_PARQUET,
     FINAL_DATA_CSV,
+    ACS_VINTAGE,
     METRO_STATIONS_SHP,
     ZCTA_SHP,
+    LA_STATE_FIPS,
+    LA_COUNTY_FIPS,
 )
+from src.artifacts import coerce_schema, read_artifact
+from src.acs_variables import ACS_VARIABLES
+from src.crosswalk import get_la_county_zips
+from src.datastore import get_store
+from src.metro_station import load_metro_stations
+from src.zcta_lookup import load_zcta_lookup
+from src.tiger_geo import county_unit_ids, load_unit_lookup
 
 
-def get_la_zip_frame() -> pd.DataFrame:
+def get_la_zip_frame(
+    state=LA_STATE_FIPS, county=LA_COUNTY_FIPS, geo_level="zcta"
+) -> pd.DataFrame:
     """
-    Download the ZCTA-to-county crosswalk and return a DataFrame
-    with one row per Los Angeles County ZIP code (zip_code column).
+    Return a DataFrame with one row per ZIP code in a county (zip_code
+    column), looked up in the shared crosswalk index. LA County by default.
+    With geo_level "tract" or "block_group" the rows are the county's
+    GEOIDs from the TIGER/Line layer instead.
     """
-    response = requests.get(ZCTA_CROSSWALK_URL)
-
-    if response.status_code != 200:
-        raise RuntimeError(
-            f"Failed to download crosswalk file: {response.status_code}"
-        )
-
-    crosswalk = pd.read_csv(BytesIO(response.content), dtype=str, sep=",")
-
-    la_county_zips = (
-        crosswalk[
-            (crosswalk["STATE"] == "06") & (crosswalk["COUNTY"] == "037")
-        ]["ZCTA5"]
-        .unique()
-    )
-
-    zip_full = pd.DataFrame({"zip_code": la_county_zips})
-    zip_full["zip_code"] = zip_full["zip_code"].astype(str)
+    if geo_level == "zcta":
+        ids = get_la_county_zips(state, county)
+    else:
+        ids = county_unit_ids(geo_level, state, county)
+    return coerce_schema(pd.DataFrame({"zip_code": ids}), "zip_list")
 
-    return zip_full
 
-
-def build_final_dataset(
-    commute_csv: str = COMMUTE_CSV,
-    income_csv: str = INCOME_CSV,
+def count_stations_by_zip(
     stations_shp: str = METRO_STATIONS_SHP,
     zcta_shp: str = ZCTA_SHP,
+    zips=None,
+    geo_level: str = "zcta",
 ) -> pd.DataFrame:
     """
-    Build final ZIP-level dataset with:
-      - zip_code
-      - station_count
-      - mean_commute_time
-      - median_income
+    Assign every Metro station to a ZIP (ZCTA) and count stations per ZIP.
+    With geo_level "tract" or "block_group", zips are GEOIDs and stations
+    are assigned to those polygons of the TIGER/Line layer instead.
+    Returns a DataFrame with columns zip_code, station_count.
     """
-
-    # Base frame of all LA County ZIPs
-    zip_full = get_la_zip_frame()
-
-    # Loading Geo data 
-    stations = gpd.read_file(stations_shp)
-    zcta = gpd.read_file(zcta_shp)
-
-    # making sure there is a CRS matches
-    stations = stations.to_crs(zcta.crs)
-
-    # Spatial join: assign ZIP (ZCTA5CE20) to each station
-    stations_with_zips = gpd.sjoin(
-        stations,
-        zcta,
-        how="left",
-        predicate="within",
+    if zips is None:
+        zips = get_la_zip_frame(geo_level=geo_level)["zip_code"].tolist()
+
+    # Loading Geo data: stations plus an STRtree over the county's cached ZCTAs
+    stations = load_metro_stations(stations_shp)
+    if geo_level == "zcta":
+        lookup = load_zcta_lookup(zcta_shp, zips)
+    else:
+        lookup = load_unit_lookup(geo_level, zips)
+
+    # Point-in-polygon: assign ZIP (ZCTA5CE20) to each station
+    stations_with_zips = pd.DataFrame(stations.drop(columns="geometry"))
+    stations_with_zips["zip_code"] = lookup.assign_points(
+        stations["lon"], stations["lat"], crs=stations.crs
     )
 
-    stations_with_zips = stations_with_zips.rename(
-        columns={"ZCTA5CE20": "zip_code"}
-    )
-    stations_with_zips["zip_code"] = stations_with_zips["zip_code"].astype(str)
-
     # Count stations per ZIP
     station_counts = (
         stations_with_zips.groupby("zip_code")["STOP_ID"]
         .count()
         .reset_index(name="station_count")
     )
+    return coerce_schema(station_counts, "station_counts")
+
+
+# feature table column -> final dataset column
+FINAL_NAMES = {
+    "mean_commute_minutes": "mean_commute_time",
+    "median_household_income": "median_income",
+}
 
+
+def merge_zip_dataset(
+    zip_full: pd.DataFrame,
+    station_counts: pd.DataFrame,
+    features: pd.DataFrame,
+    accessibility: pd.DataFrame = None,
+) -> pd.DataFrame:
+    """
+    Left-join station counts and the wide ACS feature table
+    (src/acs_variables.py) onto the ZIP list: commute and income under
+    their final names, then accessibility measures (src/accessibility.py)
+    when given, then every other registered ACS variable of features as
+    extra columns. Returns a frame following the "final" schema.
+    """
     # Merge onto the complete ZIP list
     zip_full = zip_full.merge(station_counts, on="zip_code", how="left")
     zip_full["station_count"] = zip_full["station_count"].fillna(0)
 
-    # ---- Load ACS commute & income CSVs ----
-    commute_data = pd.read_csv(commute_csv)
-    income_data = pd.read_csv(income_csv)
+    # Commute and income, renamed for consistency
+    final_data = zip_full.merge(
+        features[["zip_code", *FINAL_NAMES]].rename(columns=FINAL_NAMES),
+        on="zip_code",
+        how="left",
+    )
 
-    commute_data["zip_code"] = commute_data["zip_code"].astype(str)
-    income_data["zip_code"] = income_data["zip_code"].astype(str)
+    if accessibility is not None:
+        final_data = final_data.merge(accessibility, on="zip_code", how="left")
 
-    # Merge all data into one ZIP-level DataFrame
-    final_data = (
-        zip_full.merge(
-            commute_data[["zip_code", "mean_commute_minutes"]],
-            on="zip_code",
-            how="left",
+    extra = [
+        c for c in features.columns if c in ACS_VARIABLES and c not in FINAL_NAMES
+    ]
+    if extra:
+        final_data = final_data.merge(
+            features[["zip_code"] + extra], on="zip_code", how="left"
         )
-        .merge(
-            income_data[["zip_code", "median_household_income"]],
-            on="zip_code",
-            how="left",
+
+    return coerce_schema(final_data, "final")
+
+
+def build_final_dataset(
+    features_path: str = ACS_FEATURES_PARQUET,
+    stations_shp: str = METRO_STATIONS_SHP,
+    zcta_shp: str = ZCTA_SHP,
+    station_counts_path: str = None,
+    state: str = LA_STATE_FIPS,
+    county: str = LA_COUNTY_FIPS,
+    accessibility_path: str = None,
+    geo_level: str = "zcta",
+) -> pd.DataFrame:
+    """
+    Build final ZIP-level dataset with:
+      - zip_code
+      - station_count
+      - mean_commute_time
+      - median_income
+    Station counts are read from station_counts_path when given
+    (see count_stations_by_zip), otherwise computed here. Station
+    accessibility columns are added from accessibility_path when given.
+    Commute, income and every other registered ACS variable come from
+    features_path, the wide table of src/acs_variables.py.
+    Inputs may be CSV or Parquet artifacts; the result follows the
+    "final" schema. With geo_level "tract" or "block_group" each row is
+    a tract / block group and zip_code holds its GEOID.
+    """
+
+    # Base frame of all ZIPs in the county (LA County by default)
+    zip_full = get_la_zip_frame(state, county, geo_level)
+
+    if station_counts_path:
+        station_counts = read_artifact("station_counts", station_counts_path)
+    else:
+        station_counts = count_stations_by_zip(
+            stations_shp, zcta_shp, zip_full["zip_code"].tolist(), geo_level
         )
-    )
 
-    # Rename columns for consistency
-    final_data = final_data.rename(
-        columns={
-            "mean_commute_minutes": "mean_commute_time",
-            "median_household_income": "median_income",
-        }
-    )
+    # ---- Load the wide ACS table (commute, income, covariates) ----
+    features = read_artifact("acs_features", features_path)
+
+    accessibility = None
+    if accessibility_path:
+        accessibility = read_artifact("accessibility", accessibility_path)
+
+    return merge_zip_dataset(zip_full, station_counts, features, accessibility)
 
-    return final_data
+
+def store_final_dataset(
+    final_data: pd.DataFrame,
+    store=None,
+    vintage: int = ACS_VINTAGE,
+    geo_level: str = "zcta",
+) -> int:
+    """
+    Upsert every numeric column of the final dataset (station counts,
+    accessibility, commute, income, ACS covariates) into the SQLite
+    store (src/datastore.py). Only rows whose value changed are
+    written; returns how many.
+    """
+    store = store or get_store()
+    return store.upsert_frame(final_data, vintage, geo_level)
 
 
 if __name__ == "__main__":
@@ -127,6 +185,7 @@ if __name__ == "__main__":
 
     os.makedirs("data", exist_ok=True)
     final_data.to_csv(FINAL_DATA_CSV, index=False)
+    store_final_dataset(final_data)
 
     print(f"Saved ZIP-level dataset to {FINAL_DATA_CSV}")
     print(final_data.head())
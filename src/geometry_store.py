@@ -0,0 +1,130 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import shapely
+
+# Columns the store adds next to the attributes: WKB and bounding box
+GEOMETRY_COLUMNS = ["wkb", "minx", "miny", "maxx", "maxy"]
+
+
+class GeometryStore:
+    """
+    Polygons plus attribute columns in one Arrow table: WKB geometries
+    and float64 bounding boxes next to the attributes.
+
+    On disk it is an uncompressed Feather (Arrow IPC) file that open()
+    memory-maps, so loading is zero-copy: the columns point into the OS
+    page cache, which every process reading the same file shares.
+    Geometries are only parsed from WKB for the rows that are asked for.
+    """
+
+    def __init__(self, table: pa.Table, path: str = None):
+        self.table = table
+        self.path = path
+        meta = table.schema.metadata or {}
+        self.id_column = meta.get(b"id_column", b"").decode() or None
+        self.crs = meta.get(b"crs", b"").decode() or None
+        self._ids = None
+
+    @classmethod
+    def from_geodataframe(cls, gdf, id_column) -> "GeometryStore":
+        attributes = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+        table = pa.Table.from_pandas(attributes, preserve_index=False)
+
+        geometries = gdf.geometry.to_numpy()
+        bounds = shapely.bounds(geometries)
+        wkb = pa.array(shapely.to_wkb(geometries), pa.binary())
+        table = table.append_column("wkb", wkb)
+        for i, name in enumerate(GEOMETRY_COLUMNS[1:]):
+            table = table.append_column(name, pa.array(bounds[:, i]))
+
+        crs = gdf.crs.to_wkt() if gdf.crs is not None else ""
+        table = table.replace_schema_metadata(
+            {"id_column": id_column, "crs": crs}
+        ).combine_chunks()
+        return cls(table)
+
+    @classmethod
+    def open(cls, path: str) -> "GeometryStore":
+        """
+        Memory-map a store written by write(); no column is copied.
+        """
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return cls(table, path)
+
+    def write(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + f".{os.getpid()}.tmp"
+        # uncompressed, one record batch: required for zero-copy mapping
+        feather.write_feather(
+            self.table, tmp, compression="uncompressed", chunksize=max(len(self), 1)
+        )
+        os.replace(tmp, path)
+        self.path = path
+        return path
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __reduce__(self):
+        # file-backed stores travel to worker processes as their path
+        if self.path:
+            return (GeometryStore.open, (self.path,))
+        return (GeometryStore, (self.table,))
+
+    def _numpy(self, name) -> np.ndarray:
+        column = self.table.column(name)
+        if column.num_chunks == 1 and column.null_count == 0:
+            try:
+                return column.chunk(0).to_numpy(zero_copy_only=True)
+            except pa.ArrowInvalid:
+                pass
+        return column.to_numpy()
+
+    @property
+    def ids(self) -> np.ndarray:
+        if self._ids is None:
+            ids = self.table.column(self.id_column).to_pylist()
+            self._ids = np.asarray(ids, dtype=object)
+        return self._ids
+
+    def bounds(self):
+        """
+        (minx, miny, maxx, maxy) arrays, zero-copy views of the table.
+        """
+        return tuple(self._numpy(name) for name in GEOMETRY_COLUMNS[1:])
+
+    def geometries(self, rows=None) -> np.ndarray:
+        """
+        Parse the WKB of the given rows (all rows by default) into shapely geometries.
+        """
+        wkb = self.table.column("wkb")
+        if rows is not None:
+            wkb = wkb.take(pa.array(np.asarray(rows, dtype="int64")))
+        return shapely.from_wkb(wkb.to_numpy(zero_copy_only=False))
+
+    def attributes(self, columns=None) -> pd.DataFrame:
+        """
+        Attribute columns (no geometry) as a DataFrame.
+        """
+        if columns is None:
+            names = self.table.column_names
+            columns = [c for c in names if c not in GEOMETRY_COLUMNS]
+        return self.table.select(columns).to_pandas()
+
+    def take(self, rows) -> "GeometryStore":
+        """
+        In-memory store with only the given rows.
+        """
+        rows = pa.array(np.asarray(rows, dtype="int64"))
+        return GeometryStore(self.table.take(rows))
+
+    def to_geodataframe(self):
+        import geopandas as gpd
+
+        return gpd.GeoDataFrame(
+            self.attributes(), geometry=self.geometries(), crs=self.crs
+        )
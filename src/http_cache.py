@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlencode
+
+from config import HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES
+
+# Query params that must never end up in a cache key (or on disk)
+SECRET_PARAMS = {"key"}
+
+
+class CachedResponse:
+    """
+    Minimal stand-in for requests.Response served from the disk cache.
+    """
+
+    def __init__(self, status_code, content, headers):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.from_cache = True
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def cache_key(url, params=None):
+    """
+    Hash the URL plus sorted query params (API key removed).
+    """
+    params = {
+        k: v
+        for k, v in (params or {}).items()
+        if k not in SECRET_PARAMS and v is not None
+    }
+    raw = url + "?" + urlencode(sorted(params.items()))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class HTTPCache:
+    """
+    Content-addressed response cache on disk.
+
+    Each entry is <key>.body (raw bytes) plus <key>.json (status,
+    validators, fetch time). Body mtimes are bumped on every hit, and
+    the least recently used entries are evicted once the cache grows
+    past max_bytes.
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + ".body", base + ".json"
+
+    def lookup(self, key):
+        """
+        Return (meta, content) for a cached entry, or None.
+        """
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+        return meta, content
+
+    def read_meta(self, key):
+        """
+        Return the metadata of a cached entry (without its body), or None.
+        """
+        _, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def is_fresh(meta, ttl):
+        return ttl is None or time.time() - meta["fetched_at"] < ttl
+
+    @staticmethod
+    def conditional_headers(meta):
+        """
+        If-None-Match / If-Modified-Since headers for a stale entry.
+        """
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def store(self, key, url, status_code, content, headers):
+        body_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+
+        meta = {
+            "url": url,
+            "status_code": status_code,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_type": headers.get("Content-Type"),
+            "fetched_at": time.time(),
+        }
+
+        # write to temp files first so a crash never leaves half an entry
+        tmp = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(body_path + tmp, "wb") as f:
+            f.write(content)
+        with open(meta_path + tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(body_path + tmp, body_path)
+        os.replace(meta_path + tmp, meta_path)
+
+        self.evict()
+
+    def mark_validated(self, key, meta):
+        """
+        Record that the server confirmed a stale entry (304 Not Modified).
+        """
+        _, meta_path = self._paths(key)
+        meta["fetched_at"] = time.time()
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+
+    def response(self, meta, content):
+        headers = {"Content-Type": meta.get("content_type") or ""}
+        return CachedResponse(meta["status_code"], content, headers)
+
+    def evict(self):
+        """
+        Delete least recently used entries until under max_bytes.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith(".body"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(entries):
+                for p in (path, path[:-5] + ".json"):
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+                total -= size
+                if total <= self.max_bytes * 0.9:
+                    break
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import cProfile
+import resource
+import threading
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+# The metrics object of the stage running in this context (None outside)
+_current = contextvars.ContextVar("instrument_stage", default=None)
+
+
+class StageMetrics:
+    """
+    Measurements for one instrumented block: timings and memory are
+    filled in when the block ends; counters (HTTP requests, bytes,
+    retries, cache hits...) and DataFrame row counts accumulate while
+    it runs, from any thread started through bind().
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.counters = {}
+        self.rows = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def count(self, key, n=1):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            **self.timings,
+            "counters": dict(sorted(self.counters.items())),
+            "rows": dict(self.rows),
+        }
+
+
+def count(key, n=1):
+    """
+    Add n to a counter of the current stage (no-op outside a stage).
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.count(key, n)
+
+
+def record_rows(label, n):
+    """
+    Record the row count of a DataFrame crossing a stage boundary,
+    e.g. record_rows("write:commute", len(df)).
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics._lock:
+            metrics.rows[label] = n
+
+
+def bind(func):
+    """
+    Wrap func so that, when run in a worker thread, it counts towards
+    the stage that submitted it (threads do not inherit contextvars).
+    """
+    context = contextvars.copy_context()
+
+    @wraps(func)
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+
+    return run
+
+
+def reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets VmHWM (peak RSS) for this process
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # elsewhere: the peak since the process started
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+@contextmanager
+def measure(name, profile_path=None, exclusive=True):
+    """
+    Instrument a block: wall and process CPU seconds, peak RSS, and
+    (when tracemalloc is running) the traced-memory delta and peak.
+    profile_path additionally writes a cProfile dump of the block.
+    Yields the StageMetrics, complete once the block exits.
+
+    Peak RSS and the tracemalloc peak are process-wide. exclusive=False
+    says other blocks may run in this process at the same time (thread
+    stages of a concurrent run): the peaks are then not reset (that
+    would clobber the other blocks' figures) and are recorded as
+    process_peak_rss_mb / traced_process_peak_mb instead of per-block
+    peak_rss_mb / traced_peak_mb / traced_delta_mb.
+    """
+    metrics = StageMetrics(name)
+    token = _current.set(metrics)
+
+    tracing = tracemalloc.is_tracing()
+    if exclusive:
+        reset_peak_rss()
+        if tracing:
+            traced_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+    profiler = cProfile.Profile() if profile_path else None
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    if profiler:
+        profiler.enable()
+
+    try:
+        yield metrics
+    finally:
+        if profiler:
+            profiler.disable()
+        metrics.timings = {
+            "seconds": round(time.perf_counter() - wall_start, 4),
+            "cpu_seconds": round(time.process_time() - cpu_start, 4),
+        }
+        if exclusive:
+            metrics.timings["peak_rss_mb"] = peak_rss_mb()
+        else:
+            metrics.timings["process_peak_rss_mb"] = peak_rss_mb()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if exclusive:
+                metrics.timings["traced_delta_mb"] = round(
+                    (current - traced_before) / 2**20, 2
+                )
+                metrics.timings["traced_peak_mb"] = round(peak / 2**20, 2)
+            else:
+                metrics.timings["traced_process_peak_mb"] = round(peak / 2**20, 2)
+        _current.reset(token)
+
+        if profiler:
+            os.makedirs(os.path.dirname(profile_path) or ".", exist_ok=True)
+            profiler.dump_stats(profile_path)
+
+
+def instrumented(name=None):
+    """
+    Decorator form of measure(): each call of the function is measured
+    and the metrics are kept on wrapper.last_metrics.
+    """
+
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with measure(name or func.__name__) as metrics:
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    wrapper.last_metrics = metrics
+
+        wrapper.last_metrics = None
+        return wrapper
+
+    return decorate
+
+
+def write_run_report(path, stages, wall_seconds, extra=None) -> str:
+    """
+    Write the JSON run report: one entry per stage (metrics dicts plus
+    status) and the total wall time. Returns the path.
+    """
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "wall_seconds": round(wall_seconds, 4),
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        **(extra or {}),
+        "stages": stages,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
@@ -1,92 +1,59 @@
 import os
-import time
-import requests
-import pandas as pd
-from io import BytesIO
-from dotenv import load_dotenv
 
 from config import (
-    ZCTA_CROSSWALK_URL,
-    ACS_INCOME_URL,
+    ACS_ZCTA_BATCH_SIZE,
+    ACS_JOURNAL_DIR,
     INCOME_CSV,
-    API_SLEEP_SECONDS,
+    LA_STATE_FIPS,
+    LA_COUNTY_FIPS,
 )
-
-# Load API key from .env 
-load_dotenv()
-API_KEY = os.getenv("CENSUS_API_KEY")
-
-
-def get_la_county_zips():
-    """
-    Download ZCTA-to-county crosswalk and return a list of LA County ZIP codes.
-    """
-    response = requests.get(ZCTA_CROSSWALK_URL)
-    zcta_crosswalk = pd.read_csv(BytesIO(response.content), dtype=str, sep=",")
-
-    la_zips = (
-        zcta_crosswalk[
-            (zcta_crosswalk["STATE"] == "06")   # CA
-            & (zcta_crosswalk["COUNTY"] == "037")  # LA County
-        ]["ZCTA5"]
-        .unique()
-        .tolist()
-    )
-    return la_zips
-
-
-def get_la_income_zips(la_zips):
+from src.acs_variables import fetch_acs_variables
+from src.crosswalk import get_la_county_zips
+
+
+def get_la_income_zips(
+    la_zips,
+    batch_size=ACS_ZCTA_BATCH_SIZE,
+    client=None,
+    geo_level="zcta",
+    state=LA_STATE_FIPS,
+    county=LA_COUNTY_FIPS,
+    journal=None,
+):
     """
     Pull median household income (B19013_001E) for list of LA County ZIP codes.
+    ZIPs are requested batch_size at a time (None = one wildcard request)
+    through the shared ACS client unless another client is given.
+    With geo_level "tract" or "block_group", la_zips are GEOIDs and the
+    whole county is fetched in one request. Annotation codes such as
+    -666666666 (no estimate, common for block groups) become missing.
+    With journal (a JSONL path), finished requests are checkpointed so an
+    interrupted run resumes without re-downloading (see fetch_acs_variables).
 
     Return a DataFrame with columns:
     - NAME
     - median_household_income
     - zip_code
     """
-    results = []
-
-    for z in la_zips:
-        params = {
-            "get": "NAME,B19013_001E",
-            "for": f"zip code tabulation area:{z}",
-            "key": API_KEY,
-        }
-
-        r = requests.get(ACS_INCOME_URL, params=params)
-
-        if r.status_code == 200:
-            try:
-                data = r.json()
-                if len(data) > 1:
-                    name = data[1][0]
-                    income = data[1][1]
-                    results.append([name, income, z])
-                else:
-                    results.append([f"ZCTA5 {z}", None, z])
-            except Exception as e:
-                print(f"JSON decode error for ZIP {z}: {e}")
-                results.append([f"ZCTA5 {z}", None, z])
-        else:
-            print(f"Error for ZIP {z}: {r.status_code}")
-            results.append([f"ZCTA5 {z}", None, z])
-
-        time.sleep(API_SLEEP_SECONDS)
-
-    df = pd.DataFrame(
-        results, columns=["NAME", "median_household_income", "zip_code"]
+    return fetch_acs_variables(
+        la_zips,
+        ["median_household_income"],
+        batch_size,
+        client,
+        geo_level,
+        state,
+        county,
+        journal=journal,
     )
-    df["median_household_income"] = pd.to_numeric(
-        df["median_household_income"], errors="coerce"
-    )
-    return df
 
 
 if __name__ == "__main__":
     print("Running median_hhincome.py...")
 
     la_zips = get_la_county_zips()
-    df_income = get_la_income_zips(la_zips)
+    df_income = get_la_income_zips(
+        la_zips, journal=os.path.join(ACS_JOURNAL_DIR, "income.jsonl")
+    )
 
     os.makedirs("data", exist_ok=True)
     df_income.to_csv(INCOME_CSV, index=False)
@@ -0,0 +1,197 @@
+import os
+import inspect
+import hashlib
+import pickle
+import importlib
+import threading
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+from config import RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+from src import instrument
+
+# Returned by ResultCache.get() when there is no entry (None is a valid result)
+MISSING = object()
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """
+    Content hash of a DataFrame: column names, dtypes and every value
+    (index included), independent of where the frame came from.
+    """
+    h = hashlib.sha256()
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def value_digest(value) -> str:
+    """
+    Stable digest of one argument: content hashes for frames and
+    arrays, repr() for everything else (numbers, strings, lists,
+    dataclasses such as ModelSpec).
+    """
+    if isinstance(value, pd.DataFrame):
+        return "frame:" + frame_digest(value)
+    if isinstance(value, pd.Series):
+        return "series:" + frame_digest(value.to_frame())
+    if isinstance(value, np.ndarray):
+        return f"array:{value.dtype}:{value.shape}:" + hashlib.sha256(
+            np.ascontiguousarray(value).tobytes()
+        ).hexdigest()
+    return repr(value)
+
+
+class ResultCache:
+    """
+    On-disk store of pickled analysis results, one file per key.
+
+    File mtimes are bumped on every hit and the least recently used
+    entries are evicted once the cache grows past max_bytes (the same
+    policy as the HTTP cache).
+    """
+
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return MISSING
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until under max_bytes.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith(".pkl"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+                    total += st.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+                if total <= self.max_bytes * 0.9:
+                    break
+
+
+_default_cache = None
+
+
+def get_result_cache():
+    """
+    Return the shared module-level ResultCache (created on first use).
+    Set src.memo._default_cache = False to turn memoization off.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+
+def _module_digest(module) -> str:
+    # any edit to the module's source invalidates the results using it
+    path = getattr(importlib.import_module(module), "__file__", None)
+    return file_digest(path) if path and os.path.exists(path) else ""
+
+
+def memoize(files=(), ignore=(), modules=()):
+    """
+    Cache a function's result on disk, keyed on the source of its
+    module and of the other `modules` it relies on (e.g.
+    "src.reporting"), the content of every DataFrame / array argument,
+    the content of the files named by the `files` parameters and the
+    repr of the other parameters (defaults included). Parameters in
+    `ignore` (e.g. worker counts) do not change the key.
+
+    A hit returns the stored result without calling the function, so
+    nothing it would print is printed again.
+    """
+
+    def decorate(func):
+        signature = inspect.signature(func)
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_result_cache()
+            if not cache:
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            h = hashlib.sha256(name.encode())
+            for module in (func.__module__, *modules):
+                h.update(f"|{module}={_module_digest(module)}".encode())
+            for param, value in bound.arguments.items():
+                if param in ignore:
+                    continue
+                if param in files:
+                    value = "file:" + file_digest(value)
+                else:
+                    value = value_digest(value)
+                h.update(f"|{param}={value}".encode())
+            key = h.hexdigest()
+
+            result = cache.get(key)
+            if result is not MISSING:
+                instrument.count("memo_hits")
+                print(f"[cached] {func.__qualname__} ({key[:12]})")
+                return result
+
+            instrument.count("memo_misses")
+            result = func(*args, **kwargs)
+            cache.put(key, result)
+            return result
+
+        return wrapper
+
+    return decorate
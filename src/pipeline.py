@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+from typing import Callable
+
+import config
+from config import PIPELINE_STATE_PATH, RUN_REPORT_DIR
+from src import instrument
+
+
+@dataclass
+class Stage:
+    """
+    One step of the pipeline.
+
+    inputs/outputs are file paths; code lists the source files and
+    config_keys the config.py constants whose values the stage depends on.
+    params are keyword arguments passed to func (e.g. run options such
+    as geo_level). Changing any of them changes the stage fingerprint.
+
+    executor says where the stage runs in concurrent mode: "thread" for
+    network-bound work, "process" for CPU/IO-heavy work (func must then
+    be a picklable module-level function).
+    """
+
+    name: str
+    func: Callable[..., None]
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    code: list = field(default_factory=list)
+    config_keys: list = field(default_factory=list)
+    deps: list = field(default_factory=list)
+    executor: str = "thread"
+    params: dict = field(default_factory=dict)
+
+
+def stage_fingerprint(stage: Stage) -> str:
+    """
+    Hash of the stage's source files plus the config values it reads
+    and the parameters it is called with.
+    """
+    h = hashlib.sha256()
+    for path in sorted(stage.code):
+        h.update(path.encode())
+        with open(path, "rb") as f:
+            h.update(f.read())
+    values = {k: getattr(config, k) for k in sorted(stage.config_keys)}
+    h.update(json.dumps(values, sort_keys=True, default=str).encode())
+    if stage.params:
+        h.update(json.dumps(stage.params, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def load_state(path: str = PIPELINE_STATE_PATH) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict, path: str = PIPELINE_STATE_PATH) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def check_stage(stage: Stage, state: dict):
+    """
+    Return (up_to_date, reason) for one stage.
+    """
+    if not stage.outputs:
+        return False, "no outputs to check"
+
+    missing = [p for p in stage.outputs if not os.path.exists(p)]
+    if missing:
+        return False, f"missing output {missing[0]}"
+
+    if state.get(stage.name, {}).get("fingerprint") != stage_fingerprint(stage):
+        return False, "code/config changed"
+
+    newest_input = max(
+        (os.path.getmtime(p) for p in stage.inputs if os.path.exists(p)),
+        default=0,
+    )
+    oldest_output = min(os.path.getmtime(p) for p in stage.outputs)
+    if newest_input > oldest_output:
+        return False, "inputs newer than outputs"
+
+    return True, "up to date"
+
+
+def order_stages(stages):
+    """
+    Topologically sort stages by their deps (keeps list order otherwise).
+    """
+    by_name = {s.name: s for s in stages}
+    ordered, seen = [], set()
+
+    def visit(stage, path=()):
+        if stage.name in seen:
+            return
+        if stage.name in path:
+            raise ValueError(f"Cycle in pipeline at stage {stage.name}")
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage {stage.name} depends on unknown {dep}")
+            visit(by_name[dep], path + (stage.name,))
+        seen.add(stage.name)
+        ordered.append(stage)
+
+    for s in stages:
+        visit(s)
+    return ordered
+
+
+def _measured(name, func, profile_path=None, params=None, exclusive=True) -> dict:
+    """
+    Run one stage function (with its params) under instrument.measure()
+    and return its metrics as a dict (picklable, so process stages can
+    send it back). exclusive=False for stages that share their process
+    with other running stages (memory peaks are then process-wide).
+    """
+    with instrument.measure(name, profile_path, exclusive) as metrics:
+        func(**(params or {}))
+    return metrics.to_dict()
+
+
+def print_timings(status: dict, metrics: dict, wall: float) -> None:
+    print("\n===== STAGE TIMINGS =====")
+    print(f"{'stage':<14} {'result':<8} {'wall':>9} {'cpu':>9} {'peak MB':>8} {'http':>5}")
+    shared = False
+    for name, result in status.items():
+        m = metrics.get(name)
+        if m is None:
+            print(f"{name:<14} {result:<8} {'-':>9}")
+            continue
+        if "peak_rss_mb" in m:
+            peak = f"{m['peak_rss_mb']:8.0f}"
+        else:
+            peak, shared = f"{m['process_peak_rss_mb']:7.0f}*", True
+        print(
+            f"{name:<14} {result:<8} {m['seconds']:8.1f}s {m['cpu_seconds']:8.1f}s "
+            f"{peak} {m['counters'].get('http_requests', 0):5d}"
+        )
+    print(f"{'total wall':<14} {'':<8} {wall:8.1f}s")
+    if shared:
+        print("* process-wide peak (the stage ran alongside other stages)")
+
+
+def run_pipeline(
+    stages,
+    force=(),
+    state_path: str = PIPELINE_STATE_PATH,
+    concurrent: bool = False,
+    max_workers: int = 4,
+    report_dir: str = None,
+    profile: str = None,
+) -> dict:
+    """
+    Run every stage that is out of date (or named in force; "all" forces
+    everything). Returns {stage name: "ran" | "skipped"}.
+
+    Every stage that runs is instrumented (src/instrument.py). With
+    report_dir, a JSON run report is written there at the end; profile
+    names one stage to run under cProfile (dump saved next to the report).
+
+    With concurrent=True, each stage starts as soon as all of its deps
+    have finished: "thread" stages share a thread pool and "process"
+    stages run in a separate worker process, so independent stages
+    overlap instead of running one after another.
+    """
+    stages = order_stages(stages)
+    names = {s.name for s in stages}
+    unknown = set(force) - names - {"all"}
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+
+    if profile and profile not in names:
+        raise ValueError(f"Unknown stage to profile: {profile}")
+
+    state = load_state(state_path)
+    status, reasons, metrics = {}, {}, {}
+    run_id = time.strftime("%Y%m%d_%H%M%S")
+    out_dir = report_dir or RUN_REPORT_DIR
+    wall_start = time.perf_counter()
+
+    def profile_path(stage):
+        if stage.name != profile:
+            return None
+        return os.path.join(out_dir, f"profile_{stage.name}_{run_id}.prof")
+
+    def should_run(stage):
+        forced = "all" in force or stage.name in force
+        up_to_date, reason = check_stage(stage, state)
+        reasons[stage.name] = "forced" if forced else reason
+        if up_to_date and not forced:
+            print(f"[{stage.name}] skipped ({reason})")
+            status[stage.name] = "skipped"
+            return False
+        print(f"\n[{stage.name}] running ({'forced' if forced else reason})")
+        return True
+
+    def record(stage, stage_metrics):
+        elapsed = stage_metrics["seconds"]
+        print(f"[{stage.name}] done in {elapsed:.1f}s")
+        state[stage.name] = {
+            "fingerprint": stage_fingerprint(stage),
+            "finished_at": time.time(),
+            "seconds": round(elapsed, 3),
+        }
+        save_state(state, state_path)
+        status[stage.name] = "ran"
+        metrics[stage.name] = stage_metrics
+
+    if not concurrent:
+        for stage in stages:
+            if should_run(stage):
+                record(
+                    stage,
+                    _measured(
+                        stage.name, stage.func, profile_path(stage), stage.params
+                    ),
+                )
+    else:
+        _run_concurrent(stages, should_run, record, max_workers, profile_path)
+
+    wall = time.perf_counter() - wall_start
+    status = {s.name: status[s.name] for s in stages}
+    print_timings(status, metrics, wall)
+
+    if report_dir:
+        path = instrument.write_run_report(
+            os.path.join(report_dir, f"run_{run_id}.json"),
+            [
+                {
+                    "name": name,
+                    "status": result,
+                    "reason": reasons[name],
+                    **metrics.get(name, {}),
+                }
+                for name, result in status.items()
+            ],
+            wall,
+            {"concurrent": concurrent, "forced": list(force)},
+        )
+        print(f"Run report → {path}")
+    return status
+
+
+def _run_concurrent(stages, should_run, record, max_workers, profile_path):
+    pending = list(stages)
+    done = set()
+    running = {}
+    processes = None
+
+    # start the worker process before any stage thread exists, so the
+    # fork never copies a lock held by a running network thread
+    if any(s.executor == "process" for s in stages):
+        processes = ProcessPoolExecutor(max_workers=1)
+        processes.submit(time.sleep, 0).result()
+
+    threads = ThreadPoolExecutor(max_workers=max_workers)
+
+    try:
+        while pending or running:
+            # start (or skip) every stage whose deps are all finished
+            progress = True
+            while progress:
+                progress = False
+                for stage in list(pending):
+                    if not all(d in done for d in stage.deps):
+                        continue
+                    pending.remove(stage)
+                    progress = True
+                    if not should_run(stage):
+                        done.add(stage.name)
+                        continue
+                    # the stage process runs one stage at a time, so only
+                    # thread stages share their memory peaks with others
+                    args = (
+                        _measured,
+                        stage.name,
+                        stage.func,
+                        profile_path(stage),
+                        stage.params,
+                        stage.executor == "process",
+                    )
+                    if stage.executor == "process":
+                        future = processes.submit(*args)
+                    else:
+                        future = threads.submit(*args)
+                    running[future] = stage
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                record(stage, future.result())
+                done.add(stage.name)
+    finally:
+        threads.shutdown(cancel_futures=True)
+        if processes:
+            processes.shutdown(cancel_futures=True)
@@ -0,0 +1,188 @@
+import os
+import json
+import inspect
+import hashlib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from config import PLOTS_DIR, PLOT_FORMATS, PLOT_WORKERS
+from src import worker_pool
+
+# figure workers import matplotlib / seaborn once, in the forkserver
+worker_pool.preload("src.plots", "matplotlib.figure", "seaborn")
+
+MANIFEST = "plots_manifest.json"
+
+
+# ---------------------------------------------------------------
+# Figures: each draws onto a new matplotlib Figure (no pyplot, so
+# no GUI backend is ever loaded) and returns it.
+# ---------------------------------------------------------------
+def _figure(figsize=None):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    return fig, fig.subplots()
+
+
+def commute_histogram(df):
+    fig, ax = _figure()
+    ax.hist(df["mean_commute_time"].dropna(), bins=10)
+    ax.grid(True)
+    ax.set_xlabel("Mean Commute Time (minutes)")
+    ax.set_ylabel("Number of ZIP Codes")
+    ax.set_title("Distribution of Commute Times")
+    return fig
+
+
+def income_vs_commute(df):
+    fig, ax = _figure()
+    ax.scatter(df["median_income"], df["mean_commute_time"])
+    ax.set_xlabel("Median Household Income")
+    ax.set_ylabel("Mean Commute Time (minutes)")
+    ax.set_title("Commute Time vs Income")
+    return fig
+
+
+def correlation_heatmap(df):
+    import seaborn as sns
+
+    fig, ax = _figure(figsize=(6, 5))
+    corr = df[["mean_commute_time", "median_income", "station_count"]].corr()
+    sns.heatmap(corr, annot=True, cmap="Reds", square=True, ax=ax)
+    ax.set_title("Correlation Matrix: Commute, Income, Station Count")
+    return fig
+
+
+def has_station_heatmap(df):
+    import seaborn as sns
+
+    fig, ax = _figure(figsize=(4, 4))
+    binary = pd.DataFrame(
+        {
+            "mean_commute_time": df["mean_commute_time"],
+            "has_station": df["station_count"] > 0,
+        }
+    )
+    sns.heatmap(binary.corr(), annot=True, cmap="Reds", square=True, ax=ax)
+    ax.set_title("Correlation: Commute Time vs Has Station")
+    return fig
+
+
+def stations_vs_commute(df):
+    fig, ax = _figure(figsize=(8, 6))
+    ax.scatter(df["station_count"], df["mean_commute_time"])
+    ax.set_xlabel("Number of Metro Stations in ZIP")
+    ax.set_ylabel("Mean Commute Time (minutes)")
+    ax.set_title("Commute Time vs Station Density")
+    return fig
+
+
+# name -> (draw function, input columns)
+FIGURES = {
+    "commute_histogram": (commute_histogram, ["mean_commute_time"]),
+    "income_vs_commute": (income_vs_commute, ["median_income", "mean_commute_time"]),
+    "correlation_heatmap": (
+        correlation_heatmap,
+        ["mean_commute_time", "median_income", "station_count"],
+    ),
+    "has_station_heatmap": (
+        has_station_heatmap,
+        ["mean_commute_time", "station_count"],
+    ),
+    "stations_vs_commute": (
+        stations_vs_commute,
+        ["station_count", "mean_commute_time"],
+    ),
+}
+
+
+def figure_hash(name, df, formats) -> str:
+    """
+    Hash of everything a figure depends on: its input columns, the
+    source of its draw function and the output formats.
+    """
+    draw, columns = FIGURES[name]
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(df[columns], index=False).to_numpy().tobytes())
+    h.update(inspect.getsource(draw).encode())
+    h.update(",".join(formats).encode())
+    return h.hexdigest()
+
+
+def _render(name, data, out_dir, formats):
+    """
+    Draw one figure and save it in every format. Runs in a worker process.
+    """
+    draw, _ = FIGURES[name]
+    fig = draw(data)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        fig.savefig(path, bbox_inches="tight")
+        paths.append(path)
+    return paths
+
+
+def _load_manifest(out_dir) -> dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def render_figures(
+    df: pd.DataFrame,
+    out_dir: str = PLOTS_DIR,
+    formats=PLOT_FORMATS,
+    workers: int = PLOT_WORKERS,
+    names=None,
+    force: bool = False,
+) -> dict:
+    """
+    Write every figure (or only `names`) to out_dir/<name>.<fmt>
+    headlessly. A figure is redrawn only when its input data hash
+    changed or a file is missing (or force); the rest are skipped.
+    Figures to redraw are rendered in parallel worker processes.
+    Returns {figure name: "rendered" | "unchanged"}.
+    """
+    names = list(FIGURES) if names is None else list(names)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = _load_manifest(out_dir)
+
+    status, todo = {}, {}
+    for name in names:
+        digest = figure_hash(name, df, formats)
+        files_exist = all(
+            os.path.exists(os.path.join(out_dir, f"{name}.{fmt}")) for fmt in formats
+        )
+        if not force and manifest.get(name) == digest and files_exist:
+            status[name] = "unchanged"
+        else:
+            todo[name] = digest
+
+    if todo:
+        jobs = [
+            (name, df[FIGURES[name][1]].astype("float64"), out_dir, formats)
+            for name in todo
+        ]
+        if workers > 1 and len(jobs) > 1:
+            # never a fork of this process: in --concurrent mode another
+            # stage thread may hold a lock at the moment of the fork
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(jobs)),
+                mp_context=worker_pool.process_context(),
+            ) as pool:
+                list(pool.map(_render, *zip(*jobs)))
+        else:
+            for job in jobs:
+                _render(*job)
+
+        for name, digest in todo.items():
+            manifest[name] = digest
+            status[name] = "rendered"
+        with open(os.path.join(out_dir, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    return {name: status[name] for name in names}
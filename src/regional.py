@@ -0,0 +1,196 @@
+import os
+import argparse
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import (
+    REGIONAL_DATASET_DIR,
+    REGIONAL_WORKERS,
+    METRO_STATIONS_SHP,
+    ZCTA_SHP,
+)
+from src.artifacts import coerce_schema, write_artifact
+from src.acs_variables import fetch_acs_variables
+from src.crosswalk import load_crosswalk_index
+from src.final_data_prep import count_stations_by_zip, merge_zip_dataset
+from src.accessibility import accessibility_by_zip
+
+# keep "06"/"037" as strings instead of letting pyarrow infer integers
+PARTITIONING = ds.partitioning(
+    pa.schema([("state", pa.string()), ("county", pa.string())]), flavor="hive"
+)
+
+
+def partition_path(state, county, out_dir=REGIONAL_DATASET_DIR) -> str:
+    """
+    Hive-style partition file for one county: state=SS/county=CCC/part-0.parquet
+    """
+    return os.path.join(out_dir, f"state={state}", f"county={county}", "part-0.parquet")
+
+
+def build_county_dataset(
+    state,
+    county,
+    stations_shp: str = METRO_STATIONS_SHP,
+    zcta_shp: str = ZCTA_SHP,
+    batch_size=None,
+    features: pd.DataFrame = None,
+) -> pd.DataFrame:
+    """
+    Build the final ZIP-level table for any one county.
+
+    A ZCTA that spans counties is only kept in the county holding most
+    of its population, so partitions never overlap. features is this
+    county's slice of the wide ACS table when the caller already has
+    it (see run_region); otherwise it is fetched here, with
+    batch_size=None meaning one "*" request per endpoint.
+    """
+    zips = load_crosswalk_index().primary_zips_for_county(state, county)
+    zip_full = coerce_schema(pd.DataFrame({"zip_code": zips}), "zip_list")
+
+    if features is None:
+        features = fetch_acs_variables(zips, batch_size=batch_size)
+    station_counts = count_stations_by_zip(stations_shp, zcta_shp, zips)
+    access = accessibility_by_zip(stations_shp, zcta_shp, zips)
+
+    return merge_zip_dataset(zip_full, station_counts, features, access)
+
+
+def _write_county(
+    state, county, out_dir, stations_shp, zcta_shp, batch_size, features=None
+):
+    df = build_county_dataset(
+        state, county, stations_shp, zcta_shp, batch_size, features
+    )
+    path = partition_path(state, county, out_dir)
+    write_artifact(df, "final", path)
+    return state, county, len(df)
+
+
+def region_counties(states=None, counties=None):
+    """
+    List (state, county) pairs to process.
+    states=None means every state in the crosswalk (national run);
+    counties restricts a single-state run to those county codes.
+    """
+    index = load_crosswalk_index()
+    if states is None:
+        states = sorted({s for s in index.frame["state"].unique()})
+
+    pairs = []
+    for state in states:
+        for county in index.counties_in_state(state):
+            if counties is None or county in counties:
+                pairs.append((state, county))
+    return pairs
+
+
+def run_region(
+    states=None,
+    counties=None,
+    out_dir: str = REGIONAL_DATASET_DIR,
+    workers: int = REGIONAL_WORKERS,
+    force: bool = False,
+    stations_shp: str = METRO_STATIONS_SHP,
+    zcta_shp: str = ZCTA_SHP,
+    batch_size=None,
+) -> list:
+    """
+    Build the ZIP-level table county by county and append each county
+    as its own Parquet partition under out_dir.
+
+    Counties run in a pool of worker processes; each worker holds only
+    one county in memory at a time and the parent keeps nothing but
+    the list of finished partitions. Counties whose partition already
+    exists are skipped (unless force), so an interrupted national run
+    resumes where it stopped.
+
+    With batch_size=None the ACS is fetched and parsed once, for every
+    ZCTA of the remaining counties, and each worker gets only its
+    county's rows.
+    """
+    pairs = region_counties(states, counties)
+    todo = [
+        (s, c)
+        for s, c in pairs
+        if force or not os.path.exists(partition_path(s, c, out_dir))
+    ]
+    print(f"{len(pairs)} counties, {len(pairs) - len(todo)} already built")
+
+    index = load_crosswalk_index()
+    county_zips = {(s, c): index.primary_zips_for_county(s, c) for s, c in todo}
+    slices = dict.fromkeys(todo)
+    if batch_size is None and todo:
+        # one "*" request and one parse for the whole region
+        every_zip = [z for zips in county_zips.values() for z in zips]
+        features = fetch_acs_variables(every_zip, batch_size=None)
+        start = 0
+        for key, zips in county_zips.items():
+            slices[key] = features.iloc[start:start + len(zips)].reset_index(drop=True)
+            start += len(zips)
+
+    done = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                _write_county,
+                s,
+                c,
+                out_dir,
+                stations_shp,
+                zcta_shp,
+                batch_size,
+                slices[(s, c)],
+            )
+            for s, c in todo
+        ]
+        for future in as_completed(futures):
+            state, county, rows = future.result()
+            done.append((state, county))
+            print(f"[{len(done)}/{len(todo)}] state={state} county={county}: {rows} ZIPs")
+
+    return done
+
+
+def read_region(out_dir: str = REGIONAL_DATASET_DIR, states=None, counties=None):
+    """
+    Read the partitioned dataset back, optionally only some states/counties.
+    The partition keys come back as state and county columns.
+    """
+    filters = []
+    if states is not None:
+        filters.append(("state", "in", list(states)))
+    if counties is not None:
+        filters.append(("county", "in", list(counties)))
+
+    df = pd.read_parquet(
+        out_dir, filters=filters or None, partitioning=PARTITIONING
+    )
+    return df.astype({"state": "string", "county": "string"})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the ZIP-level dataset for many counties."
+    )
+    parser.add_argument("--state", action="append", help="state FIPS, e.g. 06")
+    parser.add_argument("--county", action="append", help="county FIPS, e.g. 037")
+    parser.add_argument(
+        "--national", action="store_true", help="every county in every state"
+    )
+    parser.add_argument("--workers", type=int, default=REGIONAL_WORKERS)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    if not args.national and not args.state:
+        parser.error("give --state (repeatable) or --national")
+
+    run_region(
+        states=None if args.national else args.state,
+        counties=args.county,
+        workers=args.workers,
+        force=args.force,
+    )
+    print(f"Saved partitioned dataset to {REGIONAL_DATASET_DIR}")
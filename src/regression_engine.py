@@ -0,0 +1,306 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from scipy import stats
+
+from config import (
+    REGRESSION_BOOTSTRAP_DRAWS,
+    REGRESSION_PERMUTATIONS,
+    REGRESSION_WORKERS,
+    REGRESSION_SEED,
+)
+from src import worker_pool
+
+# sweep workers start with numpy / scipy already imported
+worker_pool.preload("src.regression_engine")
+
+OUTCOME = "mean_commute_time"
+
+# The "station effect": the first of these terms found in a spec
+STATION_TERMS = ["station_count", "has_station", "nearest_station_miles", "stations_1mi"]
+
+# Resamples per worker task; fixed so results do not depend on the pool size
+CHUNK_DRAWS = 250
+
+
+@dataclass
+class ModelSpec:
+    """
+    One OLS specification: OUTCOME ~ const + covariates.
+    subset is an optional DataFrame.eval() expression selecting rows,
+    e.g. "zip3 == '900'".
+    """
+
+    name: str
+    covariates: list
+    subset: str = None
+    terms: list = field(init=False)
+
+    def __post_init__(self):
+        self.terms = ["const"] + list(self.covariates)
+
+    @property
+    def effect(self):
+        return next((t for t in STATION_TERMS if t in self.covariates), None)
+
+
+BASE_SPECS = [
+    ModelSpec("baseline", ["median_income", "station_count"]),
+    ModelSpec("log_income", ["log_income", "station_count"]),
+    ModelSpec("has_station", ["median_income", "has_station"]),
+    ModelSpec("log_income_has_station", ["log_income", "has_station"]),
+    ModelSpec("stations_only", ["station_count"]),
+    # need the accessibility columns (src/accessibility.py)
+    ModelSpec("nearest_station", ["log_income", "nearest_station_miles"]),
+    ModelSpec("stations_within_1mi", ["log_income", "stations_1mi"]),
+]
+
+
+def build_design(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the derived covariates used by the specs: log_income,
+    has_station (0/1) and zip3 (3-digit ZIP prefix, a region proxy).
+    Numeric columns are cast to float64.
+    """
+    design = df.copy()
+    numeric = [OUTCOME, "median_income", "station_count"]
+    numeric += [c for c in ("nearest_station_miles", "stations_1mi") if c in design]
+    for col in numeric:
+        design[col] = pd.to_numeric(design[col], errors="coerce").astype("float64")
+
+    income = design["median_income"].where(design["median_income"] > 0)
+    design["log_income"] = np.log(income)
+    design["has_station"] = (design["station_count"] > 0).astype("float64")
+    design.loc[design["station_count"].isna(), "has_station"] = np.nan
+    design["zip3"] = design["zip_code"].astype(str).str[:3]
+    return design
+
+
+def default_specs(design: pd.DataFrame, min_rows: int = 30) -> list:
+    """
+    BASE_SPECS whose covariates are present, plus the baseline refit
+    on each region with at least min_rows ZIPs. Regions are counties
+    when the data has several (see src/regional.py), otherwise 3-digit
+    ZIP prefixes.
+    """
+    region = "zip3"
+    if "county" in design.columns and design["county"].nunique() > 1:
+        region = "county"
+
+    specs = [s for s in BASE_SPECS if all(c in design for c in s.covariates)]
+    sizes = design[region].value_counts()
+    if len(sizes) < 2:
+        # one region (e.g. tract GEOIDs share their first 3 digits): nothing to split
+        return specs
+    for value in sorted(sizes[sizes >= min_rows].index):
+        specs.append(
+            ModelSpec(
+                f"baseline[{region}={value}]",
+                BASE_SPECS[0].covariates,
+                subset=f"{region} == '{value}'",
+            )
+        )
+    return specs
+
+
+def spec_arrays(design: pd.DataFrame, spec: ModelSpec):
+    """
+    Return (X, y) for a spec: complete rows of its subset, with a
+    leading constant column.
+    """
+    rows = design
+    if spec.subset:
+        rows = rows[rows.eval(spec.subset)]
+    rows = rows[[OUTCOME] + list(spec.covariates)].dropna()
+
+    X = np.column_stack(
+        [np.ones(len(rows))] + [rows[c].to_numpy() for c in spec.covariates]
+    )
+    return X, rows[OUTCOME].to_numpy()
+
+
+def batched_ols(X, y, w):
+    """
+    Weighted least squares for a stack of problems in one pass.
+
+    X is (..., n, k), y is (..., n) and w is (..., n) row weights
+    (0 drops a row, bootstrap counts repeat it). Padded all-zero
+    columns get a zero coefficient because the normal equations are
+    solved with a pseudo-inverse. Returns (beta, XtWX pseudo-inverse).
+    """
+    XtW = np.swapaxes(X, -1, -2) * w[..., None, :]
+    xtx_inv = np.linalg.pinv(XtW @ X)
+    beta = (xtx_inv @ (XtW @ y[..., None]))[..., 0]
+    return beta, xtx_inv
+
+
+def fit_specs(design: pd.DataFrame, specs) -> pd.DataFrame:
+    """
+    Fit every spec in one batched solve. Specs are padded to a common
+    (n rows, k terms) shape: excluded rows get weight 0 and missing
+    terms are zero columns. Returns the tidy coefficient table with
+    classical (statsmodels "nonrobust") standard errors.
+    """
+    arrays = [spec_arrays(design, s) for s in specs]
+    n = max(len(y) for _, y in arrays)
+    k = max(X.shape[1] for X, _ in arrays)
+
+    X_all = np.zeros((len(specs), n, k))
+    y_all = np.zeros((len(specs), n))
+    w_all = np.zeros((len(specs), n))
+    for i, (X, y) in enumerate(arrays):
+        X_all[i, : len(y), : X.shape[1]] = X
+        y_all[i, : len(y)] = y
+        w_all[i, : len(y)] = 1.0
+
+    beta, xtx_inv = batched_ols(X_all, y_all, w_all)
+    resid = y_all - (X_all @ beta[..., None])[..., 0]
+
+    rows = []
+    for i, (spec, (X, y)) in enumerate(zip(specs, arrays)):
+        n_obs, n_terms = X.shape
+        ssr = float(np.sum(w_all[i] * resid[i] ** 2))
+        dof = n_obs - n_terms
+        sigma2 = ssr / dof if dof > 0 else np.nan
+        sst = float(np.sum((y - y.mean()) ** 2)) if n_obs else np.nan
+        r2 = 1 - ssr / sst if sst else np.nan
+
+        for j, term in enumerate(spec.terms):
+            se = np.sqrt(sigma2 * xtx_inv[i, j, j])
+            t_value = beta[i, j] / se if se > 0 else np.nan
+            rows.append(
+                {
+                    "spec": spec.name,
+                    "term": term,
+                    "estimate": beta[i, j],
+                    "std_error": se,
+                    "t_value": t_value,
+                    "p_value": 2 * stats.t.sf(abs(t_value), dof) if dof > 0 else np.nan,
+                    "n_obs": n_obs,
+                    "r_squared": r2,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def bootstrap_chunk(X, y, draws, seed):
+    """
+    Case-resampling bootstrap: refit (X, y) on `draws` resamples at
+    once, each resample expressed as multinomial row counts.
+    Returns a (draws, k) array of coefficients.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(y)
+    counts = rng.multinomial(n, np.full(n, 1.0 / n), size=draws).astype("float64")
+    beta, _ = batched_ols(X, y, counts)
+    return beta
+
+
+def permutation_chunk(X, y, j, draws, seed):
+    """
+    Freedman-Lane permutation test for column j: permute the residuals
+    of the model without j, and get each permuted coefficient of j in
+    closed form from j's residual on the other columns (Frisch-Waugh).
+    Returns a (draws,) array of permuted coefficients.
+
+    Both residuals come from one least-squares solve on the other
+    columns, so memory stays O(n k) (no n x n projection matrix).
+    """
+    rng = np.random.default_rng(seed)
+    others = np.delete(X, j, axis=1)
+    targets = np.column_stack([y, X[:, j]])
+    coef = np.linalg.lstsq(others, targets, rcond=None)[0]
+    fitted = others @ coef[:, 0]
+    resid = y - fitted
+    x_resid = X[:, j] - others @ coef[:, 1]
+
+    order = np.argsort(rng.random((draws, len(y))), axis=1)
+    y_perm = fitted + resid[order]
+    return y_perm @ x_resid / (x_resid @ x_resid)
+
+
+def _tasks(specs, arrays, n_boot, n_perm, seed):
+    """
+    Split the resampling work into fixed-size chunks, each with its own
+    child seed, so results are identical for any number of workers.
+    """
+    plan = []
+    for i, spec in enumerate(specs):
+        for start in range(0, n_boot, CHUNK_DRAWS):
+            plan.append(("boot", i, min(CHUNK_DRAWS, n_boot - start)))
+        if spec.effect:
+            for start in range(0, n_perm, CHUNK_DRAWS):
+                plan.append(("perm", i, min(CHUNK_DRAWS, n_perm - start)))
+
+    seeds = np.random.SeedSequence(seed).spawn(len(plan))
+    tasks = []
+    for (kind, i, draws), s in zip(plan, seeds):
+        X, y = arrays[i]
+        if kind == "boot":
+            tasks.append((kind, i, bootstrap_chunk, (X, y, draws, s)))
+        else:
+            j = specs[i].terms.index(specs[i].effect)
+            tasks.append((kind, i, permutation_chunk, (X, y, j, draws, s)))
+    return tasks
+
+
+def run_regression_sweep(
+    df: pd.DataFrame,
+    specs=None,
+    n_boot: int = REGRESSION_BOOTSTRAP_DRAWS,
+    n_perm: int = REGRESSION_PERMUTATIONS,
+    workers: int = REGRESSION_WORKERS,
+    seed: int = REGRESSION_SEED,
+    alpha: float = 0.05,
+) -> pd.DataFrame:
+    """
+    Fit many OLS specifications on the cleaned ZIP-level data and
+    return one tidy table: spec, term, estimate, std_error, t_value,
+    p_value, n_obs, r_squared, boot_ci_low/high (percentile bootstrap)
+    and perm_p_value (station term only).
+
+    Bootstrap and permutation resamples are fitted in vectorized
+    chunks spread over a process pool (workers=1 runs in-process).
+    """
+    design = build_design(df)
+    specs = default_specs(design) if specs is None else specs
+    table = fit_specs(design, specs)
+
+    arrays = [spec_arrays(design, s) for s in specs]
+    tasks = _tasks(specs, arrays, n_boot, n_perm, seed)
+
+    if workers > 1 and len(tasks) > 1:
+        # never a fork of this process: the analysis stage may share it
+        # with threads that are inside BLAS / splu when the pool starts
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=worker_pool.process_context()
+        ) as pool:
+            futures = [pool.submit(func, *args) for _, _, func, args in tasks]
+            results = [f.result() for f in futures]
+    else:
+        results = [func(*args) for _, _, func, args in tasks]
+
+    boot = {i: [] for i in range(len(specs))}
+    perm = {i: [] for i in range(len(specs))}
+    for (kind, i, _, _), result in zip(tasks, results):
+        (boot if kind == "boot" else perm)[i].append(result)
+
+    table["boot_ci_low"] = np.nan
+    table["boot_ci_high"] = np.nan
+    table["perm_p_value"] = np.nan
+    for i, spec in enumerate(specs):
+        rows = table.index[table["spec"] == spec.name]
+        if boot[i]:
+            draws = np.concatenate(boot[i])
+            low, high = np.nanquantile(draws, [alpha / 2, 1 - alpha / 2], axis=0)
+            table.loc[rows, "boot_ci_low"] = low
+            table.loc[rows, "boot_ci_high"] = high
+        if perm[i]:
+            permuted = np.concatenate(perm[i])
+            row = rows[spec.terms.index(spec.effect)]
+            observed = table.at[row, "estimate"]
+            extreme = np.sum(np.abs(permuted) >= abs(observed))
+            table.at[row, "perm_p_value"] = (extreme + 1) / (len(permuted) + 1)
+
+    return table
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+# Quantiles reported by default: quartiles plus the 10th / 90th percentiles
+DEFAULT_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+class QuantileReport:
+    """
+    Quantiles, top-k lists, quantile-bucket crosstabs and segments for
+    many numeric columns of one table.
+
+    The columns are copied once into a float64 matrix and sorted once
+    (one np.sort over all columns, NaNs last); every quantile after that
+    is an index into the sorted matrix, so no method re-sorts or drops
+    missing values again. Results come back as DataFrames.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns=None, id_column="zip_code"):
+        if columns is None:
+            columns = [
+                c
+                for c in df.columns
+                if c != id_column and pd.api.types.is_numeric_dtype(df[c])
+            ]
+        self.df = df
+        self.columns = list(columns)
+        self.id_column = id_column
+        self._pos = {c: i for i, c in enumerate(self.columns)}
+
+        self.values = df[self.columns].astype("float64").to_numpy(na_value=np.nan)
+        self.sorted = np.sort(self.values, axis=0)
+        self.counts = np.count_nonzero(~np.isnan(self.values), axis=0)
+        self._codes = {}
+
+    def _quantiles(self, qs, cols=None) -> np.ndarray:
+        """
+        (len(qs), len(cols)) quantiles, linear interpolation as in np.percentile.
+        """
+        cols = np.arange(len(self.columns)) if cols is None else np.asarray(cols)
+        qs = np.asarray(qs, dtype="float64")[:, None]
+        counts = self.counts[cols][None, :]
+
+        pos = qs * np.maximum(counts - 1, 0)
+        lo = np.floor(pos).astype("int64")
+        hi = np.minimum(lo + 1, np.maximum(counts - 1, 0))
+        frac = pos - lo
+
+        data = self.sorted[:, cols]
+        low = np.take_along_axis(data, lo, axis=0)
+        high = np.take_along_axis(data, hi, axis=0)
+        out = low + (high - low) * frac
+        out[:, self.counts[cols] == 0] = np.nan
+        return out
+
+    def quantiles(self, qs=DEFAULT_QUANTILES) -> pd.DataFrame:
+        """
+        One row per quantile, one column per variable.
+        """
+        index = pd.Index(qs, name="quantile")
+        return pd.DataFrame(self._quantiles(qs), index=index, columns=self.columns)
+
+    def summary(self, qs=(0.25, 0.5, 0.75)) -> pd.DataFrame:
+        """
+        describe()-style table: count, mean, std, min, quantiles, max.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.nanmean(self.values, axis=0)
+            std = np.nanstd(self.values, axis=0, ddof=1)
+        rows = {
+            "count": self.counts.astype("float64"),
+            "mean": mean,
+            "std": std,
+            "min": self._quantiles([0.0])[0],
+            **{f"{q:.0%}": row for q, row in zip(qs, self._quantiles(qs))},
+            "max": self._quantiles([1.0])[0],
+        }
+        return pd.DataFrame(rows, index=self.columns).T
+
+    def top_k(self, column, k=10, largest=True, columns=None) -> pd.DataFrame:
+        """
+        The k rows with the largest (or smallest) values of column,
+        ordered; missing values never make the list. Uses argpartition,
+        so only the k selected rows are sorted.
+        """
+        values = self.values[:, self._pos[column]]
+        key = -values if largest else values.copy()
+        key[np.isnan(key)] = np.inf
+
+        k = min(k, int(np.count_nonzero(~np.isnan(values))))
+        if k <= 0:
+            rows = np.array([], dtype="int64")
+        else:
+            if k < len(key):
+                part = np.argpartition(key, k - 1)[:k]
+            else:
+                part = np.arange(len(key))
+            rows = part[np.argsort(key[part], kind="stable")]
+
+        columns = columns or [self.id_column] + self.columns
+        return self.df.iloc[rows][columns].reset_index(drop=True)
+
+    def buckets(self, column, n=4) -> np.ndarray:
+        """
+        Quantile-bucket code of every row (0 .. n-1, -1 when missing).
+        Buckets are right-closed like pandas.qcut.
+        """
+        if (column, n) not in self._codes:
+            i = self._pos[column]
+            edges = self._quantiles(np.linspace(0, 1, n + 1)[1:-1], [i])[:, 0]
+            values = self.values[:, i]
+            codes = np.searchsorted(edges, values, side="left")
+            codes[np.isnan(values)] = -1
+            self._codes[(column, n)] = codes
+        return self._codes[(column, n)]
+
+    def crosstab(self, row, col, n_row=4, n_col=4, values=None) -> pd.DataFrame:
+        """
+        Counts (or, with values, the mean of that column) for every pair
+        of quantile buckets Q1..Qn of row x col, via one bincount.
+        """
+        r, c = self.buckets(row, n_row), self.buckets(col, n_col)
+        keep = (r >= 0) & (c >= 0)
+        cell = r[keep] * n_col + c[keep]
+
+        table = np.bincount(cell, minlength=n_row * n_col)
+        if values is not None:
+            v = self.values[keep, self._pos[values]]
+            ok = ~np.isnan(v)
+            sums = np.bincount(cell[ok], weights=v[ok], minlength=n_row * n_col)
+            n = np.bincount(cell[ok], minlength=n_row * n_col)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                table = sums / n
+
+        return pd.DataFrame(
+            table.reshape(n_row, n_col),
+            index=pd.Index([f"Q{i + 1}" for i in range(n_row)], name=row),
+            columns=pd.Index([f"Q{i + 1}" for i in range(n_col)], name=col),
+        )
+
+    def segment(self, bounds: dict, columns=None) -> pd.DataFrame:
+        """
+        Rows whose value lies within a quantile range for every column,
+        e.g. {"mean_commute_time": (0.75, 1), "median_income": (0, 0.25)}
+        for "top-quartile commute, bottom-quartile income" (inclusive).
+        """
+        mask = np.ones(len(self.df), dtype=bool)
+        for column, (q_low, q_high) in bounds.items():
+            i = self._pos[column]
+            low, high = self._quantiles([q_low, q_high], [i])[:, 0]
+            values = self.values[:, i]
+            mask &= (values >= low) & (values <= high)
+
+        columns = columns or [self.id_column] + list(bounds)
+        return self.df.iloc[np.flatnonzero(mask)][columns].reset_index(drop=True)
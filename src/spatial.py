@@ -0,0 +1,401 @@
+import numpy as np
+import pandas as pd
+import shapely
+from dataclasses import dataclass
+from scipy import sparse, stats
+from scipy.optimize import minimize_scalar
+from scipy.sparse.linalg import splu
+from scipy.spatial import cKDTree
+from shapely import STRtree
+
+from config import (
+    ZCTA_SHP,
+    SPATIAL_WEIGHTS,
+    SPATIAL_KNN,
+    SPATIAL_PERMUTATIONS,
+    REGRESSION_SEED,
+)
+from src.accessibility import to_xyz, zcta_points
+from src.regression_engine import OUTCOME
+from src.tiger_geo import load_unit_points, load_unit_store
+from src.zcta_geo import load_zcta_store
+
+# Vertices are snapped to this grid (CRS units) before the contiguity
+# tests, so boundaries that differ only by float rounding still touch
+CONTIGUITY_PRECISION = 1e-7
+
+# DE-9IM pattern for "boundaries share a line segment" (rook contiguity)
+ROOK_PATTERN = "****1****"
+
+# Search interval for rho / lambda with row-standardized weights
+COEF_BOUNDS = (-0.99, 0.99)
+
+# Upper bound on n x draws values held at once by the Moran permutations
+PERMUTATION_BLOCK = 20_000_000
+
+
+class SpatialWeights:
+    """
+    Sparse spatial weights: a binary CSR neighbour matrix plus the ids
+    of its rows.
+
+    Contiguity weights test only the polygon pairs whose bounding boxes
+    touch (one STRtree query), and k-nearest-neighbour weights come from
+    a KD-tree, so building them is O(n log n) rather than all pairs and
+    the matrix holds about n x neighbours entries even for every ZCTA
+    in the country.
+    """
+
+    def __init__(self, matrix, ids, kind):
+        self.matrix = sparse.csr_matrix(matrix, dtype="float64")
+        self.ids = np.asarray(ids, dtype=object)
+        self.kind = kind
+
+    @classmethod
+    def contiguity(
+        cls, store, kind="queen", precision=CONTIGUITY_PRECISION
+    ) -> "SpatialWeights":
+        """
+        Queen (shared point) or rook (shared edge) contiguity between
+        the polygons of a GeometryStore. Only polygons with a candidate
+        neighbour are parsed.
+        """
+        if kind not in ("queen", "rook"):
+            raise ValueError(f"Unknown contiguity {kind!r}")
+
+        minx, miny, maxx, maxy = store.bounds()
+        boxes = shapely.box(
+            minx - precision, miny - precision, maxx + precision, maxy + precision
+        )
+        left, right = STRtree(boxes).query(boxes, predicate="intersects")
+        keep = left < right
+        left, right = left[keep], right[keep]
+
+        rows = np.unique(np.concatenate([left, right]))
+        geometries = np.empty(len(store), dtype=object)
+        geometries[rows] = shapely.set_precision(
+            store.geometries(rows), precision, mode="pointwise"
+        )
+        shapely.prepare(geometries[rows])
+        if kind == "queen":
+            hit = shapely.intersects(geometries[left], geometries[right])
+        else:
+            hit = shapely.relate_pattern(geometries[left], geometries[right], ROOK_PATTERN)
+
+        return cls(_symmetric(left[hit], right[hit], len(store)), store.ids, kind)
+
+    @classmethod
+    def knn(cls, lon, lat, ids, k=SPATIAL_KNN) -> "SpatialWeights":
+        """
+        Each point's k nearest other points (great-circle order).
+        Not symmetric: j can be among i's neighbours and not the reverse.
+        """
+        n = len(ids)
+        k = min(k, n - 1)
+        if k < 1:
+            return cls(sparse.csr_matrix((n, n)), ids, "knn")
+
+        _, idx = cKDTree(to_xyz(lon, lat)).query(to_xyz(lon, lat), k=k + 1, workers=-1)
+        # drop each point itself (duplicated locations may list it later)
+        other = idx != np.arange(n)[:, None]
+        order = np.argsort(~other, axis=1, kind="stable")[:, :k]
+        cols = np.take_along_axis(idx, order, axis=1).ravel()
+
+        matrix = sparse.csr_matrix(
+            (np.ones(n * k), (np.repeat(np.arange(n), k), cols)), shape=(n, n)
+        )
+        return cls(matrix, ids, "knn")
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def neighbours(self) -> np.ndarray:
+        """
+        Number of neighbours of each row (0 = island).
+        """
+        return np.diff(self.matrix.indptr)
+
+    def subset(self, ids) -> "SpatialWeights":
+        """
+        Weights restricted to (and ordered by) the given ids.
+        """
+        rows = pd.Index(self.ids).get_indexer(pd.Index(ids, dtype=object))
+        if (rows < 0).any():
+            missing = np.asarray(ids, dtype=object)[rows < 0][:5].tolist()
+            raise KeyError(f"ids without geometry: {missing}")
+        return SpatialWeights(self.matrix[rows][:, rows], ids, self.kind)
+
+    def standardized(self) -> sparse.csr_matrix:
+        """
+        Row-standardized matrix (rows sum to 1; islands stay all zero).
+        """
+        sums = np.asarray(self.matrix.sum(axis=1)).ravel()
+        scale = np.divide(1.0, sums, out=np.zeros_like(sums), where=sums > 0)
+        return sparse.diags(scale) @ self.matrix
+
+
+def _symmetric(left, right, n) -> sparse.csr_matrix:
+    rows = np.concatenate([left, right])
+    cols = np.concatenate([right, left])
+    matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+    matrix.data[:] = 1.0
+    return matrix
+
+
+def load_weights(
+    zips,
+    kind=SPATIAL_WEIGHTS,
+    k=SPATIAL_KNN,
+    zcta_shp=ZCTA_SHP,
+    geo_level="zcta",
+) -> SpatialWeights:
+    """
+    Spatial weights for a ZIP list from the same cached geometry store
+    the pipeline builds the dataset from (ZCTAs, or tracts / block
+    groups with zips holding GEOIDs). Rows follow the store order; use
+    subset() to line them up with a table.
+    """
+    if kind == "knn":
+        if geo_level == "zcta":
+            points = zcta_points(load_zcta_store(zcta_shp, zips).attributes())
+        else:
+            points = load_unit_points(geo_level, zips)
+        return SpatialWeights.knn(points["lon"], points["lat"], points["zip_code"], k)
+
+    if geo_level == "zcta":
+        store = load_zcta_store(zcta_shp, zips)
+    else:
+        store = load_unit_store(geo_level, zips)
+    return SpatialWeights.contiguity(store, kind)
+
+
+@dataclass
+class MoranResult:
+    """
+    Global Moran's I with its expectation under no autocorrelation,
+    normal-approximation z / p and the pseudo p-value of a permutation
+    test (one-sided, in the direction of the observed statistic).
+    """
+
+    statistic: float
+    expected: float
+    z_norm: float
+    p_norm: float
+    p_sim: float
+    permutations: int
+
+
+def morans_i(
+    y,
+    weights: SpatialWeights,
+    permutations=SPATIAL_PERMUTATIONS,
+    seed=REGRESSION_SEED,
+) -> MoranResult:
+    """
+    Moran's I of y (aligned with the weights rows) on row-standardized
+    weights. Permuted statistics are computed in blocks of draws, each
+    one sparse matrix product, so memory stays bounded for any n.
+    """
+    W = weights.standardized()
+    z = np.asarray(y, dtype="float64")
+    z = z - z.mean()
+    n, s0, zz = len(z), W.sum(), z @ z
+    statistic = n / s0 * (z @ (W @ z)) / zz
+
+    # moments under the normality assumption (Cliff and Ord)
+    expected = -1.0 / (n - 1)
+    both = W + W.T
+    s1 = 0.5 * both.multiply(both).sum()
+    s2 = np.sum(
+        (np.asarray(W.sum(axis=1)).ravel() + np.asarray(W.sum(axis=0)).ravel()) ** 2
+    )
+    variance = (n * n * s1 - n * s2 + 3 * s0 * s0) / ((n * n - 1) * s0 * s0)
+    z_norm = (statistic - expected) / np.sqrt(variance - expected**2)
+
+    rng = np.random.default_rng(seed)
+    block = max(1, min(permutations, PERMUTATION_BLOCK // max(n, 1)))
+    simulated = []
+    for start in range(0, permutations, block):
+        draws = min(block, permutations - start)
+        Z = rng.permuted(np.tile(z, (draws, 1)), axis=1).T
+        simulated.append(n / s0 * np.sum(Z * (W @ Z), axis=0) / zz)
+    simulated = np.concatenate(simulated) if simulated else np.array([])
+
+    if statistic >= expected:
+        extreme = np.sum(simulated >= statistic)
+    else:
+        extreme = np.sum(simulated <= statistic)
+
+    return MoranResult(
+        statistic=float(statistic),
+        expected=expected,
+        z_norm=float(z_norm),
+        p_norm=float(2 * stats.norm.sf(abs(z_norm))),
+        p_sim=float((extreme + 1) / (permutations + 1)),
+        permutations=permutations,
+    )
+
+
+def log_det(W, coef) -> float:
+    """
+    log|I - coef * W| from a sparse LU factorization (L has a unit
+    diagonal, so only U's diagonal counts).
+    """
+    A = (sparse.identity(W.shape[0], format="csc") - coef * W).tocsc()
+    return float(np.sum(np.log(np.abs(splu(A).U.diagonal()))))
+
+
+def _profile(neg_loglik):
+    """
+    Maximize a concentrated log-likelihood over COEF_BOUNDS. Returns the
+    estimate and its standard error from the curvature of the profile.
+    """
+    cache = {}
+
+    def f(coef):
+        if coef not in cache:
+            cache[coef] = neg_loglik(coef)
+        return cache[coef]
+
+    coef = minimize_scalar(
+        f, bounds=COEF_BOUNDS, method="bounded", options={"xatol": 1e-6}
+    ).x
+    h = 1e-4
+    curvature = (f(coef + h) - 2 * f(coef) + f(coef - h)) / h**2
+    se = 1 / np.sqrt(curvature) if curvature > 0 else np.nan
+    return coef, se, -f(coef)
+
+
+def _table(model, terms, beta, se, n, loglik) -> pd.DataFrame:
+    beta, se = np.asarray(beta), np.asarray(se)
+    z = beta / se
+    return pd.DataFrame(
+        {
+            "model": model,
+            "term": terms,
+            "estimate": beta,
+            "std_error": se,
+            "z_value": z,
+            "p_value": 2 * stats.norm.sf(np.abs(z)),
+            "n_obs": n,
+            "log_likelihood": loglik,
+        }
+    )
+
+
+def fit_spatial_lag(y, X, weights: SpatialWeights, terms) -> pd.DataFrame:
+    """
+    Maximum-likelihood spatial lag model y = rho W y + X b + e.
+
+    rho maximizes the concentrated likelihood (two OLS fits, then one
+    sparse log-determinant per step); b = b0 - rho bL. Standard errors
+    of b are conditional on rho plus its delta-method share, and rho's
+    comes from the profile curvature.
+    """
+    W = weights.standardized()
+    y, X = np.asarray(y, dtype="float64"), np.asarray(X, dtype="float64")
+    n = len(y)
+    Wy = W @ y
+    b0 = np.linalg.lstsq(X, y, rcond=None)[0]
+    bL = np.linalg.lstsq(X, Wy, rcond=None)[0]
+    e0, eL = y - X @ b0, Wy - X @ bL
+
+    def neg_loglik(rho):
+        e = e0 - rho * eL
+        return n / 2 * np.log(e @ e / n) - log_det(W, rho)
+
+    rho, rho_se, profile = _profile(neg_loglik)
+    beta = b0 - rho * bL
+    e = e0 - rho * eL
+    sigma2 = e @ e / n
+    cov = sigma2 * np.linalg.pinv(X.T @ X) + rho_se**2 * np.outer(bL, bL)
+
+    loglik = profile - n / 2 * (np.log(2 * np.pi) + 1)
+    return _table(
+        "spatial_lag",
+        list(terms) + ["rho"],
+        np.append(beta, rho),
+        np.append(np.sqrt(np.diag(cov)), rho_se),
+        n,
+        loglik,
+    )
+
+
+def fit_spatial_error(y, X, weights: SpatialWeights, terms) -> pd.DataFrame:
+    """
+    Maximum-likelihood spatial error model y = X b + u, u = lambda W u + e,
+    fitted by GLS on (I - lambda W) y and (I - lambda W) X for each
+    lambda tried.
+    """
+    W = weights.standardized()
+    y, X = np.asarray(y, dtype="float64"), np.asarray(X, dtype="float64")
+    n = len(y)
+    Wy, WX = W @ y, W @ X
+
+    def gls(lam):
+        ys, Xs = y - lam * Wy, X - lam * WX
+        beta = np.linalg.lstsq(Xs, ys, rcond=None)[0]
+        return beta, ys - Xs @ beta, Xs
+
+    def neg_loglik(lam):
+        _, e, _ = gls(lam)
+        return n / 2 * np.log(e @ e / n) - log_det(W, lam)
+
+    lam, lam_se, profile = _profile(neg_loglik)
+    beta, e, Xs = gls(lam)
+    cov = (e @ e / n) * np.linalg.pinv(Xs.T @ Xs)
+
+    loglik = profile - n / 2 * (np.log(2 * np.pi) + 1)
+    return _table(
+        "spatial_error",
+        list(terms) + ["lambda"],
+        np.append(beta, lam),
+        np.append(np.sqrt(np.diag(cov)), lam_se),
+        n,
+        loglik,
+    )
+
+
+def run_spatial_models(
+    df: pd.DataFrame,
+    weights: SpatialWeights,
+    covariates=("median_income", "station_count"),
+    permutations=SPATIAL_PERMUTATIONS,
+    seed=REGRESSION_SEED,
+) -> dict:
+    """
+    Moran's I of the commute outcome and of the OLS residuals, plus the
+    spatial lag and spatial error fits, on the complete rows of df
+    (weights are subset to them).
+
+    Returns {"moran": one row per variable, "models": tidy coefficient
+    table with model, term, estimate, std_error, z_value, p_value,
+    n_obs, log_likelihood}.
+    """
+    columns = [OUTCOME] + list(covariates)
+    rows = df[["zip_code"] + columns].dropna()
+    rows = rows[rows["zip_code"].isin(set(weights.ids))]
+    w = weights.subset(rows["zip_code"].tolist())
+
+    y = rows[OUTCOME].to_numpy(dtype="float64")
+    X = np.column_stack(
+        [np.ones(len(rows))] + [rows[c].to_numpy(dtype="float64") for c in covariates]
+    )
+    terms = ["const"] + list(covariates)
+    resid = y - X @ np.linalg.lstsq(X, y, rcond=None)[0]
+
+    moran = pd.DataFrame(
+        [
+            {"variable": name, "weights": w.kind, "n_obs": len(y), **vars(result)}
+            for name, result in [
+                (OUTCOME, morans_i(y, w, permutations, seed)),
+                ("ols_residual", morans_i(resid, w, permutations, seed)),
+            ]
+        ]
+    )
+    models = pd.concat(
+        [fit_spatial_lag(y, X, w, terms), fit_spatial_error(y, X, w, terms)],
+        ignore_index=True,
+    )
+    return {"moran": moran, "models": models}
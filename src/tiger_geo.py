@@ -0,0 +1,116 @@
+import os
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from config import (
+    TRACT_SHP,
+    BLOCK_GROUP_SHP,
+    TIGER_CACHE_DIR,
+    LA_STATE_FIPS,
+    LA_COUNTY_FIPS,
+)
+from src.geometry_store import GeometryStore
+from src.zcta_geo import _digest, source_fingerprint
+from src.zcta_lookup import ZCTALookup
+
+# Sub-county geography levels -> TIGER/Line layer (one file per state)
+TIGER_LAYERS = {
+    "tract": TRACT_SHP,
+    "block_group": BLOCK_GROUP_SHP,
+}
+
+# Id column and attribute columns kept from the tract / block-group layers
+TIGER_ID_COLUMN = "GEOID"
+TIGER_COLUMNS = [TIGER_ID_COLUMN, "STATEFP", "COUNTYFP", "INTPTLAT", "INTPTLON"]
+
+
+def layer_path(geo_level, shp_path=None) -> str:
+    if geo_level not in TIGER_LAYERS:
+        raise ValueError(f"Unknown geography level {geo_level!r}")
+    return shp_path or TIGER_LAYERS[geo_level]
+
+
+def load_county_store(
+    geo_level,
+    state=LA_STATE_FIPS,
+    county=LA_COUNTY_FIPS,
+    shp_path=None,
+    cache_dir=TIGER_CACHE_DIR,
+) -> GeometryStore:
+    """
+    Tract or block-group polygons of one county as a memory-mapped
+    GeometryStore. The layer is read once with an attribute filter (the
+    rest of the state is never built) and kept until the shapefile changes.
+    """
+    shp_path = layer_path(geo_level, shp_path)
+    stem = os.path.splitext(os.path.basename(shp_path))[0]
+    key = _digest(f"{source_fingerprint(shp_path)}|{state}|{county}")
+    cache_path = os.path.join(cache_dir, stem, key + ".feather")
+
+    if os.path.exists(cache_path):
+        return GeometryStore.open(cache_path)
+
+    units = gpd.read_file(
+        shp_path,
+        columns=TIGER_COLUMNS,
+        where=f"STATEFP = '{state}' AND COUNTYFP = '{county}'",
+    )
+    units = units.sort_values(TIGER_ID_COLUMN, ignore_index=True)
+    GeometryStore.from_geodataframe(units, TIGER_ID_COLUMN).write(cache_path)
+    return GeometryStore.open(cache_path)
+
+
+def load_county_units(geo_level, state=LA_STATE_FIPS, county=LA_COUNTY_FIPS, **kwargs):
+    """
+    Tract or block-group polygons of one county as a GeoDataFrame.
+    """
+    return load_county_store(geo_level, state, county, **kwargs).to_geodataframe()
+
+
+def county_unit_ids(geo_level, state=LA_STATE_FIPS, county=LA_COUNTY_FIPS, **kwargs):
+    """
+    Sorted GEOIDs of every tract or block group in a county.
+    """
+    return load_county_store(geo_level, state, county, **kwargs).ids.tolist()
+
+
+def load_unit_store(geo_level, ids, shp_path=None) -> GeometryStore:
+    """
+    Store with the polygons of a GEOID list, read county by county
+    (GEOID = state(2) + county(3) + tract(6) [+ block group(1)]).
+    """
+    ids = sorted(set(map(str, ids)))
+    counties = sorted({i[:5] for i in ids})
+    if len(counties) == 1:
+        store = load_county_store(geo_level, counties[0][:2], counties[0][2:], shp_path)
+    else:
+        # several counties (or none): one in-memory store built from their tables
+        stores = [load_county_store(geo_level, c[:2], c[2:], shp_path) for c in counties]
+        if not stores:
+            stores = [load_county_store(geo_level, shp_path=shp_path)]
+        store = GeometryStore(pa.concat_tables([s.table for s in stores]))
+    return store.take(np.flatnonzero(np.isin(store.ids, ids)))
+
+
+def load_unit_lookup(geo_level, ids, shp_path=None) -> ZCTALookup:
+    """
+    Point-in-polygon lookup over the given tracts / block groups;
+    assign_points() returns their GEOIDs.
+    """
+    return ZCTALookup(load_unit_store(geo_level, ids, shp_path))
+
+
+def load_unit_points(geo_level, ids, shp_path=None) -> pd.DataFrame:
+    """
+    Census internal point of each tract / block group: zip_code (GEOID), lon, lat.
+    """
+    units = load_unit_store(geo_level, ids, shp_path).attributes()
+    return pd.DataFrame(
+        {
+            "zip_code": units[TIGER_ID_COLUMN].astype(str).to_numpy(),
+            "lon": pd.to_numeric(units["INTPTLON"]).to_numpy(),
+            "lat": pd.to_numeric(units["INTPTLAT"]).to_numpy(),
+        }
+    )
@@ -0,0 +1,29 @@
+import multiprocessing
+
+# Modules the forkserver imports once, before it forks any worker
+_preload = []
+
+
+def preload(*modules: str) -> None:
+    """
+    Have pool workers start with these modules already imported (call
+    at import time, before the first pool starts the forkserver).
+    """
+    for module in modules:
+        if module not in _preload:
+            _preload.append(module)
+
+
+def process_context():
+    """
+    Start method for process pools created while other threads may be
+    running (e.g. inside a --concurrent pipeline stage).
+
+    Workers fork from a forkserver, never from this process, so they
+    cannot inherit a lock another thread holds in BLAS, splu or the
+    HTTP pool. The server has already imported the preloaded modules,
+    so a worker does not pay for numpy / scipy / matplotlib imports.
+    """
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(list(_preload))
+    return context
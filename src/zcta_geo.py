@@ -0,0 +1,124 @@
+import os
+import glob
+import shutil
+import hashlib
+import pyogrio
+import geopandas as gpd
+
+from config import ZCTA_SHP, ZCTA_CACHE_DIR
+from src.geometry_store import GeometryStore
+
+# ZCTA id column in the TIGER/Line 2020 ZCTA shapefile
+ZCTA_ID_COLUMN = "ZCTA5CE20"
+
+# Attribute columns kept from the shapefile (geometry is always kept)
+ZCTA_COLUMNS = [ZCTA_ID_COLUMN, "ALAND20", "AWATER20", "INTPTLAT20", "INTPTLON20"]
+
+# OGR SQL rejects much longer IN (...) lists; bigger ZIP sets select by row id
+WHERE_MAX_ZIPS = 1000
+
+
+def source_fingerprint(shp_path: str) -> str:
+    """
+    Size + mtime of the shapefile parts, so a replaced download
+    invalidates every subset cut from it.
+    """
+    stem = os.path.splitext(shp_path)[0]
+    parts = []
+    for ext in (".shp", ".dbf"):
+        st = os.stat(stem + ext)
+        parts.append(f"{ext}:{st.st_size}:{st.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def subset_cache_path(shp_path, zips, bbox, cache_dir=ZCTA_CACHE_DIR) -> str:
+    """
+    Geometry-store sidecar path for one (source file, ZIP set, bbox) combination:
+    <cache_dir>/<shapefile stem>/<source digest>/<subset digest>.feather
+    """
+    stem = os.path.splitext(os.path.basename(shp_path))[0]
+    source = _digest(source_fingerprint(shp_path))
+    zip_key = "*" if zips is None else ",".join(sorted(map(str, zips)))
+    subset = _digest(zip_key + "|" + repr(bbox))
+    return os.path.join(cache_dir, stem, source, subset + ".feather")
+
+
+def read_zcta_subset(shp_path=ZCTA_SHP, zips=None, bbox=None) -> gpd.GeoDataFrame:
+    """
+    Read only the requested ZCTAs from the nationwide shapefile.
+    The ZIP list becomes an attribute filter and bbox (minx, miny, maxx,
+    maxy in the file's CRS) a spatial filter, both applied by the reader
+    so the other ~33k polygons are never built.
+    """
+    where = None
+    if zips is not None:
+        zips = sorted(set(map(str, zips)))
+        if len(zips) > WHERE_MAX_ZIPS:
+            return _read_zcta_rows(shp_path, zips, bbox)
+        quoted = ",".join(f"'{z}'" for z in zips)
+        where = f"{ZCTA_ID_COLUMN} IN ({quoted})" if quoted else "1 = 0"
+
+    return gpd.read_file(shp_path, columns=ZCTA_COLUMNS, where=where, bbox=bbox)
+
+
+def _read_zcta_rows(shp_path, zips, bbox=None) -> gpd.GeoDataFrame:
+    """
+    Large ZIP sets: scan the id column alone (no geometry), then read
+    full rows only for the matching feature ids.
+    """
+    ids = pyogrio.read_dataframe(
+        shp_path,
+        columns=[ZCTA_ID_COLUMN],
+        read_geometry=False,
+        bbox=bbox,
+        fid_as_index=True,
+    )
+    fids = ids.index[ids[ZCTA_ID_COLUMN].isin(zips)].to_numpy()
+    gdf = gpd.read_file(shp_path, columns=ZCTA_COLUMNS, fids=fids)
+    return gdf.reset_index(drop=True)
+
+
+def load_zcta_store(
+    shp_path: str = ZCTA_SHP,
+    zips=None,
+    bbox=None,
+    cache_dir: str = ZCTA_CACHE_DIR,
+) -> GeometryStore:
+    """
+    Return the ZCTA polygons for a ZIP list (and/or bbox) as a
+    memory-mapped GeometryStore. The shapefile is only read when the
+    sidecar is missing or the source shapefile changed; afterwards every
+    process maps the same Feather file instead of parsing its own copy.
+    """
+    cache_path = subset_cache_path(shp_path, zips, bbox, cache_dir)
+
+    if os.path.exists(cache_path):
+        return GeometryStore.open(cache_path)
+
+    zcta = read_zcta_subset(shp_path, zips, bbox)
+
+    # drop subsets cut from an older copy of the shapefile
+    source_dir = os.path.dirname(cache_path)
+    for old in glob.glob(os.path.join(os.path.dirname(source_dir), "*")):
+        if old != source_dir:
+            shutil.rmtree(old, ignore_errors=True)
+
+    GeometryStore.from_geodataframe(zcta, ZCTA_ID_COLUMN).write(cache_path)
+    return GeometryStore.open(cache_path)
+
+
+def load_county_zctas(
+    shp_path: str = ZCTA_SHP,
+    zips=None,
+    bbox=None,
+    cache_dir: str = ZCTA_CACHE_DIR,
+) -> gpd.GeoDataFrame:
+    """
+    Return ZCTA polygons for a ZIP list (and/or bbox) as a GeoDataFrame,
+    built from the cached geometry store (see load_zcta_store).
+    """
+    return load_zcta_store(shp_path, zips, bbox, cache_dir).to_geodataframe()
@@ -0,0 +1,86 @@
+import numpy as np
+import shapely
+from shapely import STRtree
+from pyproj import CRS, Transformer
+
+from config import ZCTA_SHP, ZCTA_CACHE_DIR
+from src.geometry_store import GeometryStore
+from src.zcta_geo import ZCTA_ID_COLUMN, load_zcta_store
+
+
+class ZCTALookup:
+    """
+    Point-in-polygon engine over a fixed set of ZCTA polygons.
+
+    Polygons stay as WKB in a GeometryStore (memory-mapped when it comes
+    from disk). The STRtree indexes their bounding boxes, and only the
+    polygons whose box holds a query point are parsed and prepared, once
+    each. assign_points() answers a whole array of points in one call.
+    """
+
+    def __init__(self, store: GeometryStore):
+        self.store = store
+        self.ids = store.ids
+        self.crs = CRS.from_user_input(store.crs).to_wkt()
+        self.tree = STRtree(shapely.box(*store.bounds()))
+        self._geometries = np.full(len(store), None, dtype=object)
+        self._transformers = {}
+
+    @classmethod
+    def from_geodataframe(cls, gdf, id_column=ZCTA_ID_COLUMN):
+        return cls(GeometryStore.from_geodataframe(gdf, id_column))
+
+    def __reduce__(self):
+        return (ZCTALookup, (self.store,))
+
+    def _to_native(self, x, y, crs):
+        key = CRS.from_user_input(crs).to_wkt()
+        if key == self.crs:
+            return x, y
+        if key not in self._transformers:
+            self._transformers[key] = Transformer.from_crs(
+                key, self.crs, always_xy=True
+            )
+        return self._transformers[key].transform(x, y)
+
+    def geometries(self, rows) -> np.ndarray:
+        """
+        Prepared polygons for the given rows, parsed on first use.
+        """
+        rows = np.asarray(rows, dtype="int64")
+        todo = np.unique(rows[self._geometries[rows] == None])  # noqa: E711
+        if len(todo):
+            parsed = self.store.geometries(todo)
+            shapely.prepare(parsed)
+            self._geometries[todo] = parsed
+        return self._geometries[rows]
+
+    def assign_points(self, lon, lat, crs="EPSG:4326") -> np.ndarray:
+        """
+        Return the ZCTA id containing each point (None if outside all).
+        Coordinates are in `crs` (lon/lat WGS84 by default).
+        """
+        x, y = self._to_native(
+            np.asarray(lon, dtype=float), np.asarray(lat, dtype=float), crs
+        )
+        point_idx, poly_idx = self.tree.query(shapely.points(x, y))
+
+        inside = shapely.contains_xy(
+            self.geometries(poly_idx), x[point_idx], y[point_idx]
+        )
+        out = np.full(len(x), None, dtype=object)
+        out[point_idx[inside]] = self.ids[poly_idx[inside]]
+        return out
+
+
+def load_zcta_lookup(
+    shp_path: str = ZCTA_SHP,
+    zips=None,
+    bbox=None,
+    cache_dir: str = ZCTA_CACHE_DIR,
+) -> ZCTALookup:
+    """
+    Return a ZCTALookup for a ZIP list over the cached, memory-mapped
+    geometry store (see load_zcta_store).
+    """
+    return ZCTALookup(load_zcta_store(shp_path, zips, bbox, cache_dir))
@@ -1,7 +1,22 @@
 from src.commute_times import get_la_county_zips
 from src.median_hhincome import get_la_income_zips
 from src.metro_station import load_metro_stations
+from src.acs_client import ACSClient, chunk_zips, parse_acs_rows
+from src.http_cache import HTTPCache
+from src.crosswalk import CrosswalkIndex, parse_crosswalk
+from src.zcta_geo import load_county_zctas, subset_cache_path
+from src.zcta_lookup import ZCTALookup, load_zcta_lookup
+from src.pipeline import Stage, run_pipeline
+from src.artifacts import ArtifactSchemaError, read_artifact, write_artifact
+import src.acs_client as acs_client
+import src.acs_variables as acs_variables
+import src.regional as regional
+from src.regression_engine import ModelSpec, run_regression_sweep
+from src.census_stub import make_synthetic_zcta_shp, start_stub_census_server
 import os
+import sys
+import tempfile
+import time
 
 
 def test_zip_loader():
@@ -41,9 +56,1215 @@ def test_metro_shapefile():
         print("PASSED: Loaded", len(gdf), "stations.")
 
 
+def test_acs_batching():
+    print("Running test_acs_batching...")
+
+    zips = [str(90001 + i) for i in range(250)]
+    batches = chunk_zips(zips, 100)
+    payload = [
+        ["NAME", "B19013_001E", "zip code tabulation area"],
+        ["ZCTA5 90002", "52000", "90002"],
+        ["ZCTA5 90001", "48000", "90001"],
+    ]
+    rows = parse_acs_rows(payload, ["B19013_001E"])
+
+    if len(batches) != 3 or batches[0].count(",") != 99:
+        print("FAILED: chunk_zips() did not split into 100-ZIP batches.")
+    elif chunk_zips(zips, None) != ["*"]:
+        print("FAILED: chunk_zips() did not return a wildcard request.")
+    elif rows.get("90001") != ["ZCTA5 90001", "48000"]:
+        print("FAILED: parse_acs_rows() did not key rows by ZIP.")
+    else:
+        print("PASSED: 250 ZIPs fetched in", len(batches), "requests.")
+
+
+def test_acs_client_stub():
+    print("Running test_acs_client_stub...")
+
+    server, url, stats = start_stub_census_server(latency=0.05, throttle_first=2)
+    client = ACSClient(max_concurrency=4, backoff=0.05, cache=False)
+    zips = [str(90001 + i) for i in range(80)]
+
+    saved = dict(acs_variables.DATASET_URLS)
+    try:
+        acs_variables.DATASET_URLS.update(detailed=url)
+        df = acs_variables.fetch_acs_variables(
+            zips, ["median_household_income"], 10, client
+        )
+    finally:
+        acs_variables.DATASET_URLS.update(saved)
+        server.shutdown()
+
+    # out of retries while still throttled: the shared delay must not drop
+    server, url, _ = start_stub_census_server(latency=0, throttle_first=2)
+    exhausted = ACSClient(max_retries=1, backoff=0.05, cache=False)
+    try:
+        last = exhausted.get(url, {"get": "NAME", "for": "zip code tabulation area:90001"})
+    finally:
+        server.shutdown()
+
+    if df["median_household_income"].isna().any():
+        print("FAILED: some ZIPs missing after retries.")
+    elif last.status_code != 429 or exhausted.throttle.delay < 0.05:
+        print("FAILED: exhausted 429 retries relaxed the throttle:", exhausted.throttle.delay)
+    elif stats["throttled"] != 2 or stats["requests"] != 10:
+        print("FAILED: expected 8 batches + 2 retried 429s, got", stats)
+    elif stats["max_in_flight"] > 4:
+        print("FAILED: concurrency cap exceeded:", stats["max_in_flight"])
+    else:
+        print(
+            "PASSED: 80 ZIPs in", stats["requests"], "requests,",
+            stats["max_in_flight"], "in flight at most.",
+        )
+
+
+def test_http_cache():
+    print("Running test_http_cache...")
+
+    server, url, stats = start_stub_census_server(latency=0, throttle_first=0)
+    params = {"get": "NAME,B19013_001E", "for": "zip code tabulation area:90001"}
+
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            client = ACSClient(cache=HTTPCache(cache_dir))
+            first = client.get(url, dict(params, key="secret-1"), ttl=None)
+            warm = client.get(url, dict(params, key="secret-2"), ttl=None)
+            stale = client.get(url, params, ttl=0)
+    finally:
+        server.shutdown()
+
+    if stats["requests"] != 2:
+        print("FAILED: warm cache still hit the network:", stats)
+    elif stats["not_modified"] != 1 or stale.json() != first.json():
+        print("FAILED: stale entry was not revalidated with a 304.")
+    elif not getattr(warm, "from_cache", False):
+        print("FAILED: API key changed the cache key.")
+    else:
+        print("PASSED: 3 lookups,", stats["requests"], "requests, 1 revalidated.")
+
+
+def test_crosswalk_index():
+    print("Running test_crosswalk_index...")
+
+    content = (
+        b"ZCTA5,STATE,COUNTY,GEOID,POPPT,HUPT,AREAPT\n"
+        b"90001,06,037,06037,5000,1,100\n"
+        b"90002,06,037,06037,3000,1,300\n"
+        b"90002,06,059,06059,1000,1,100\n"
+        b"92602,06,059,06059,2000,1,50\n"
+    )
+    index = CrosswalkIndex(parse_crosswalk(content))
+    la = index.zips_for_county("06", "037")
+    split = index.counties_for_zip("90002")
+
+    if la != ["90001", "90002"]:
+        print("FAILED: wrong ZIPs for LA County:", la)
+    elif list(split["county"]) != ["037", "059"] or list(split["pop_share"]) != [0.75, 0.25]:
+        print("FAILED: wrong county shares for 90002:", split)
+    elif index.zips_for_county("06", "999"):
+        print("FAILED: unknown county should return no ZIPs.")
+    else:
+        print("PASSED: crosswalk index lookups.")
+
+
+def test_crosswalk_refresh():
+    print("Running test_crosswalk_refresh...")
+    import src.crosswalk as crosswalk
+    from src.http_cache import cache_key
+
+    server, url, stats = start_stub_census_server(latency=0, throttle_first=0)
+    saved = (crosswalk.ZCTA_CROSSWALK_URL, crosswalk.CROSSWALK_CACHE_TTL_SECONDS)
+    saved_client = acs_client._default_client
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "index.parquet")
+        try:
+            crosswalk.ZCTA_CROSSWALK_URL = f"{url}/crosswalk.txt"
+            cache = HTTPCache(os.path.join(folder, "http"))
+            acs_client._default_client = ACSClient(backoff=0.01, cache=cache)
+            crosswalk.clear_index_cache()
+
+            first = crosswalk.load_crosswalk_index(path)
+            crosswalk.clear_index_cache()  # new process: Parquet index reused
+            again = crosswalk.load_crosswalk_index(path)
+            fresh_requests = stats["requests"]
+
+            # an expired entry is revalidated (304); the file is unchanged,
+            # so the index is neither rebuilt in memory nor rewritten
+            crosswalk.CROSSWALK_CACHE_TTL_SECONDS = 0
+            written = os.path.getmtime(path)
+            revalidated = crosswalk.load_crosswalk_index(path)
+            crosswalk.clear_index_cache()
+            reread = crosswalk.load_crosswalk_index(path)
+            rewritten = os.path.getmtime(path) != written
+            crosswalk.CROSSWALK_CACHE_TTL_SECONDS = saved[1]
+
+            # the HTTP cache entry is replaced by a newer relationship file
+            key = cache_key(crosswalk.ZCTA_CROSSWALK_URL)
+            body = b"ZCTA5,STATE,COUNTY,GEOID,POPPT,HUPT,AREAPT\n91000,06,037,06037,1,1,1\n"
+            cache.store(key, crosswalk.ZCTA_CROSSWALK_URL, 200, body, {"ETag": '"v2"'})
+            replaced = crosswalk.load_crosswalk_index(path)
+            crosswalk.clear_index_cache()
+            from_disk = crosswalk.load_crosswalk_index(path)
+        finally:
+            crosswalk.ZCTA_CROSSWALK_URL, crosswalk.CROSSWALK_CACHE_TTL_SECONDS = saved
+            acs_client._default_client = saved_client
+            crosswalk.clear_index_cache()
+            server.shutdown()
+
+    if again is first or fresh_requests != 1 or len(again.frame) != len(first.frame):
+        print("FAILED: index not reused from Parquet while the cache entry is fresh.")
+    elif stats["not_modified"] != 2 or revalidated is not again:
+        print("FAILED: expired crosswalk entry not revalidated in place.")
+    elif rewritten or len(reread.frame) != len(first.frame):
+        print("FAILED: 304 revalidation rebuilt the Parquet index.")
+    elif replaced.frame["zcta"].tolist() != ["91000"] or from_disk.frame["zcta"].tolist() != ["91000"]:
+        print("FAILED: replaced crosswalk file was not picked up.")
+    else:
+        print("PASSED: crosswalk index follows its HTTP cache entry.")
+
+
+def test_zcta_subset_cache():
+    print("Running test_zcta_subset_cache...")
+
+    with tempfile.TemporaryDirectory() as folder:
+        shp = make_synthetic_zcta_shp(folder)
+        cache_dir = os.path.join(folder, "cache")
+        zips = ["90003", "90011", "90099"]
+
+        first = load_county_zctas(shp, zips, cache_dir=cache_dir)
+        cached = os.path.exists(subset_cache_path(shp, zips, None, cache_dir))
+        second = load_county_zctas(shp, zips, cache_dir=cache_dir)
+
+        os.utime(shp, (time.time() + 10, time.time() + 10))
+        stale = os.path.exists(subset_cache_path(shp, zips, None, cache_dir))
+
+    if sorted(first["ZCTA5CE20"]) != zips:
+        print("FAILED: filtered read returned", sorted(first["ZCTA5CE20"]))
+    elif not cached or not second.geometry.equals(first.geometry):
+        print("FAILED: GeoParquet sidecar was not written or reused.")
+    elif stale:
+        print("FAILED: sidecar still used after the shapefile changed.")
+    else:
+        print("PASSED: read", len(first), "of 100 ZCTAs and cached the subset.")
+
+
+def test_zcta_lookup():
+    print("Running test_zcta_lookup...")
+
+    with tempfile.TemporaryDirectory() as folder:
+        shp = make_synthetic_zcta_shp(folder)
+        cache_dir = os.path.join(folder, "cache")
+        zips = [str(90000 + i) for i in range(100)]
+
+        lookup = load_zcta_lookup(shp, zips, cache_dir=cache_dir)
+        reloaded = load_zcta_lookup(shp, zips, cache_dir=cache_dir)
+
+        # cell centres of 90000 and 90011, plus one point off the grid
+        lon = [-118.45, -118.35, -120.0]
+        lat = [33.55, 33.65, 30.0]
+        found = reloaded.assign_points(lon, lat).tolist()
+
+    if not isinstance(reloaded, ZCTALookup) or reloaded is lookup:
+        print("FAILED: lookup was not reloaded from disk.")
+    elif found != ["90000", "90011", None]:
+        print("FAILED: assign_points() returned", found)
+    else:
+        print("PASSED: points assigned from the cached geometry store.")
+
+
+def test_pipeline_runner():
+    print("Running test_pipeline_runner...")
+
+    with tempfile.TemporaryDirectory() as folder:
+        raw = os.path.join(folder, "raw.txt")
+        out = os.path.join(folder, "out.txt")
+        state = os.path.join(folder, "state.json")
+        calls = []
+
+        def fetch():
+            calls.append("fetch")
+            open(raw, "w").write("1")
+
+        def build():
+            calls.append("build")
+            open(out, "w").write(open(raw).read() * 2)
+
+        stages = [
+            Stage("build", build, inputs=[raw], outputs=[out], deps=["fetch"]),
+            Stage("fetch", fetch, outputs=[raw]),
+        ]
+
+        first = run_pipeline(stages, state_path=state)
+        second = run_pipeline(stages, state_path=state)
+        forced = run_pipeline(stages, force=["build"], state_path=state)
+        os.utime(raw, (time.time() + 10, time.time() + 10))
+        touched = run_pipeline(stages, state_path=state)
+
+    if calls[:2] != ["fetch", "build"] or set(first.values()) != {"ran"}:
+        print("FAILED: first run did not run stages in dependency order.")
+    elif set(second.values()) != {"skipped"}:
+        print("FAILED: up-to-date stages were rerun:", second)
+    elif forced != {"fetch": "skipped", "build": "ran"}:
+        print("FAILED: --force did not rerun only one stage:", forced)
+    elif touched != {"fetch": "skipped", "build": "ran"}:
+        print("FAILED: newer input did not trigger a rerun:", touched)
+    else:
+        print("PASSED: stages skipped, forced and rerun as expected.")
+
+
+def test_pipeline_concurrent():
+    print("Running test_pipeline_concurrent...")
+    from functools import partial
+
+    with tempfile.TemporaryDirectory() as folder:
+        def touch(name):
+            return partial(open, os.path.join(folder, name), "w")
+
+        def slow(name):
+            time.sleep(0.5)
+            touch(name)().close()
+
+        stages = [
+            Stage("a", partial(slow, "a"), outputs=[os.path.join(folder, "a")]),
+            Stage("b", partial(slow, "b"), outputs=[os.path.join(folder, "b")]),
+            Stage(
+                "c",
+                partial(time.sleep, 0.5),
+                outputs=[],
+                executor="process",
+            ),
+            Stage("d", touch("d"), outputs=[os.path.join(folder, "d")],
+                  deps=["a", "b", "c"]),
+        ]
+
+        start = time.perf_counter()
+        status = run_pipeline(
+            stages, state_path=os.path.join(folder, "s.json"), concurrent=True
+        )
+        wall = time.perf_counter() - start
+
+    if set(status.values()) != {"ran"}:
+        print("FAILED: not every stage ran:", status)
+    elif wall > 1.2:
+        print(f"FAILED: independent stages did not overlap ({wall:.2f}s).")
+    else:
+        print(f"PASSED: 3 x 0.5s stages finished in {wall:.2f}s.")
+
+
+def test_artifacts():
+    print("Running test_artifacts...")
+    import pandas as pd
+
+    df = pd.DataFrame(
+        {
+            "zip_code": [90001, 2134],
+            "station_count": [2.0, None],
+            "mean_commute_time": [31.5, None],
+            "median_income": ["52000", None],
+        }
+    )
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "final.parquet")
+        csv_path = os.path.join(folder, "final.csv")
+        write_artifact(df, "final", path, csv_path)
+        typed = read_artifact("final", path)
+        from_csv = read_artifact("final", csv_path)
+
+        drifted = os.path.join(folder, "drifted.parquet")
+        typed.astype({"station_count": "float64"}).to_parquet(drifted)
+        try:
+            read_artifact("final", drifted)
+            drift_caught = False
+        except ArtifactSchemaError:
+            drift_caught = True
+
+    if typed["zip_code"].tolist() != ["90001", "02134"]:
+        print("FAILED: zip_code not kept as 5-character strings.")
+    elif str(typed["station_count"].dtype) != "Int32":
+        print("FAILED: station_count is", typed["station_count"].dtype)
+    elif not typed.dtypes.equals(from_csv.dtypes):
+        print("FAILED: CSV export does not load back with the same schema.")
+    elif not drift_caught:
+        print("FAILED: schema drift was not detected.")
+    else:
+        print("PASSED: typed artifacts round-trip and reject drift.")
+
+
+def test_regional_dataset():
+    print("Running test_regional_dataset...")
+    import geopandas as gpd
+    from shapely.geometry import Point
+    import src.acs_variables as acs_variables
+
+    # two fake counties: 90000-90049 in 037, 90050-90099 in 059;
+    # 90049 also has a smaller part in 059 and 90050 one in 037
+    content = "ZCTA5,STATE,COUNTY,POPPT,AREAPT\n" + "".join(
+        f"{90000 + i},06,{'037' if i < 50 else '059'},100,100\n"
+        for i in range(100)
+    ) + "90049,06,059,30,300\n90050,06,037,30,300\n"
+    index = CrosswalkIndex(parse_crosswalk(content.encode()))
+    server, url, stats = start_stub_census_server(latency=0.01, throttle_first=0)
+
+    saved = (
+        regional.load_crosswalk_index,
+        dict(acs_variables.DATASET_URLS),
+        acs_client._default_client,
+    )
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            shp = make_synthetic_zcta_shp(folder)
+            stations = os.path.join(folder, "stations.shp")
+            # one station in 90000 and two in 90099
+            gpd.GeoDataFrame(
+                {"STOP_ID": [1, 2, 3]},
+                geometry=[Point(-118.45, 33.55), Point(-117.55, 34.45), Point(-117.52, 34.48)],
+                crs="EPSG:4326",
+            ).to_file(stations)
+
+            regional.load_crosswalk_index = lambda: index
+            acs_variables.DATASET_URLS.update(subject=url, detailed=url)
+            acs_client._default_client = ACSClient(
+                cache=HTTPCache(os.path.join(folder, "http"))
+            )
+
+            out_dir = os.path.join(folder, "dataset")
+            kwargs = dict(
+                out_dir=out_dir, workers=2, stations_shp=stations, zcta_shp=shp
+            )
+            first = regional.run_region(states=["06"], **kwargs)
+            second = regional.run_region(states=["06"], **kwargs)
+            df = regional.read_region(out_dir)
+            orange = regional.read_region(out_dir, counties=["059"])
+        finally:
+            os.chdir(cwd)
+            regional.load_crosswalk_index, urls, acs_client._default_client = saved
+            acs_variables.DATASET_URLS.update(urls)
+            server.shutdown()
+
+    counts = df.set_index("zip_code")["station_count"]
+    home = df.set_index("zip_code")["county"]
+    if sorted(first) != [("06", "037"), ("06", "059")] or second:
+        print("FAILED: counties built", first, "then", second)
+    elif len(df) != 100 or df["median_income"].isna().any():
+        print("FAILED: partitioned dataset has", len(df), "rows.")
+    elif home["90049"] != "037" or home["90050"] != "059":
+        print("FAILED: ZCTAs spanning counties not kept in their main county.")
+    elif counts["90000"] != 1 or counts["90099"] != 2 or counts.sum() != 3:
+        print("FAILED: wrong station counts per ZIP.")
+    elif len(orange) != 50 or set(orange["county"]) != {"059"}:
+        print("FAILED: county filter returned", len(orange), "rows.")
+    elif stats["requests"] != 2:
+        print("FAILED: expected one wildcard request per endpoint, got", stats["requests"])
+    else:
+        print("PASSED: 2 county partitions built from 2 ACS requests.")
+
+
+def test_regression_sweep():
+    print("Running test_regression_sweep...")
+    import numpy as np
+    import pandas as pd
+    import statsmodels.api as sm
+
+    rng = np.random.default_rng(0)
+    n = 300
+    income = rng.uniform(30000, 150000, n)
+    stations = rng.poisson(0.6, n)
+    commute = 35 - 0.00005 * income - 1.5 * stations + rng.normal(0, 2, n)
+    df = pd.DataFrame(
+        {
+            "zip_code": [str(90000 + i) for i in range(n)],
+            "station_count": stations,
+            "mean_commute_time": commute,
+            "median_income": income,
+        }
+    )
+    specs = [
+        ModelSpec("baseline", ["median_income", "station_count"]),
+        ModelSpec("has_station", ["median_income", "has_station"]),
+        ModelSpec("zip3_900", ["station_count"], subset="zip3 == '900'"),
+    ]
+
+    start = time.perf_counter()
+    table = run_regression_sweep(df, specs, n_boot=1000, n_perm=1000, workers=2)
+    wall = time.perf_counter() - start
+    again = run_regression_sweep(df, specs[:1], n_boot=1000, n_perm=1000, workers=1)
+
+    ols = sm.OLS(commute, sm.add_constant(df[["median_income", "station_count"]])).fit()
+    base = table[table["spec"] == "baseline"].set_index("term")
+    effect = base.loc["station_count"]
+
+    if len(table) != 3 + 3 + 2:
+        print("FAILED: expected 8 coefficient rows, got", len(table))
+    elif not np.allclose(base["estimate"], ols.params.to_numpy()) or not np.allclose(
+        base["std_error"], ols.bse.to_numpy()
+    ):
+        print("FAILED: batched fit does not match statsmodels.")
+    elif not effect["boot_ci_low"] < -1.5 < effect["boot_ci_high"]:
+        print("FAILED: bootstrap CI misses the true station effect:", effect.to_dict())
+    elif effect["perm_p_value"] > 0.01 or not base["perm_p_value"].drop("station_count").isna().all():
+        print("FAILED: permutation p-value not on the station term only.")
+    elif not np.allclose(again.filter(like="boot").to_numpy(), table.iloc[:3].filter(like="boot").to_numpy()):
+        print("FAILED: results depend on the number of workers.")
+    else:
+        print(f"PASSED: 3 specs with 2 x 1000 resamples each in {wall:.2f}s.")
+
+
+def test_permutation_memory():
+    print("Running test_permutation_memory...")
+    import tracemalloc
+    import numpy as np
+    from src.regression_engine import permutation_chunk
+
+    rng = np.random.default_rng(1)
+    n = 4000
+    X = np.column_stack([np.ones(n), rng.normal(size=n), rng.poisson(0.6, n)])
+    y = X @ np.array([30.0, -2.0, -1.5]) + rng.normal(0, 2, n)
+
+    tracemalloc.start()
+    perm = permutation_chunk(X, y, 2, 50, 0)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # same statistic through the explicit projection, on a small slice
+    small = permutation_chunk(X[:200], y[:200], 2, 50, 0)
+    others = X[:200, :2]
+    proj = others @ np.linalg.pinv(others)
+    fitted = proj @ y[:200]
+    x_resid = X[:200, 2] - proj @ X[:200, 2]
+    order = np.argsort(np.random.default_rng(0).random((50, 200)), axis=1)
+    expected = (fitted + (y[:200] - fitted)[order]) @ x_resid / (x_resid @ x_resid)
+
+    if peak > n * n * 8 / 4:
+        print(f"FAILED: {peak / 1e6:.0f} MB peak for {n} rows (n x n matrix built?).")
+    elif perm.shape != (50,) or not np.allclose(small, expected):
+        print("FAILED: permuted coefficients differ from the projection formula.")
+    else:
+        print(f"PASSED: {n}-row permutation chunk peaked at {peak / 1e6:.1f} MB.")
+
+
+def test_instrumentation():
+    print("Running test_instrumentation...")
+    import glob
+    import json
+
+    server, url, stats = start_stub_census_server(latency=0.01, throttle_first=2)
+    client = ACSClient(max_concurrency=4, backoff=0.01, cache=False)
+
+    saved = dict(acs_variables.DATASET_URLS)
+
+    with tempfile.TemporaryDirectory() as folder:
+        out = os.path.join(folder, "acs_features.parquet")
+
+        def fetch():
+            zips = [str(90000 + i) for i in range(40)]
+            df = acs_variables.fetch_acs_variables(zips, None, 10, client)
+            write_artifact(df, "acs_features", out)
+
+        stages = [Stage("fetch", fetch, outputs=[out])]
+        try:
+            acs_variables.DATASET_URLS.update(subject=url + "/subject", detailed=url)
+            run_pipeline(
+                stages,
+                state_path=os.path.join(folder, "s.json"),
+                report_dir=folder,
+                profile="fetch",
+            )
+        finally:
+            acs_variables.DATASET_URLS.update(saved)
+            server.shutdown()
+
+        reports = glob.glob(os.path.join(folder, "run_*.json"))
+        profiles = glob.glob(os.path.join(folder, "profile_fetch_*.prof"))
+        report = json.load(open(reports[0])) if reports else {"stages": [{}]}
+
+        # two thread stages at once: memory peaks are reported as process-wide
+        both = os.path.join(folder, "concurrent")
+        run_pipeline(
+            [Stage("a", lambda: time.sleep(0.05)), Stage("b", lambda: time.sleep(0.05))],
+            concurrent=True,
+            state_path=os.path.join(both, "s.json"),
+            report_dir=both,
+        )
+        overlapped = json.load(open(glob.glob(os.path.join(both, "run_*.json"))[0]))
+
+    stage = report["stages"][0]
+    counters = stage.get("counters", {})
+    if len(reports) != 1 or len(profiles) != 1:
+        print("FAILED: run report or profile dump not written.")
+    elif counters.get("http_requests") != stats["requests"] or counters.get("http_retries") != 2:
+        print("FAILED: HTTP counters do not match the server:", counters)
+    elif stage.get("rows") != {"write:acs_features": 40}:
+        print("FAILED: row counts not recorded:", stage.get("rows"))
+    elif not stage["seconds"] > 0 or not stage["peak_rss_mb"] > 0:
+        print("FAILED: timings/memory missing:", stage)
+    elif any("peak_rss_mb" in s or "process_peak_rss_mb" not in s for s in overlapped["stages"]):
+        print("FAILED: overlapping stages reported per-stage memory peaks.")
+    else:
+        print(f"PASSED: {stats['requests']} requests, 2 retries and 40 rows in the run report.")
+
+
+def test_plot_rendering():
+    print("Running test_plot_rendering...")
+    import numpy as np
+    import pandas as pd
+    from src.plots import FIGURES, render_figures
+
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame(
+        {
+            "zip_code": [str(90000 + i) for i in range(50)],
+            "station_count": pd.array(rng.poisson(0.5, 50), dtype="Int32"),
+            "mean_commute_time": rng.normal(30, 5, 50).astype("float32"),
+            "median_income": rng.uniform(3e4, 1.5e5, 50).astype("float32"),
+        }
+    )
+
+    with tempfile.TemporaryDirectory() as folder:
+        first = render_figures(df, folder, workers=2)
+        second = render_figures(df, folder, workers=2)
+        df["median_income"] *= 1.1
+        third = render_figures(df, folder, workers=2)
+        files = sorted(os.listdir(folder))
+
+    if set(first.values()) != {"rendered"} or len(files) != 2 * len(FIGURES) + 1:
+        print("FAILED: figures not written as PNG and SVG:", files)
+    elif set(second.values()) != {"unchanged"}:
+        print("FAILED: unchanged data was re-rendered:", second)
+    elif {n for n, s in third.items() if s == "rendered"} != {
+        "income_vs_commute",
+        "correlation_heatmap",
+    }:
+        print("FAILED: wrong figures re-rendered after an income change:", third)
+    else:
+        print("PASSED: figures rendered headless and redrawn only on data change.")
+
+
+def test_cli_lazy_imports():
+    print("Running test_cli_lazy_imports...")
+    import subprocess
+    import sys
+
+    heavy = ["pandas", "geopandas", "statsmodels", "matplotlib", "seaborn"]
+    code = (
+        "import sys, config, main; "
+        f"print([m for m in {heavy!r} if m in sys.modules]); "
+        "print([(s.name, s.deps) for s in main.select_stages('build')]); "
+        "from src.pipeline import stage_fingerprint; "
+        "z, t = main.select_stages('build'), main.select_stages('build', 'tract'); "
+        "print([s.params['geo_level'] for s in t], config.GEO_LEVEL, "
+        "all(stage_fingerprint(a) != stage_fingerprint(b) for a, b in zip(z, t))); "
+        "c = main.select_stages('build', export_csv=True); "
+        "print([s.params.get('export_csv') for s in c])"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout.splitlines()
+
+    if not out or out[0] != "[]":
+        print("FAILED: importing main.py loaded heavy modules:", out)
+    elif out[1] != "[('stations', []), ('accessibility', []), ('geo_merge', ['stations', 'accessibility'])]":
+        print("FAILED: build subcommand selected", out[1])
+    elif out[2] != "['tract', 'tract', 'tract'] zcta True":
+        print("FAILED: --geo-level not passed to the stages / fingerprints:", out[2])
+    elif out[3] != "[True, None, True]":
+        print("FAILED: --csv not passed to the stages that write CSV copies:", out[3])
+    else:
+        print("PASSED: main.py starts without pandas/geopandas/statsmodels/matplotlib.")
+
+
+def test_station_accessibility():
+    print("Running test_station_accessibility...")
+    import numpy as np
+    import pandas as pd
+    from src.accessibility import EARTH_RADIUS_MILES, StationIndex, station_accessibility
+
+    rng = np.random.default_rng(2)
+    st_lon, st_lat = rng.uniform(-118.7, -117.7, 2000), rng.uniform(33.7, 34.8, 2000)
+    points = pd.DataFrame(
+        {
+            "zip_code": [str(90000 + i) for i in range(300)],
+            "lon": rng.uniform(-118.8, -117.6, 300),
+            "lat": rng.uniform(33.6, 34.9, 300),
+        }
+    )
+
+    start = time.perf_counter()
+    result = station_accessibility(points, StationIndex(st_lon, st_lat), radii=(0.5, 1, 2))
+    wall = time.perf_counter() - start
+
+    # brute force: haversine distance from every point to every station
+    lon1, lat1 = np.radians(points["lon"].to_numpy())[:, None], np.radians(points["lat"].to_numpy())[:, None]
+    lon2, lat2 = np.radians(st_lon)[None, :], np.radians(st_lat)[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    miles = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+    if list(result.columns) != ["zip_code", "nearest_station_miles", "stations_0_5mi", "stations_1mi", "stations_2mi"]:
+        print("FAILED: unexpected columns:", list(result.columns))
+    elif not np.allclose(result["nearest_station_miles"], miles.min(axis=1), atol=1e-4):
+        print("FAILED: nearest-station distances differ from brute force.")
+    elif not all(
+        (result[col].to_numpy() == (miles <= r).sum(axis=1)).all()
+        for col, r in [("stations_0_5mi", 0.5), ("stations_1mi", 1), ("stations_2mi", 2)]
+    ):
+        print("FAILED: station counts within radii differ from brute force.")
+    else:
+        print(f"PASSED: KD-tree matches brute force for 300 points x 2000 stations in {wall:.3f}s.")
+
+
+def test_acs_panel():
+    print("Running test_acs_panel...")
+    import requests
+    from src.acs_panel import build_panel, panel_wide, year_path
+
+    class FlakyClient(ACSClient):
+        # fails the second ZIP batch of one year while `bad` is set
+        bad = None
+
+        def get(self, url, params=None, ttl=None):
+            if self.bad and self.bad in url and "90030" in params["for"]:
+                raise requests.ConnectionError("simulated failure")
+            return super().get(url, params, ttl)
+
+    server, url, stats = start_stub_census_server(latency=0.02, throttle_first=0)
+    client = FlakyClient(max_concurrency=8, backoff=0.01, max_retries=0, cache=False)
+    zips = [str(90000 + i) for i in range(40)]
+
+    with tempfile.TemporaryDirectory() as folder:
+        kwargs = dict(
+            zips=zips,
+            out_dir=os.path.join(folder, "years"),
+            output=os.path.join(folder, "panel.parquet"),
+            batch_size=20,
+            client=client,
+            base_url=url,
+        )
+        client.bad = "/2015/"
+        start = time.perf_counter()
+        partial = build_panel(range(2012, 2022), **kwargs)
+        wall = time.perf_counter() - start
+        first = stats["requests"]
+        cached_2015 = os.path.exists(year_path(2015, kwargs["out_dir"]))
+
+        client.bad = None
+        panel = build_panel(range(2012, 2023), **kwargs)
+        added = stats["requests"] - first
+    server.shutdown()
+
+    wide = panel_wide(panel)
+    missing = partial.loc[partial["value"].isna(), "year"].unique().tolist()
+    # 10 years x 2 variable groups x 2 ZIP batches, 2 of them failing
+    if first != 38 or stats["max_in_flight"] < 2:
+        print("FAILED: expected 38 concurrent requests, got", first, stats)
+    elif cached_2015 or missing != [2015]:
+        print("FAILED: year with failed requests was cached or not marked missing:", missing)
+    elif added != 6:
+        print("FAILED: retrying 2015 and adding 2022 should cost 6 requests, got", added)
+    elif len(panel) != 40 * 11 * 2 or panel["value"].isna().any():
+        print("FAILED: incomplete long panel:", len(panel))
+    elif list(wide.columns) != ["zip_code", "year", "mean_commute_minutes", "median_household_income"]:
+        print("FAILED: unexpected wide columns:", list(wide.columns))
+    else:
+        print(f"PASSED: 10-year panel in {wall:.2f}s; failed year retried, adding a year cost 4 requests.")
+
+
+def test_tract_level():
+    print("Running test_tract_level...")
+    import src.acs_variables as acs_variables
+    import src.commute_times as commute_times
+    import src.median_hhincome as median_hhincome
+    import src.tiger_geo as tiger_geo
+    from src.accessibility import accessibility_by_zip
+    from src.census_stub import make_synthetic_stations_shp, make_synthetic_tract_shp
+    from src.final_data_prep import count_stations_by_zip, get_la_zip_frame, merge_zip_dataset
+
+    server, url, stats = start_stub_census_server(latency=0.01, throttle_first=0)
+    client = ACSClient(backoff=0.01, cache=False)
+    saved = (dict(acs_variables.DATASET_URLS), dict(tiger_geo.TIGER_LAYERS))
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            acs_variables.DATASET_URLS.update(subject=url, detailed=url)
+            tiger_geo.TIGER_LAYERS["tract"] = make_synthetic_tract_shp(folder, 10)
+            stations = make_synthetic_stations_shp(folder, 100, 10)
+
+            ids = get_la_zip_frame(geo_level="tract")["zip_code"].tolist()
+            commute = commute_times.get_la_commute_zips(ids, client=client, geo_level="tract")
+            income = median_hhincome.get_la_income_zips(ids, client=client, geo_level="tract")
+            counts = count_stations_by_zip(stations, None, ids, "tract")
+            access = accessibility_by_zip(stations, None, ids, "tract")
+            features = commute.merge(income[["zip_code", "median_household_income"]], on="zip_code")
+            final = merge_zip_dataset(get_la_zip_frame(geo_level="tract"), counts, features, access)
+        finally:
+            os.chdir(cwd)
+            urls, layers = saved
+            acs_variables.DATASET_URLS.update(urls)
+            tiger_geo.TIGER_LAYERS.update(layers)
+            server.shutdown()
+
+    if len(ids) != 100 or not all(len(i) == 11 for i in ids):
+        print("FAILED: expected 100 tract GEOIDs, got", ids[:3])
+    elif stats["requests"] != 2:
+        print("FAILED: expected one county-wide request per table, got", stats["requests"])
+    elif len(final) != 100 or final["station_count"].sum() != 100:
+        print("FAILED: stations not assigned to tracts:", final["station_count"].sum())
+    elif final["mean_commute_time"].isna().any() or final["median_income"].isna().any():
+        print("FAILED: ACS values missing for some tracts.")
+    elif list(final.columns[:4]) != ["zip_code", "station_count", "mean_commute_time", "median_income"]:
+        print("FAILED: tract output does not follow the final schema.")
+    else:
+        print("PASSED: 100 tracts from 2 county-wide requests in the final schema.")
+
+
+def test_geometry_store():
+    print("Running test_geometry_store...")
+    import pickle
+    import pyarrow as pa
+    from src.zcta_geo import load_zcta_store
+
+    with tempfile.TemporaryDirectory() as folder:
+        shp = make_synthetic_zcta_shp(folder, n=40)
+        cache_dir = os.path.join(folder, "cache")
+        zips = [str(90000 + i) for i in range(1600)]
+        load_zcta_store(shp, zips, cache_dir=cache_dir)
+
+        before = pa.total_allocated_bytes()
+        start = time.perf_counter()
+        store = load_zcta_store(shp, zips, cache_dir=cache_dir)
+        bounds = store.bounds()
+        wall = time.perf_counter() - start
+        copied = pa.total_allocated_bytes() - before
+
+        expected = load_county_zctas(shp, zips, cache_dir=cache_dir)
+        clone = pickle.loads(pickle.dumps(store))
+        lookup = load_zcta_lookup(shp, zips, cache_dir=cache_dir)
+        found = lookup.assign_points([-118.45, -118.35], [33.55, 33.55]).tolist()
+        parsed = sum(g is not None for g in lookup._geometries)
+
+    if copied > 0:
+        print("FAILED: opening the store copied", copied, "bytes.")
+    elif not store.to_geodataframe().geometry.equals(expected.geometry):
+        print("FAILED: geometries do not round-trip through WKB.")
+    elif clone.path != store.path or len(pickle.dumps(store)) > 1000:
+        print("FAILED: a file-backed store should pickle as its path.")
+    elif found != ["90000", "90001"] or parsed > 4:
+        print(f"FAILED: lookup returned {found} after parsing {parsed} polygons.")
+    else:
+        print(f"PASSED: 1600 ZCTAs mapped in {wall * 1000:.1f} ms with no copy; lookup parsed {parsed}.")
+
+
+def test_quantile_report():
+    print("Running test_quantile_report...")
+    import numpy as np
+    import pandas as pd
+    from src.reporting import QuantileReport
+
+    rng = np.random.default_rng(3)
+    n, m = 33000, 40
+    df = pd.DataFrame(rng.lognormal(3, 1, (n, m)), columns=[f"v{i}" for i in range(m)])
+    df.iloc[rng.integers(0, n, 2000), 3] = np.nan
+    df.insert(0, "zip_code", [f"{i:05d}" for i in range(n)])
+
+    start = time.perf_counter()
+    report = QuantileReport(df)
+    quantiles = report.quantiles()
+    summary = report.summary()
+    top = report.top_k("v3", 10)
+    table = report.crosstab("v0", "v3", 4, 5)
+    wall = time.perf_counter() - start
+
+    expected = np.nanpercentile(df.iloc[:, 1:].to_numpy(), [10, 25, 50, 75, 90], axis=0)
+    qcut = pd.crosstab(pd.qcut(df["v0"], 4, labels=False), pd.qcut(df["v3"], 5, labels=False))
+    segment = report.segment({"v0": (0.75, 1), "v1": (0, 0.25)})
+    brute = df[(df["v0"] >= df["v0"].quantile(0.75)) & (df["v1"] <= df["v1"].quantile(0.25))]
+
+    if not np.allclose(quantiles.to_numpy(), expected):
+        print("FAILED: quantiles differ from np.nanpercentile.")
+    elif not np.allclose(summary.to_numpy(), df.iloc[:, 1:].describe().to_numpy()):
+        print("FAILED: summary differs from describe().")
+    elif top["zip_code"].tolist() != df.nlargest(10, "v3")["zip_code"].tolist():
+        print("FAILED: top-k differs from nlargest.")
+    elif not (table.to_numpy() == qcut.to_numpy()).all():
+        print("FAILED: bucket crosstab differs from pd.qcut.")
+    elif segment["zip_code"].tolist() != brute["zip_code"].tolist():
+        print("FAILED: segment rows differ from the percentile filter.")
+    else:
+        print(f"PASSED: {m} columns x {n} rows reported in {wall:.2f}s.")
+
+
+def test_acs_variables():
+    print("Running test_acs_variables...")
+    import src.acs_variables as acs_variables
+    import pandas as pd
+    from src.acs_variables import ACSVariable, fetch_acs_variables
+
+    # 12 covariates: 10 detailed-table counts and 2 subject-table rates
+    registry = {
+        f"v{i}": ACSVariable(
+            f"v{i}",
+            f"B{i:05d}_001E",
+            "detailed" if i < 10 else "subject",
+            dtype="Int32" if i < 10 else "float32",
+            scale=1 if i < 10 else 1 / 1000,
+        )
+        for i in range(12)
+    }
+    # 90000 answers 100757 for every variable: treat it as an annotation code
+    registry["v0"] = ACSVariable("v0", "B00000_001E", suppression=(100757,))
+    zips = [str(90000 + i) for i in range(30)]
+
+    server, url, stats = start_stub_census_server(latency=0.01, throttle_first=0)
+    client = ACSClient(backoff=0.01, cache=False)
+    saved = dict(acs_variables.DATASET_URLS)
+    try:
+        acs_variables.DATASET_URLS.update(subject=url, detailed=url)
+        wide = fetch_acs_variables(zips, None, 10, client, registry=registry)
+        grouped = stats["requests"]
+        fetch_acs_variables(zips, None, 10, client, registry=registry, max_variables=6)
+        split = stats["requests"] - grouped
+    finally:
+        acs_variables.DATASET_URLS.update(saved)
+        server.shutdown()
+
+    raw = wide["zip_code"].astype(int).map(lambda z: 20000 + 997 * (z % 97))
+    if list(wide.columns) != ["NAME"] + list(registry) + ["zip_code"]:
+        print("FAILED: unexpected columns", list(wide.columns))
+    elif grouped != 6:
+        print("FAILED: expected 2 endpoints x 3 ZIP batches = 6 requests, got", grouped)
+    elif split != 9:
+        print("FAILED: expected 5 + 5 + 2 variables per call (9 requests), got", split)
+    elif str(wide["v1"].dtype) != "Int32" or str(wide["v11"].dtype) != "float32":
+        print("FAILED: registered dtypes not applied:", wide.dtypes.to_dict())
+    elif not (wide["v1"].astype(int) == raw).all():
+        print("FAILED: detailed values do not match the raw estimates.")
+    elif not ((wide["v11"] - raw / 1000).abs() < 1e-3).all():
+        print("FAILED: subject values not scaled to minutes.")
+    elif pd.notna(wide.loc[0, "v0"]) or wide["v0"].iloc[1:].isna().any():
+        print("FAILED: annotation code not masked:", wide["v0"].head(3).tolist())
+    else:
+        print("PASSED: 12 variables x 30 ZIPs in", grouped, "requests.")
+
+
+def test_spatial_models():
+    print("Running test_spatial_models...")
+    import geopandas as gpd
+    import numpy as np
+    from scipy import sparse
+    from scipy.sparse.linalg import spsolve
+    from src.geometry_store import GeometryStore
+    from src.spatial import SpatialWeights, fit_spatial_lag, log_det, morans_i
+
+    with tempfile.TemporaryDirectory() as folder:
+        grid = gpd.read_file(make_synthetic_zcta_shp(folder, 20))
+    store = GeometryStore.from_geodataframe(grid, "ZCTA5CE20")
+    queen = SpatialWeights.contiguity(store, "queen")
+    rook = SpatialWeights.contiguity(store, "rook")
+    lon, lat = grid["INTPTLON20"].astype(float), grid["INTPTLAT20"].astype(float)
+    knn = SpatialWeights.knn(lon, lat, store.ids, 4)
+
+    # y = 0.5 W y + 1 + 2 x + e on the 20 x 20 grid
+    rng = np.random.default_rng(0)
+    n = len(store)
+    W = queen.standardized()
+    X = np.column_stack([np.ones(n), rng.normal(size=n)])
+    y = spsolve((sparse.identity(n) - 0.5 * W).tocsc(), X @ [1, 2] + rng.normal(size=n))
+
+    clustered = morans_i(y, queen, 199)
+    noise = morans_i(rng.normal(size=n), queen, 199)
+    lag = fit_spatial_lag(y, X, queen, ["const", "x"]).set_index("term")
+    dense = np.linalg.slogdet(np.eye(n) - 0.5 * W.toarray())[1]
+
+    # 20 x 20 grid: 2 x 20 x 19 shared edges, plus 2 x 19 x 19 shared corners
+    if rook.matrix.nnz != 2 * 760 or queen.matrix.nnz != 2 * (760 + 722):
+        print("FAILED: contiguity links", rook.matrix.nnz, queen.matrix.nnz)
+    elif not (knn.neighbours == 4).all() or knn.matrix.diagonal().any():
+        print("FAILED: knn weights should have 4 neighbours and no self-links.")
+    elif abs(log_det(W, 0.5) - dense) > 1e-8:
+        print("FAILED: sparse log-determinant", log_det(W, 0.5), "vs dense", dense)
+    elif clustered.statistic < 0.1 or clustered.p_sim > 0.01 or noise.p_sim < 0.05:
+        print("FAILED: Moran's I", clustered, noise)
+    elif abs(lag.at["rho", "estimate"] - 0.5) > 0.1 or abs(lag.at["x", "estimate"] - 2) > 0.1:
+        print("FAILED: spatial lag estimates", lag["estimate"].to_dict())
+    else:
+        print(
+            f"PASSED: Moran's I {clustered.statistic:.2f} (p={clustered.p_sim:.3f}),",
+            f"rho={lag.at['rho', 'estimate']:.2f} on 400 polygons.",
+        )
+
+
+def test_memoization():
+    print("Running test_memoization...")
+    import numpy as np
+    import pandas as pd
+    import src.memo as memo
+    from src.final_analysis import descriptive_analysis
+
+    calls = []
+
+    def fit(df, scale=1.0, workers=1):
+        calls.append(scale)
+        return df["x"].sum() * scale
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "zip_code": [str(90000 + i) for i in range(500)],
+            "x": rng.normal(size=500),
+            "mean_commute_time": rng.uniform(20, 40, 500),
+            "median_income": rng.uniform(3e4, 1.5e5, 500),
+            "station_count": rng.poisson(0.5, 500),
+        }
+    )
+    saved = memo._default_cache
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            memo._default_cache = memo.ResultCache(folder)
+            cached = memo.memoize(ignore=("workers",))(fit)
+            cached(df)
+            cached(df.copy(), workers=4)  # same content, ignored parameter
+            cached(df, scale=2.0)  # new parameter value
+            changed = df.copy()
+            changed.loc[0, "x"] += 1
+            cached(changed)  # new content
+
+            # an edit to a declared dependency module is a new key too
+            dep = os.path.join(folder, "memo_dep_helper.py")
+            with open(dep, "w") as f:
+                f.write("FACTOR = 1\n")
+            sys.path.insert(0, folder)
+            with_dep = memo.memoize(modules=("memo_dep_helper",))(fit)
+            with_dep(df, scale=3.0)
+            with_dep(df, scale=3.0)
+            with open(dep, "a") as f:
+                f.write("FACTOR = 2\n")
+            with_dep(df, scale=3.0)
+            sys.path.remove(folder)
+
+            start = time.perf_counter()
+            first = descriptive_analysis(df)
+            miss = time.perf_counter() - start
+            start = time.perf_counter()
+            second = descriptive_analysis(df.copy())
+            hit = time.perf_counter() - start
+
+            # LRU: 3 entries fit; touching "a" makes "b" the one evicted
+            small = memo.ResultCache(os.path.join(folder, "lru"), max_bytes=3 * 1100)
+            for key in ("a", "b", "c"):
+                small.put(key * 64, b"x" * 1000)
+                time.sleep(0.01)
+            small.get("a" * 64)
+            small.put("d" * 64, b"x" * 1000)
+            kept = [k for k in "abcd" if small.get(k * 64) is not memo.MISSING]
+        finally:
+            memo._default_cache = saved
+
+    if calls != [1.0, 2.0, 1.0, 3.0, 3.0]:
+        print("FAILED: expected 5 computations (three hits skipped), got", calls)
+    elif not all(first[k].equals(second[k]) for k in first):
+        print("FAILED: cached descriptive tables differ from the computed ones.")
+    elif hit > miss:
+        print(f"FAILED: cache hit ({hit:.3f}s) slower than computing ({miss:.3f}s).")
+    elif "b" in kept or "a" not in kept or "d" not in kept:
+        print("FAILED: LRU eviction kept", kept)
+    else:
+        print(f"PASSED: descriptive tables {miss:.3f}s computed, {hit:.4f}s cached.")
+
+
+def test_datastore():
+    print("Running test_datastore...")
+    import numpy as np
+    import pandas as pd
+    import src.memo as memo
+    from src.datastore import DataStore, MAX_SQL_PARAMS
+    from src.final_analysis import load_final_slice, run_regression
+    from src.final_data_prep import store_final_dataset
+
+    n = MAX_SQL_PARAMS + 300
+    rng = np.random.default_rng(0)
+    zips = [f"{90000 + i:05d}" for i in range(n)]
+    df = pd.DataFrame(
+        {
+            "zip_code": pd.array(zips, dtype="string"),
+            "station_count": pd.array(rng.poisson(1, n), dtype="Int32"),
+            "mean_commute_time": rng.uniform(20, 40, n).astype("float32"),
+            "median_income": rng.uniform(3e4, 1.5e5, n).astype("float32"),
+        }
+    )
+    df.loc[3, "median_income"] = np.nan
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = DataStore(os.path.join(folder, "store.sqlite"))
+        first = store_final_dataset(df, store)
+        again = store_final_dataset(df, store)
+        changed = df.copy()
+        changed.loc[7, "median_income"] += 1000
+        one = store_final_dataset(changed, store)
+        store.upsert_frame(df, vintage=2017)
+
+        subset = zips[::2][:20]
+        small = load_final_slice(["median_income"], subset, store=store)
+        wanted = zips[::-1][: MAX_SQL_PARAMS + 100] + ["99999"]
+        large = load_final_slice(zips=wanted, store=store)
+        old = store.query(["median_income"], [zips[7]], vintage=2017)
+        vintages = store.vintages()
+
+        # the regression reads its columns through the store
+        saved, memo._default_cache = memo._default_cache, False
+        try:
+            ols = run_regression(zips=zips, store=store)
+        finally:
+            memo._default_cache = saved
+        store.close()
+
+    rows = changed.dropna()
+    X = np.column_stack(
+        [np.ones(len(rows)), rows["median_income"], rows["station_count"].astype(float)]
+    )
+    direct = np.linalg.lstsq(X, rows["mean_commute_time"].astype(float), rcond=None)[0]
+
+    expected = changed.set_index("zip_code").loc[subset, "median_income"]
+    if first != 3 * n or again != 0 or one != 1:
+        print(f"FAILED: changed rows {first}, {again}, {one} (expected {3 * n}, 0, 1).")
+    elif list(small.columns) != ["zip_code", "median_income"] or list(small["zip_code"]) != subset:
+        print("FAILED: ZIP / variable slice has wrong rows or columns.")
+    elif not np.allclose(small["median_income"], expected.to_numpy(), equal_nan=True):
+        print("FAILED: stored values differ from the upserted ones.")
+    elif str(large["station_count"].dtype) != "Int32" or str(large["median_income"].dtype) != "float32":
+        print("FAILED: query result not typed like the final schema:", large.dtypes.to_dict())
+    elif len(large) != len(wanted) or not large.iloc[-1, 1:].isna().all():
+        print("FAILED: long ZIP list (temp-table path) returned wrong rows.")
+    elif vintages != [2017, 2022] or old["median_income"][0] != df["median_income"][7]:
+        print("FAILED: vintages are not kept side by side:", vintages)
+    elif ols["n_obs"][0] != len(rows) or not np.allclose(ols["estimate"], direct, rtol=1e-4):
+        print("FAILED: regression on the store slice differs from a direct fit.")
+    else:
+        print("PASSED: store upserts only changed rows and serves ZIP / variable slices.")
+
+
+def test_fetch_journal():
+    print("Running test_fetch_journal...")
+    import requests
+    import src.acs_variables as acs_variables
+    from src.acs_variables import IncompleteFetchError, fetch_acs_variables
+    from src.fetch_journal import FetchJournal
+
+    class FlakyClient(ACSClient):
+        # fails every request whose ZIP batch contains `bad`
+        bad, error = None, None
+
+        def get(self, url, params=None, ttl=None):
+            if self.bad and self.bad in params["for"]:
+                raise self.error("simulated failure")
+            return super().get(url, params, ttl)
+
+    names = ["mean_commute_minutes", "median_household_income"]
+    zips = [str(90000 + i) for i in range(30)]
+    server, url, stats = start_stub_census_server(latency=0.01, throttle_first=0)
+    client = FlakyClient(backoff=0.01, max_retries=0, cache=False)
+    saved = dict(acs_variables.DATASET_URLS)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "acs.jsonl")
+        try:
+            acs_variables.DATASET_URLS.update(subject=url + "/subject", detailed=url)
+            reference = fetch_acs_variables(zips, names, 10, client)
+
+            # 1. crash part-way: the finished batches are already journaled
+            client.bad, client.error = "90025", RuntimeError
+            try:
+                fetch_acs_variables(zips, names, 10, client, journal=path)
+                crashed = False
+            except RuntimeError:
+                crashed = True
+            kept = len(FetchJournal(path).records())
+            with open(path, "a") as f:
+                f.write('{"unit": "torn')  # crash mid-write
+
+            # 2. resume with that batch failing: no finished batch is re-sent
+            # and the fetch raises instead of passing as complete
+            client.error = requests.ConnectionError
+            before = stats["requests"]
+            try:
+                fetch_acs_variables(zips, names, 10, client, journal=path)
+                partial = None
+            except IncompleteFetchError as e:
+                partial = e.table
+            retried = stats["requests"] - before
+            still_there = os.path.exists(path)
+
+            # 3. resume again: the failed batch alone is fetched
+            client.bad = None
+            before = stats["requests"]
+            final = fetch_acs_variables(zips, names, 10, client, journal=path)
+            last = stats["requests"] - before
+        finally:
+            acs_variables.DATASET_URLS.update(saved)
+            server.shutdown()
+        removed = not os.path.exists(path)
+
+        # the first record written after a torn line must survive
+        torn_path = os.path.join(folder, "torn.jsonl")
+        with FetchJournal(torn_path) as j:
+            j.append({"n": 1})
+        with open(torn_path, "a") as f:
+            f.write('{"n": 9')
+        with FetchJournal(torn_path) as j:
+            j.append({"n": 2})
+        torn = FetchJournal(torn_path).records()
+
+    if not crashed or kept != 4:
+        print(f"FAILED: expected a crash with 4 of 6 requests journaled, got {kept}.")
+    elif partial is None:
+        print("FAILED: fetch with failed requests did not raise IncompleteFetchError.")
+    elif retried != 0 or not partial["median_household_income"][20:].isna().all():
+        print(f"FAILED: resume re-sent {retried} already journaled requests.")
+    elif not still_there:
+        print("FAILED: journal deleted although requests failed.")
+    elif last != 2 or not removed:
+        print(f"FAILED: final resume sent {last} requests (2 expected) or kept the journal.")
+    elif not final.equals(reference):
+        print("FAILED: table rebuilt from the journal differs from a direct fetch.")
+    elif [r["n"] for r in torn] != [1, 2]:
+        print("FAILED: record appended after a torn line was lost:", torn)
+    else:
+        print("PASSED: interrupted ACS fetch resumes from its journal.")
+
+
 if __name__ == "__main__":
     print("\n=== Tests ===\n")
     test_zip_loader()
     test_income_loader()
     test_metro_shapefile()
+    test_acs_batching()
+    test_acs_client_stub()
+    test_http_cache()
+    test_crosswalk_index()
+    test_crosswalk_refresh()
+    test_zcta_subset_cache()
+    test_zcta_lookup()
+    test_pipeline_runner()
+    test_pipeline_concurrent()
+    test_artifacts()
+    test_regional_dataset()
+    test_regression_sweep()
+    test_permutation_memory()
+    test_instrumentation()
+    test_plot_rendering()
+    test_cli_lazy_imports()
+    test_station_accessibility()
+    test_acs_panel()
+    test_tract_level()
+    test_geometry_store()
+    test_quantile_report()
+    test_acs_variables()
+    test_spatial_models()
+    test_memoization()
+    test_datastore()
+    test_fetch_journal()
     print("\n=== Tests Completed ===\n")